@@ -0,0 +1,263 @@
+#! /usr/bin/python
+
+'''
+Compact binary log format for oven status messages, and converter to CSV.
+
+Copyright (c) 2011, Daniel Strother < http://danstrother.com/ >
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+  - Redistributions of source code must retain the above copyright notice,
+    this list of conditions and the following disclaimer.
+  - Redistributions in binary form must reproduce the above copyright
+    notice, this list of conditions and the following disclaimer in the
+    documentation and/or other materials provided with the distribution.
+  - The name of the author may not be used to endorse or promote products
+    derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS" AND ANY EXPRESS OR IMPLIED
+WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+File layout (all values little-endian):
+
+  header    "OVENLOG\\x01", start time (double, unix seconds),
+            record size (uint16), block size (uint16)
+  blocks    appended as samples arrive; each block is
+              length of remainder of block (uint32), sample count n (uint16),
+              first sample (one MSG_DTYPE record),
+              per field: encoding (uint8) followed by the field's n-1 deltas:
+                0 - constant delta (one int32)
+                1/2/3/4 - int8/int16/int32/int64 deltas
+  index     written on close(): one (offset,time,n) entry per block, followed by
+            index offset (uint64), entry count (uint32) and "OVENIDX\\x01"
+
+A file that was not closed (no index) is still readable by scanning its blocks.
+'''
+
+# depends on python-numpy
+import numpy
+import os
+import struct
+import sys
+import time
+
+from ovenproto import MSG_DTYPE, EMPTY_BATCH, unwrap_time
+
+MAGIC       = b'OVENLOG\x01'
+IDX_MAGIC   = b'OVENIDX\x01'
+
+HEADER      = struct.Struct('<8sdHH')
+BLOCK       = struct.Struct('<IH')
+TRAILER     = struct.Struct('<QI8s')
+
+INDEX_DTYPE = numpy.dtype([('offset',numpy.uint64),('time',numpy.uint32),('n',numpy.uint16)])
+
+ENC_CONST   = 0
+DELTA_TYPES = (None,numpy.int8,numpy.int16,numpy.int32,numpy.int64)
+
+
+def encode_block(batch):
+    """Encodes a batch (at most 65535 samples) as one delta-encoded block (without length prefix)."""
+    n = len(batch)
+    parts = [struct.pack('<H',n), batch[:1].tobytes()]
+    for name in MSG_DTYPE.names:
+        d = numpy.diff(batch[name].astype(numpy.int64))
+        if(not len(d) or ((d == d[0]).all() and -2**31 <= d[0] < 2**31)):
+            parts.append(struct.pack('<Bi',ENC_CONST,len(d) and int(d[0]) or 0))
+            continue
+        lo = d.min()
+        hi = d.max()
+        for enc in range(1,len(DELTA_TYPES)):
+            info = numpy.iinfo(DELTA_TYPES[enc])
+            if(lo >= info.min and hi <= info.max):
+                break
+        parts.append(struct.pack('<B',enc))
+        parts.append(d.astype(DELTA_TYPES[enc]).tobytes())
+    return b''.join(parts)
+
+
+def decode_block(data):
+    """Decodes one block (without length prefix) into a batch."""
+    (n,) = struct.unpack_from('<H',data,0)
+    pos = 2
+    batch = numpy.zeros(n,MSG_DTYPE)
+    batch[:1] = numpy.frombuffer(data,MSG_DTYPE,1,pos)
+    pos += MSG_DTYPE.itemsize
+    for name in MSG_DTYPE.names:
+        enc = ord(data[pos:pos+1])
+        pos += 1
+        if(enc == ENC_CONST):
+            (step,) = struct.unpack_from('<i',data,pos)
+            pos += 4
+            d = numpy.empty(n-1,numpy.int64)
+            d.fill(step)
+        else:
+            dt = numpy.dtype(DELTA_TYPES[enc])
+            d = numpy.frombuffer(data,dt,n-1,pos).astype(numpy.int64)
+            pos += dt.itemsize*(n-1)
+        col = numpy.empty(n,numpy.int64)
+        col[0] = batch[name][0]
+        numpy.cumsum(d,out=col[1:])
+        col[1:] += col[0]
+        batch[name] = col
+    return batch
+
+
+class OvenBinLogWriter():
+    """Append-only writer of binary log files.
+
+    Samples are buffered and written out in delta-encoded blocks of block_size samples."""
+
+    def __init__(self,filename,block_size=240):
+        """Creates log file and writes its header. Default block size is one minute at 4Hz."""
+        self.f = open(filename,'wb')
+        self.block_size = block_size
+        self.pending = []
+        self.npending = 0
+        self.index = []
+        self.f.write(HEADER.pack(MAGIC,time.time(),MSG_DTYPE.itemsize,block_size))
+
+    def __del__(self):
+        """Closes log file (writing index)."""
+        self.close()
+
+    def write(self,batch):
+        """Appends a batch of samples."""
+        self.pending.append(numpy.array(batch,MSG_DTYPE))
+        self.npending += len(batch)
+        if(self.npending >= self.block_size):
+            self.flush()
+
+    def flush(self):
+        """Writes out buffered samples as block(s)."""
+        if(not self.npending):
+            return
+        samples = numpy.concatenate(self.pending)
+        self.pending = []
+        self.npending = 0
+        for i in range(0,len(samples),self.block_size):
+            block = samples[i:i+self.block_size]
+            data = encode_block(block)
+            self.index.append((self.f.tell(),block['time'][0],len(block)))
+            self.f.write(struct.pack('<I',len(data)))
+            self.f.write(data)
+        self.f.flush()
+
+    def close(self):
+        """Writes remaining samples and the block index, then closes the file."""
+        if(not self.f):
+            return
+        self.flush()
+        offset = self.f.tell()
+        self.f.write(numpy.array(self.index,INDEX_DTYPE).tobytes())
+        self.f.write(TRAILER.pack(offset,len(self.index),IDX_MAGIC))
+        self.f.close()
+        self.f = None
+
+
+def is_binlog(head):
+    """Returns True if head (first bytes of a file) belongs to a binary log."""
+    return head.startswith(MAGIC)
+
+
+def read_index(data):
+    """Returns block index of binary log contents (rebuilt by scanning if the file was not closed)."""
+    if(len(data) >= HEADER.size+TRAILER.size):
+        (offset,count,magic) = TRAILER.unpack_from(data,len(data)-TRAILER.size)
+        if(magic == IDX_MAGIC):
+            return numpy.frombuffer(data,INDEX_DTYPE,count,offset)
+
+    index = []
+    pos = HEADER.size
+    tfield = 2 + MSG_DTYPE.fields['time'][1]
+    while(pos+BLOCK.size <= len(data)):
+        (length,n) = BLOCK.unpack_from(data,pos)
+        if(pos+4+length > len(data)):
+            break   # truncated block
+        (t,) = struct.unpack_from('<I',data,pos+4+tfield)
+        index.append((pos,t,n))
+        pos += 4+length
+    return numpy.array(index,INDEX_DTYPE)
+
+
+def read_binlog(path,t0=None,t1=None):
+    """Reads a binary log file as a MSG_DTYPE batch.
+
+    t0/t1 optionally restrict the result to controller times (0.25s ticks) t0 <= time < t1;
+    only blocks overlapping that range are decoded. Where the controller's time wraps
+    (at 2**16), t0/t1 count on from the log's first time, as unwrap_time() does."""
+    f = open(path,'rb')
+    try:
+        data = f.read()
+    finally:
+        f.close()
+    if(not is_binlog(data)):
+        raise ValueError("%s is not a binary oven log" % (path))
+
+    index = read_index(data)
+    if(not len(index)):
+        return EMPTY_BATCH
+    starts = unwrap_time(index['time'])    # block start times, increasing
+    (first,last) = (0,len(index))
+    if(t0 is not None):
+        # first block that may contain t0 is the last one starting at or before it
+        first = max(0,numpy.searchsorted(starts,t0,'right')-1)
+    if(t1 is not None):
+        last = numpy.searchsorted(starts,t1,'left')
+
+    blocks = []
+    times = []
+    for i in range(first,last):
+        offset = int(index['offset'][i])
+        (length,) = struct.unpack_from('<I',data,offset)
+        block = decode_block(data[offset+4:offset+4+length])
+        blocks.append(block)
+        times.append(unwrap_time(block['time'],int(starts[i])))
+    if(not blocks):
+        return EMPTY_BATCH
+    batch = numpy.concatenate(blocks)
+    if(t0 is not None or t1 is not None):
+        times = numpy.concatenate(times)
+        keep = numpy.ones(len(batch),bool)
+        if(t0 is not None):
+            keep &= (times >= t0)
+        if(t1 is not None):
+            keep &= (times < t1)
+        batch = batch[keep]
+    return batch
+
+
+def binlog_to_csv(src,dst):
+    """Converts a binary log to the CSV columns written by OvenLogger (state,step,time,temp,TtoTarget,target,cmd)."""
+    from ovenlogs import OVENLOG_HEADER, format_ovenlog
+    batch = read_binlog(src)
+    f = open(dst,'w')
+    try:
+        f.write(OVENLOG_HEADER.decode('ascii')+'\n')
+        if(len(batch)):
+            batch['time'] = unwrap_time(batch['time'])
+            f.write(format_ovenlog(batch,batch['time'][0]*0.25))
+    finally:
+        f.close()
+
+
+if __name__ == '__main__':
+    # convert binary log(s) to CSV: ovenbinlog.py log.ovl [out.csv]
+    if(len(sys.argv) < 2):
+        sys.stderr.write("usage: %s log.ovl [out.csv]\n" % (sys.argv[0]))
+        sys.exit(1)
+    src = sys.argv[1]
+    if(len(sys.argv) > 2):
+        dst = sys.argv[2]
+    else:
+        dst = os.path.splitext(src)[0] + '.csv'
+    binlog_to_csv(src,dst)
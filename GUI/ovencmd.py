@@ -0,0 +1,260 @@
+'''
+Paced command queue for the oven controller's serial port.
+
+Copyright (c) 2011, Daniel Strother < http://danstrother.com/ >
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+  - Redistributions of source code must retain the above copyright notice,
+    this list of conditions and the following disclaimer.
+  - Redistributions in binary form must reproduce the above copyright
+    notice, this list of conditions and the following disclaimer in the
+    documentation and/or other materials provided with the distribution.
+  - The name of the author may not be used to endorse or promote products
+    derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS" AND ANY EXPRESS OR IMPLIED
+WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+The controller is easy to overrun: uart.c keeps received bytes in a 16-byte
+ring without an overflow check, main() only drains it in ST_IDLE, and the
+main loop acts on a single comm_cmd at a time. OvenCommander therefore
+
+  - writes at most RX_BUFFER-1 bytes at once, and one line per controller tick
+  - holds commands back while telemetry shows the controller is not reading
+  - keeps only the latest value of each setpoint (target, cmd), so that a
+    dragged slider costs one line per tick instead of one per pixel
+  - sends a command that depends on an earlier one (go after reset) only once
+    the earlier one shows up in the telemetry, or fails the sequence
+
+ST_IDLE produces no status lines, so being idle is confirmed by asking for the
+PID coefficients, which only an idle controller answers. Silence alone proves
+nothing - DONE, PAUSE and FAULT are silent too, and do not read the port - so
+until the controller answers, nothing but that question is sent, once every
+PROBE_EVERY.
+'''
+
+# Qt-free
+import collections
+import sys
+
+from ovenproto import ST_IDLE, STATE_NAMES
+
+RX_BUFFER   = 16        # BUFFER_SIZE of the receive ring in uart.c (holds one byte less)
+TICK        = 0.25      # controller update period (seconds)
+CHUNK_GAP   = 0.02      # between parts of a line longer than the ring (15 bytes take 2.6ms at 57600 baud)
+QUIET       = 1.0       # no status lines for this long: controller left RUN/MANUAL (for an unknown state)
+PROBE       = b"coefs?\n"
+PROBE_EVERY = 0.5       # repeat interval of PROBE while waiting for ST_IDLE
+
+
+class OvenCommand():
+    """A command line, and the controller state that shows it took effect (None: none expected)."""
+
+    def __init__(self,line,confirm,group,deadline):
+        self.line = line
+        self.confirm = confirm
+        self.group = group
+        self.deadline = deadline    # loop time by which it must have been sent (then: confirmed)
+        self.replies = 0            # idle replies received before it was sent
+
+
+class OvenCommander():
+    """Schedules command lines for one controller; lives in (and is only called from) its OvenLoop's thread.
+
+    status() and replied() must be fed from the controller's telemetry (OvenProtocol does
+    so when given a commander)."""
+
+    def __init__(self,loop,write,timeout=3.0,listen_states=(ST_IDLE,),failed=None):
+        """Creates queue writing bytes with write (e.g. a transport's write method).
+
+        Commands not confirmed within timeout seconds of being submitted fail, along with
+        the rest of their sequence; failed(line,reason) is then called. listen_states are
+        the states in which the firmware reads its serial port (None: all)."""
+        self.loop = loop
+        self.write = write
+        self.timeout = timeout
+        self.listen_states = listen_states
+        self.failed = failed
+
+        self.queue = collections.deque()                # ordered OvenCommands
+        self.setpoints = collections.OrderedDict()      # key -> latest line
+        self.pending = b''          # rest of a line being written in chunks
+        self.waiting = None         # sent OvenCommand awaiting confirmation
+        self.groups = 0
+        self.next_write = 0.0       # loop time before which nothing may be written
+        self.next_probe = 0.0
+        self.timer = None
+
+        self.state = None           # state of the last status line
+        self.last_status = None     # loop time of the last status line
+        self.replies = 0            # idle replies received
+        self.last_reply = None
+
+        self.lines_sent = 0
+        self.superseded = 0         # setpoint lines replaced before being sent
+
+    def controller_state(self):
+        """Best knowledge of the controller's state (None if unknown: silent, but not known to be idle)."""
+        now = self.loop.time()
+        if(self.last_reply is not None and (self.last_status is None or self.last_reply >= self.last_status)):
+            return ST_IDLE
+        if(self.last_status is None or now - self.last_status >= QUIET):
+            return None
+        return self.state
+
+    def listening(self):
+        """True if the controller is expected to read what is written now."""
+        if(self.listen_states is None):
+            return True
+        return (self.controller_state() in self.listen_states)
+
+    def probing(self):
+        """True if the controller is to be asked whether it is idle: to confirm a command, or
+        because something is waiting to be sent to a silent controller."""
+        if(self.waiting is not None):
+            return (self.waiting.confirm == ST_IDLE)
+        return (self.listen_states is not None and bool(self.queue or self.setpoints) and
+                self.controller_state() is None)
+
+    def submit(self,*commands):
+        """Queues a sequence of commands, each a line or a (line,confirm_state) pair.
+
+        Each command is sent once the one before it is confirmed; returns the sequence's id."""
+        self.groups += 1
+        deadline = self.loop.time() + self.timeout
+        for c in commands:
+            if(isinstance(c,tuple)):
+                (line,confirm) = c
+            else:
+                (line,confirm) = (c,None)
+            self.queue.append(OvenCommand(_bytes(line),confirm,self.groups,deadline))
+        self.pump()
+        return self.groups
+
+    def setpoint(self,key,line):
+        """Sets the line to send for setpoint key, replacing any not yet sent."""
+        if(key in self.setpoints):
+            self.superseded += 1
+        self.setpoints[key] = _bytes(line)
+        self.pump()
+
+    def cancel(self):
+        """Drops everything not yet written."""
+        self.queue.clear()
+        self.setpoints.clear()
+        self.waiting = None
+
+    def status(self,batch):
+        """Takes note of a batch of status messages."""
+        self.state = int(batch['state'][-1])
+        self.last_status = self.loop.time()
+        w = self.waiting
+        if(w is not None and w.confirm != ST_IDLE and (batch['state'] == w.confirm).any()):
+            self.confirmed()
+        self.pump()
+
+    def replied(self):
+        """Takes note of a coefficient reply (sent only by an idle controller)."""
+        self.replies += 1
+        self.last_reply = self.loop.time()
+        w = self.waiting
+        if(w is not None and w.confirm == ST_IDLE and self.replies > w.replies):
+            self.confirmed()
+        self.pump()
+
+    def confirmed(self):
+        """Releases the commands queued behind the one awaiting confirmation."""
+        self.waiting = None
+
+    def fail(self,cmd,reason):
+        """Drops cmd and the rest of its sequence, and reports it."""
+        self.queue = collections.deque([c for c in self.queue if c.group != cmd.group])
+        if(self.waiting is cmd):
+            self.waiting = None
+        line = cmd.line.decode('ascii').strip()
+        if(self.failed):
+            self.failed(line,reason)
+        else:
+            sys.stderr.write("command \"%s\" failed: %s\n" % (line,reason))
+
+    def _write(self,data,now):
+        """Writes data, or as much of it as the controller's ring can take."""
+        chunk = data[:RX_BUFFER-1]
+        self.pending = data[RX_BUFFER-1:]
+        self.write(chunk)
+        if(self.pending):
+            self.next_write = now + CHUNK_GAP
+        else:
+            self.next_write = now + TICK
+            self.lines_sent += 1
+
+    def pump(self):
+        """Writes whatever may be written now, and schedules the next attempt."""
+        now = self.loop.time()
+
+        # commands that have run out of time
+        w = self.waiting
+        if(w is not None and now >= w.deadline):
+            state = self.controller_state()
+            self.fail(w,"controller still %s" % (state is None and 'silent' or STATE_NAMES[state]))
+        while(self.queue and now >= self.queue[0].deadline):
+            self.fail(self.queue[0],"controller not accepting commands")
+
+        if(now >= self.next_write):
+            if(self.pending):
+                self._write(self.pending,now)
+            elif(self.probing()):
+                if(now >= self.next_probe):
+                    self._write(PROBE,now)
+                    self.next_probe = now + PROBE_EVERY
+            elif(self.waiting is None and self.listening()):
+                if(self.queue):
+                    cmd = self.queue.popleft()
+                    cmd.replies = self.replies
+                    self._write(cmd.line,now)
+                    if(cmd.confirm is not None):
+                        cmd.deadline = now + self.timeout
+                        self.waiting = cmd
+                        self.next_probe = self.next_write
+                elif(self.setpoints):
+                    (key,line) = self.setpoints.popitem(last=False)
+                    self._write(line,now)
+
+        # when to look again
+        when = []
+        if(self.pending):
+            when.append(self.next_write)
+        elif(self.probing()):
+            when.append(max(self.next_write,self.next_probe))
+        elif(self.waiting is None and (self.queue or self.setpoints) and self.listening()):
+            when.append(self.next_write)
+        if(self.waiting is not None):
+            when.append(self.waiting.deadline)
+        if(self.queue):
+            when.append(self.queue[0].deadline)
+        if(self.last_status is not None and now < self.last_status + QUIET and not self.listening()):
+            when.append(self.last_status + QUIET)     # silent from then on: probe if anything waits
+        if(self.timer):
+            self.timer.cancel()
+            self.timer = None
+        if(when):
+            self.timer = self.loop.call_later(max(0.0,min(when)-now),self.pump)
+
+
+def _bytes(line):
+    """Command line as bytes, new-line terminated."""
+    if(not isinstance(line,bytes)):
+        line = line.encode('ascii')
+    if(not line.endswith(b'\n')):
+        line += b'\n'
+    return line
@@ -28,396 +28,150 @@ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 '''
 
-# depends on python-qt4, python-qwt5-qt4, python-serial
+# depends on python-qt4, python-serial, python-numpy (python-qwt5-qt4 for plots, see ovenplot)
+import time
+MODULE_START = time.time()  # before the heavy imports, for --startup-time
 from PyQt4 import QtGui, QtCore
-import PyQt4.Qwt5 as Qwt
-import math
-import sys
 import serial
-import time
-
-class OvenMsg():
-    """Class representing a single status message sent from the oven control hardware."""
-
-    def __init__(self):
-        """Sets sane default message contents."""
-        self.state      = 'idle'
-        self.time       = 0.0
-        self.step       = 0.0
-        self.target     = 0.0
-        self.TtoTarget  = 0.0
-        self.cmd        = 0.0
-        self.temp       = 0.0
-
-    def parse(self,msg):
-        """Parses message contents from a comma-separated string.
-        
-        On microcontroller, message is generated with the C code:
-        sprintf_P(tx_msg,PSTR("%s,%u,%d,%d,%d,%u,%u,%u\\n"),
-            state_names[state],
-            time,
-            target,
-            temp_t,
-            temp_b,
-            cmd,
-            cmd_t,
-            cmd_b);
-            
-        sprintf_P(tx_msg,PSTR("%s,%d,%d,%d,%d,%d,%d\\n"),    
-            state_names[state],
-			step,
-            time,
-			temp,
-			TtoTarget,
-            target,
-			HeaterPwr)
-        
-        This parses that."""
-
-        m = msg.split(',')
-        if(len(m) != 7):
-            return 0
-
-        self.state      = m.pop(0)
-        self.step       = m.pop(0)
-        self.time       = int(m.pop(0))*0.25
-        self.temp       = int(m.pop(0))*0.25
-        self.TtoTarget  = int(m.pop(0))*0.25
-        self.target     = int(m.pop(0))*0.25
-        self.cmd        = int(m.pop(0))/255.0
+import socket
+import sys
 
-        return 1
+from ovenio import OvenProtocol, open_port, shared_loop
+from ovenproto import ST_IDLE, ST_RUN, ST_PAUSE
+from ovenlogs import OvenRunLogger
+from oventrace import tracer, clock
 
 
-class OvenCommThread(QtCore.QThread):
-    """Thread class responsible for asynchronously receiving messages from oven controller on behalf of OvenComm instance."""
+class OvenCommProtocol(OvenProtocol):
+    """Protocol passing decoded batches from the I/O loop to an OvenComm instance."""
 
-    def __init__(self,parent=None):
-        """Constructor; requires an OvenComm parent."""
-        super(OvenCommThread,self).__init__(parent)
-        self.running = True
-        self.p = parent
+    def __init__(self,comm):
+        # clear any stale data that may have been buffered prior to program start
+        OvenProtocol.__init__(self,drain=0.5)
+        self.comm = comm
 
-    def __del__(self):
-        """Tells thread to stop, then waits (a little while) for thread to terminate"""
-        self.stop()
-        self.wait()
+    def data_received(self,data):
+        if(tracer.enabled):
+            self.t_read = clock()
+            self.nbytes = len(data)
+        OvenProtocol.data_received(self,data)
 
-    def run(self):
-        """Triggers newMessage signal in parent OvenComm instance whenever a message is received."""
-        while(self.running):
-            msg = OvenMsg()
-            #if(msg.parse(self.p.s.readline()) and self.running):
-             #   self.p.trigger_newMessage(msg)
+    def batch_received(self,batch):
+        if(tracer.enabled):
+            tracer.received(batch,self.t_read,self.nbytes)
+        if(self.comm.publisher):
+            self.comm.publisher.publish(batch,self.comm.channel)
+        self.comm.trigger_newBatch(batch)
 
-    def stop(self):
-        """Tells comm thread to stop running (eventually)."""
-        self.running = False
+    def command_failed(self,line,reason):
+        self.comm.commandFailed.emit("%s: %s" % (line,reason))
 
 
 class OvenComm(QtCore.QObject):
-    """Class that encapsulates all serial communication with oven controller hardware."""
+    """Class that encapsulates all serial communication with oven controller hardware.
 
-    newMessage = QtCore.pyqtSignal('PyQt_PyObject')     # PyQt_PyObject required for passing non-C++ types through Qt signals
+    The port is serviced by an OvenLoop (by default the one shared by the whole process),
+    so any number of OvenComm instances share a single I/O thread."""
+
+    # emitted with a MSG_DTYPE array of all messages decoded from one read - a single
+    # queued signal per batch, rather than one per message
+    newBatch = QtCore.pyqtSignal('PyQt_PyObject')       # PyQt_PyObject required for passing non-C++ types through Qt signals
 
     newTemp = QtCore.pyqtSignal(float)
 
-    def __init__(self,parent=None,port='COM1'):
-        """Opens specified serial port and starts comm thread."""
+    # emitted with a description of each command the controller did not act on
+    commandFailed = QtCore.pyqtSignal(str)
+
+    def __init__(self,parent=None,port='COM1',loop=None):
+        """Opens specified serial port (or tcp:host:port) on loop."""
 
         super(OvenComm,self).__init__(parent)
         
-        self.thread = None
-        self.s = None
+        self.transport = None
+        self.port = port
+        self.loop = loop or shared_loop()
+        self.protocol = OvenCommProtocol(self)
+        self.publisher = None   # OvenPublisher (on loop) to which decoded batches are passed, as channel
+        self.channel = 0
 
-        #self.s = serial.Serial(port=port,timeout=0.7,baudrate=57600)
-
-        # clear any stale data that may have been buffered prior to program start
-        time.sleep(0.5)
-        #self.s.flushInput()
-        #self.s.readline()
-
-        self.thread = OvenCommThread(self)
-        self.thread.start()
+        self.transport = open_port(self.loop,port,self.protocol)
 
         self.v_cmd = 0
 
     def __del__(self):
-        """Terminates comm thread and closes serial port."""
+        """Closes serial port (from the I/O loop, once pending commands have been written)."""
 
         self.newTemp.disconnect()
-        self.newMessage.disconnect()
+        self.newBatch.disconnect()
+        self.commandFailed.disconnect()
+
+        if(self.transport):
+            self.loop.call_soon_threadsafe(self.transport.close)
+            self.transport = None
 
-        if(self.thread):
-            self.thread.stop()
-            self.thread.wait()  # don't close serial port until after listening thread has stopped
-        if(self.s):
-            self.s.close()
+    def trigger_newBatch(self,batch):
+        """Callback for triggering Qt signals on receipt of new messages (called in the I/O loop's thread)."""
 
-    def trigger_newMessage(self,msg):
-        """Callback for triggering Qt signals on receipt of new message by OvenCommThread."""
+        self.newTemp.emit(batch['temp'][-1]*0.25)
+        self.newBatch.emit(batch)
 
-        self.newTemp.emit(msg.temp)
-        self.newMessage.emit(msg)
+    def commander(self,method,*args):
+        """Calls method of the port's OvenCommander (in the I/O loop); safe to call from the GUI thread."""
+        self.loop.call_soon_threadsafe(lambda: getattr(self.protocol.commander,method)(*args))
 
     def go(self):
-        """Callback for Go button - resets controller and starts reflow operation."""
-        self.s.write("reset\ngo\n")
+        """Callback for Go button - resets controller and starts reflow operation once it is idle."""
+        self.commander('submit',("reset",ST_IDLE),("go",ST_RUN))
 
     def reset(self):
         """Callback for Reset button - just resets controller (stops ongoing reflow operation)."""
-        self.s.write("reset\n")
+        self.commander('submit',("reset",ST_IDLE))
 
     def pause(self):
         """Callback for Pause button - puts controller into pause state (profile time does not advance)."""
-        self.s.write("pause\n")
+        self.commander('submit',("pause",ST_PAUSE))
 
     def resume(self):
         """Callback for Resume button - resumes controller after pause (profile time resumes advancing)."""
-        self.s.write("resume\n")
+        self.commander('submit',("resume",ST_RUN))
 
     def manual(self,m):
         """Callback for Manual check-box - when enabled, controller's PID loop is bypassed."""
         if(m):
-            self.s.write("manual: 1\n")
+            self.commander('submit',"manual: 1")
         else:
-            self.s.write("manual: 0\n")
+            self.commander('submit',"manual: 0")
 
-    def cmd(self):
-        """Callback for Command slider - controls power to heating element."""
-        self.v_cmd = int(t*255.0/100.0)
-        print >> self.s, "cmd: %d" % (self.v_cmd)
-        
+    def cmd(self,c):
+        """Callback for Command slider - controls power to heating element (only the latest value is sent)."""
+        self.v_cmd = int(c*255.0/100.0)
+        self.commander('setpoint','cmd',"cmd: %d" % (self.v_cmd))
 
     def target(self,t):
-        """Callback for Target slider - controls target temperature when in Idle state."""
+        """Callback for Target slider - controls target temperature when in Idle state (only the latest value is sent)."""
         t = int(t*4)
         if(t < 0):
             t = 0
         if(t > 4095):
             t = 4095
-        print >> self.s, "target: %d" % (t)
-
-
-class OvenLogger():
-    """Class for logging oven status messages to CSV files."""
-
-    def __init__(self,comm):
-        """Connects newMessage signal handler to OvenComm instance."""
-        self.comm = comm
-        self.prevstate = 'idle'
-        self.f = None
-        self.time_offset = 0.0
-        self.comm.newMessage.connect(self.log_message)
-
-    def __del__(self):
-        """Closes open log file."""
-        if(self.f):
-            self.f.close()
-
-    def start_new_file(self):
-        """Starts a new time-stamped log file and inserts column headers."""
-        if(self.f):
-            self.f.close()
-        filename = time.strftime('ovenlog_%Y%m%d%H%M%S.csv')
-        self.f = open(filename,'a')
-        print >> self.f, "state,step,time,temp,TtoTarget,target,cmd"
-
-    def log_message(self,msg):
-        """Callback for newMessage signals - writes messages to log file.
-
-        Opens a new log file when transitioning from a non-idle state to idle."""
-
-        if(not self.f or (msg.state == 'idle' and self.prevstate != 'idle')):
-            # when transitioning to idle state (or if log file not already open),
-            # open a new log file
-            self.start_new_file()
+        self.commander('setpoint','target',"target: %d" % (t))
 
-            # time_offset is used to make all log files start at time 0
-            # (controller time always increments, and never resets)
-            self.time_offset = msg.time
 
-        self.prevstate = msg.state
-        print >> self.f, "%s,%f,%f,%f,%f,%f,%f" % (msg.state,msg.step,msg.time-self.time_offset,msg.temp,msg.TtoTarget,msg.target,msg.cmd)
-
-
-class OvenPlot(Qwt.QwtPlot):
-    """Common base-class for plotting oven data."""
-
-    def __init__(self,comm,parent=None):
-        """Connents newMessage handler to OvenComm instance and sets up common plot format."""
-        super(OvenPlot,self).__init__(parent)
+class OvenLogger(OvenRunLogger):
+    """Logs the status messages of an OvenComm instance (see OvenRunLogger)."""
 
+    def __init__(self,comm,fmt='csv',store='ovenlog.db',prefix='',rollup=None):
+        """Connects newBatch signal handler to OvenComm instance."""
+        OvenRunLogger.__init__(self,fmt,store,prefix,source=comm.port,decoder=comm.protocol.decoder,rollup=rollup)
         self.comm = comm
-        
-        self.setCanvasBackground(QtCore.Qt.white)
-
-        # plot grid
-        grid = Qwt.QwtPlotGrid()
-        pen = QtGui.QPen(QtCore.Qt.DotLine)
-        pen.setColor(QtCore.Qt.black)
-        pen.setWidth(0)
-        grid.setPen(pen)
-        grid.attach(self)
-
-        # plot legend and x-axis (y-axis handled in derived classes)
-        self.insertLegend(Qwt.QwtLegend(), Qwt.QwtPlot.BottomLegend)
-        self.setAxisTitle(Qwt.QwtPlot.xBottom, "Time (seconds)")
-
-        self.times = []
-        self.time_offset = 0.0
-        self.max_idle = (120*4)
-        self.prevstate = 'idle'
-
-        self.reset_plot()
-        
-        comm.newMessage.connect(self.newMessage_handler)
-
-    def newMessage_handler(self,msg):
-        """Callback for newMessage signals - adds new data to plot."""
-
-        if(msg.state == 'idle' and self.prevstate != 'idle'):
-            # when transitioning to idle state, start with a clean plot
-            self.time_offset = msg.time
-            self.reset_plot()
-
-        self.prevstate = msg.state
-        self.update_plot(msg)
-
-    def update_plot(self,msg):
-        """Adds new data to plot, and prunes old data."""
-
-        self.times.append(msg.time-self.time_offset)
-
-        if(msg.state == 'idle'):
-            # when idle, newest entry is always at time 0
-            # (so transition to non-idle state begins at time 0)
-            diff = msg.time - self.time_offset
-            self.time_offset = msg.time
-            self.times = [t - diff for t in self.times]
-
-        if(msg.state == 'idle' and len(self.times) > self.max_idle):
-            # when idle, limit visible window of time to max_idle entries
-            self.times.pop(0)
-
-    def reset_plot(self):
-        """Resets plot to empty (no data) state."""
-        self.times = []
-
-
-class OvenTempPlot(OvenPlot):
-    """Class for plotting temperatures in oven."""
-
-    def __init__(self,comm,parent=None):
-        """Sets up OvenTempPlot-specific formatting."""
-
-        super(OvenTempPlot,self).__init__(comm,parent)
-
-        self.setTitle("Temperature")
-        self.setAxisTitle(Qwt.QwtPlot.yLeft, "Temperature (degrees celsius)")
-
-        self.c_target = Qwt.QwtPlotCurve("Target")
-        self.c_temp = Qwt.QwtPlotCurve("Sensed")
-
-        self.c_target.attach(self)
-        self.c_temp.attach(self)
-        
-        pen = QtGui.QPen()
-        pen.setColor(QtCore.Qt.black)
-        pen.setWidth(3)
-       
-        self.c_target.setPen(pen)
-        self.c_temp.setPen(QtGui.QPen(QtCore.Qt.red))
-
-    def update_plot(self,msg):
-        """Adds new data to plot, and prunes old data."""
-
-        super(OvenTempPlot,self).update_plot(msg)
-
-        self.target.append(msg.target)
-        self.temp.append(msg.temp)
-
-        if(msg.state == 'idle' and len(self.target) > self.max_idle):
-            # when idle, limit visible window of time to max_idle entries
-            self.target.pop(0)
-            self.temp.pop(0)
-
-        self.c_target.setData(self.times,self.target)
-        self.c_temp.setData(self.times,self.temp)
-
-        # actually update the plot
-        self.replot()
-
-    def reset_plot(self):
-        """Resets plot to empty (no data) state."""
-
-        super(OvenTempPlot,self).reset_plot()
-
-        self.target = []
-        self.temp = []
+        self.comm.newBatch.connect(self.log_batch)
 
-
-class OvenCommandPlot(OvenPlot):
-    """Class for plotting power commands to oven."""
-
-    def __init__(self,comm,parent=None):
-        """Sets up OvenCommandPlot-specific formatting."""
-
-        super(OvenCommandPlot,self).__init__(comm,parent)
-
-        self.setTitle("Commands")
-        self.setAxisTitle(Qwt.QwtPlot.yLeft, "Command")
-
-        self.c_cmd = Qwt.QwtPlotCurve("Command")
-
-        self.c_cmd.attach(self)
-        
-        pen = QtGui.QPen()
-        pen.setColor(QtCore.Qt.black)
-        pen.setWidth(4)
-       
-        self.c_cmd.setPen(pen)
-
-    def update_plot(self,msg):
-        """Adds new data to plot, and prunes old data."""
-
-        super(OvenCommandPlot,self).update_plot(msg)
-
-        self.cmd.append(msg.cmd*100.0)
-
-        if(msg.state == 'idle' and len(self.cmd) > self.max_idle):
-            # when idle, limit visible window of time to max_idle entries
-            self.cmd.pop(0)
-
-        self.c_cmd.setData(self.times,self.cmd)
-
-        # actually update the plot
-        self.replot()
-
-    def reset_plot(self):
-        """Resets plot to empty (no data) state."""
-
-        super(OvenCommandPlot,self).reset_plot()
-
-        self.cmd = []
-
-
-class OvenPlots(QtGui.QWidget):
-    """Widget containing all GUI plots for oven controller."""
-
-    def __init__(self,comm,parent=None):
-        """Creates plots and assigns layouts."""
-
-        super(OvenPlots,self).__init__(parent)
-
-        self.temps = OvenTempPlot(comm,parent=self)
-        self.commands = OvenCommandPlot(comm,parent=self)
-
-        l = QtGui.QVBoxLayout()
-        l.addWidget(self.temps)
-        l.addWidget(self.commands)
-
-        self.setLayout(l)
+    def log_batch(self,batch):
+        if(not tracer.enabled):
+            return OvenRunLogger.log_batch(self,batch)
+        t = clock()
+        OvenRunLogger.log_batch(self,batch)
+        tracer.handled(batch,'log',t)
 
 
 class OvenControls(QtGui.QWidget):
@@ -475,13 +229,41 @@ class OvenControls(QtGui.QWidget):
         l.addWidget(self.go_button)
         l.addWidget(self.pause_button)
         l.addWidget(self.resume_button)
-        l.addWidget(self.lblovenstatus)
         #l.addWidget(self.statusframe)
         #l.addWidget(self.lineovenstatus)
 
         self.setLayout(l)
 
 
+class OvenLazy(QtGui.QWidget):
+    """Placeholder that builds its (heavy) content the first time it is shown.
+
+    factory(parent) creates the content widget; importing heavy modules (such as
+    ovenplot, and with it Qwt) inside factory defers their cost as well."""
+
+    def __init__(self,factory,parent=None):
+        super(OvenLazy,self).__init__(parent)
+        self.factory = factory
+        self.widget = None
+        l = QtGui.QVBoxLayout()
+        l.setContentsMargins(0,0,0,0)
+        self.setLayout(l)
+
+    def showEvent(self,ev):
+        if(self.widget is None):
+            self.widget = self.factory(self)
+            self.layout().addWidget(self.widget)
+        super(OvenLazy,self).showEvent(ev)
+
+
+def OvenLazyPlots(comm,parent=None,max_fps=20):
+    """OvenPlots for comm, built (and ovenplot imported) when first shown."""
+    def build(parent):
+        from ovenplot import OvenPlots
+        return OvenPlots(comm,parent=parent,max_fps=max_fps)
+    return OvenLazy(build,parent)
+
+
 class OvenStatuses(QtGui.QWidget):
     """Widget containing all GUI controls for oven controller."""
 
@@ -521,6 +303,48 @@ class OvenStatuses(QtGui.QWidget):
         
         
 
+class OvenTracePanel(QtGui.QWidget):
+    """Debug window showing the pipeline latencies and queue depths collected by oventrace."""
+
+    def __init__(self,parent=None):
+        super(OvenTracePanel,self).__init__(parent,QtCore.Qt.Window)
+        self.setWindowTitle('Oven Telemetry Trace')
+
+        self.text = QtGui.QPlainTextEdit(self)
+        self.text.setReadOnly(True)
+        font = QtGui.QFont('Monospace')
+        font.setStyleHint(QtGui.QFont.TypeWriter)
+        self.text.setFont(font)
+
+        self.reset_button = QtGui.QPushButton("Reset",self)
+        self.reset_button.clicked.connect(self.reset)
+
+        l = QtGui.QVBoxLayout()
+        l.addWidget(self.text)
+        l.addWidget(self.reset_button)
+        self.setLayout(l)
+        self.resize(560,300)
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+
+    def showEvent(self,ev):
+        self.refresh()
+        self.timer.start(1000)
+        super(OvenTracePanel,self).showEvent(ev)
+
+    def hideEvent(self,ev):
+        self.timer.stop()
+        super(OvenTracePanel,self).hideEvent(ev)
+
+    def refresh(self):
+        self.text.setPlainText(tracer.format())
+
+    def reset(self):
+        tracer.reset()
+        self.refresh()
+
+
 class OvenMain(QtGui.QWidget):
     """Widget containing all oven controller GUI elements."""
 
@@ -529,7 +353,7 @@ class OvenMain(QtGui.QWidget):
 
         super(OvenMain,self).__init__(parent)
         
-        #self.plots      = OvenPlots(comm,parent=self)
+        #self.plots      = OvenLazyPlots(comm,parent=self)
         #self.chartframe  = OvenChat(comm,parent=self)
         #self.controls   = OvenControls(comm,parent=self)
         self.statuses   = OvenStatuses(comm,parent=self)
@@ -546,8 +370,9 @@ class OvenMain(QtGui.QWidget):
 class OvenCon(QtGui.QMainWindow):
     """Main window for oven controller GUI."""
 
-    def __init__(self,port):
-        """Sets up main windows and starts application execution."""
+    def __init__(self,port,log_format='csv',publish=None,rollup=None):
+        """Sets up main windows and starts application execution; publish is an address to serve samples on (see ovenpub),
+        rollup a database to merge runs into (see ovenrollup)."""
 
         super(OvenCon,self).__init__()
         
@@ -565,29 +390,119 @@ class OvenCon(QtGui.QMainWindow):
         self.comm       = OvenComm(parent=self,port=port)
 
         # log controller status to disk
-        self.logger     = OvenLogger(self.comm)
+        self.logger     = OvenLogger(self.comm,fmt=log_format,rollup=rollup)
+
+        # serve samples to telemetry subscribers
+        if(publish):
+            from ovenpub import OvenPublisher
+            self.comm.publisher = OvenPublisher(self.comm.loop,publish,(port,))
 
         # create GUI
         self.main       = OvenMain(self.comm,parent=self)
+        self.comm.commandFailed.connect(self.commandFailed_handler)
 
         # associate GUI with window
         self.setCentralWidget(self.main)
         self.setGeometry(QtCore.QRect(10, 10, 797, 641))
+
+    def enable_trace(self,dump='oventrace.jsonl',interval=10.0):
+        """Starts pipeline tracing: F12 toggles the trace panel, and a snapshot is appended to dump every interval seconds."""
+        tracer.enable()
+        self.trace_panel = OvenTracePanel(self)
+        self.trace_key = QtGui.QShortcut(QtGui.QKeySequence(QtCore.Qt.Key_F12),self)
+        self.trace_key.activated.connect(lambda: self.trace_panel.setVisible(not self.trace_panel.isVisible()))
+        self.trace_timer = QtCore.QTimer(self)
+        self.trace_timer.timeout.connect(lambda: tracer.dump(dump))
+        self.trace_timer.start(int(interval*1000))
+
+    def commandFailed_handler(self,msg):
+        """Shows commands the controller did not act on in the status bar."""
+        self.statusBar().showMessage("Command failed - %s" % (msg),5000)
         
 
+class OvenStartupTimer(QtCore.QObject):
+    """Records when the first window paint and the first sample happen, then quits the application.
+
+    Used by --startup-time (see ovenstartup.py); times are printed as seconds since the epoch."""
+
+    def __init__(self,app,window,timeout=15.0):
+        super(OvenStartupTimer,self).__init__()
+        self.app = app
+        self.times = {'module': MODULE_START, 'window': time.time()}
+        app.installEventFilter(self)
+        window.comm.newBatch.connect(self.newBatch_handler)
+        QtCore.QTimer.singleShot(int(timeout*1000),self.done)
+
+    def eventFilter(self,obj,ev):
+        if(ev.type() == QtCore.QEvent.Paint and 'paint' not in self.times):
+            self.times['paint'] = time.time()
+            self.check()
+        return False
+
+    def newBatch_handler(self,batch):
+        if('sample' not in self.times):
+            self.times['sample'] = time.time()
+            self.check()
+
+    def check(self):
+        if('paint' in self.times and 'sample' in self.times):
+            self.done()
+
+    def done(self):
+        sys.stdout.write("startup: %s\n" % (' '.join(["%s=%.6f" % (k,self.times[k]) for k in sorted(self.times)])))
+        sys.stdout.flush()
+        self.app.removeEventFilter(self)
+        self.app.quit()
+
+
 if __name__ == '__main__':
     # start GUI application when invoked stand-alone
     app = QtGui.QApplication(sys.argv)
+    args = sys.argv[1:]
+    startup_time = False
+    trace = False
+    if('--trace' in args):
+        # collect pipeline latencies (F12 shows them; snapshots go to oventrace.jsonl)
+        args.remove('--trace')
+        trace = True
+    if('--startup-time' in args):
+        # report time to first paint and first sample, then exit
+        args.remove('--startup-time')
+        startup_time = True
+    log_format = 'csv'
+    if('--binlog' in args):
+        # write compact binary logs (convert with ovenbinlog.py)
+        args.remove('--binlog')
+        log_format = 'bin'
+    if('--store' in args):
+        # add runs to the ovenlog.db session store (query with ovenstore.py)
+        args.remove('--store')
+        log_format = 'store'
+    rollup = None
+    if('--rollup' in args):
+        # keep run/step/day aggregates and downsampled series in ovenrollup.db (query with ovenrollup.py)
+        args.remove('--rollup')
+        rollup = 'ovenrollup.db'
+    publish = None
+    if('--publish' in args):
+        # serve samples to subscribers on the following address (see ovenpub.py)
+        i = args.index('--publish')
+        publish = args[i+1]
+        del args[i:i+2]
     port = 'COM1'
-    if(len(sys.argv)>1 and sys.argv[1]):
+    if(len(args)>0 and args[0]):
         # get serial port from command line
-        port = sys.argv[1]
+        port = args[0]
     try:
-        qb = OvenCon(port)
-    except serial.SerialException as se:
-        print "failed to open serial port - \"%s\"" % (se)
+        qb = OvenCon(port,log_format,publish,rollup)
+    except (serial.SerialException,socket.error) as se:
+        print "failed to open port - \"%s\"" % (se)
         sys.exit(1)
     else:
+        if(startup_time):
+            timer = OvenStartupTimer(app,qb)
+        if(trace):
+            qb.enable_trace()
         qb.show()
         sys.exit(app.exec_())
 
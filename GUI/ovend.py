@@ -0,0 +1,337 @@
+#! /usr/bin/python
+
+'''
+Headless oven controller daemon - logs runs and accepts commands without Qt.
+
+Copyright (c) 2011, Daniel Strother < http://danstrother.com/ >
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+  - Redistributions of source code must retain the above copyright notice,
+    this list of conditions and the following disclaimer.
+  - Redistributions in binary form must reproduce the above copyright
+    notice, this list of conditions and the following disclaimer in the
+    documentation and/or other materials provided with the distribution.
+  - The name of the author may not be used to endorse or promote products
+    derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS" AND ANY EXPRESS OR IMPLIED
+WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Usage:  ovend.py [-d] [--pidfile file] [--logfile file] [--listen address] [--publish address] [--binlog|--store] [--rollup] [--prefix prefix] port
+        ovend.py --send [--listen address] command [command ...]
+
+The daemon owns the controller's port (serial device or tcp:host:port), logs
+every run exactly as ovencon does, and listens on address (default
+unix:ovend.sock) for clients. Clients speak the controller's own line
+protocol: they receive its status stream unchanged, and the command lines they
+send ("go", "reset", "target: 600", "coefs?", ...) are paced to the controller
+through an OvenCommander. The GUI can therefore attach as a client with
+"ovencon.py unix:ovend.sock". "daemon?" asks the daemon itself for a one-line
+summary. A lost port is reopened every few seconds.
+
+--publish additionally serves the decoded samples in binary form to any number
+of subscribers (see ovenpub). --rollup merges every run into the rollup
+database ovenrollup.db (see ovenrollup).
+
+The daemon's messages go to stderr, or to --logfile; detached (-d) without a
+log file, they go to syslog.
+
+--send sends command lines to a running daemon, printing its replies.
+'''
+
+# Qt-free
+# depends on python-numpy (python-serial for serial ports)
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+
+from ovenio import OvenLoop, OvenProtocol, OvenServer, open_port
+from ovenlogs import OvenRunLogger
+from ovenproto import STATE_NAMES
+from ovenpub import OvenPublisher
+
+DEFAULT_ADDRESS = hasattr(socket,'AF_UNIX') and 'unix:ovend.sock' or 'tcp:127.0.0.1:7010'
+REOPEN_DELAY    = 3.0       # seconds between attempts to (re)open the controller's port
+
+
+class OvenDaemonProtocol(OvenProtocol):
+    """Controller side of the daemon: logs every batch and relays the raw stream to clients."""
+
+    def __init__(self,daemon):
+        OvenProtocol.__init__(self,drain=0.5)
+        self.daemon = daemon
+
+    def data_received(self,data):
+        OvenProtocol.data_received(self,data)
+        self.daemon.broadcast(data)
+
+    def batch_received(self,batch):
+        self.daemon.last = batch[-1]
+        self.daemon.samples += len(batch)
+        self.daemon.logger.log_batch(batch)
+        if(self.daemon.publisher):
+            self.daemon.publisher.publish(batch)
+
+    def command_failed(self,line,reason):
+        self.daemon.log("command \"%s\" failed: %s" % (line,reason))
+
+    def connection_lost(self,exc):
+        OvenProtocol.connection_lost(self,exc)
+        self.daemon.port_lost(exc)
+
+
+class OvenClientProtocol():
+    """One connected client: receives the controller's status stream, sends it command lines."""
+
+    def __init__(self,daemon):
+        self.daemon = daemon
+        self.transport = None
+        self.partial = b''
+        self.synced = False     # status stream is only relayed from the start of a line
+        self.paused = False
+
+    def connection_made(self,transport):
+        self.transport = transport
+        self.daemon.clients.add(self)
+
+    def data_received(self,data):
+        lines = (self.partial + data).split(b'\n')
+        self.partial = lines.pop()
+        for line in lines:
+            line = line.strip()
+            if(line == b'daemon?'):
+                self.transport.write(self.daemon.summary())
+            elif(line):
+                self.daemon.forward(line)
+
+    def eof_received(self):
+        pass
+
+    def connection_lost(self,exc):
+        self.daemon.clients.discard(self)
+        self.transport = None
+
+    def pause_writing(self):
+        # a client that cannot keep up misses data, rather than holding up the others
+        self.paused = True
+        self.synced = False
+
+    def resume_writing(self):
+        self.paused = False
+
+    def relay(self,data):
+        """Passes a chunk of the controller's stream on."""
+        if(self.paused or not self.transport):
+            return
+        if(not self.synced):
+            i = data.find(b'\n')
+            if(i < 0):
+                return
+            data = data[i+1:]
+            self.synced = True
+        self.transport.write(data)
+
+
+class OvenDaemon():
+    """Owns one controller port, its logger and the clients attached to it."""
+
+    def __init__(self,loop,port,address=DEFAULT_ADDRESS,fmt='csv',prefix='',publish=None,rollup=None,syslog=False):
+        """Opens port (retrying until it can be opened) and starts listening for clients on address
+        (and for telemetry subscribers on publish, if given). Runs are merged into the rollup database rollup, if given.
+        Messages go to syslog if requested, else to stderr."""
+        self.syslog = None
+        if(syslog):
+            import syslog
+            syslog.openlog('ovend',syslog.LOG_PID,syslog.LOG_DAEMON)
+            self.syslog = syslog
+        self.loop = loop
+        self.port = port
+        self.protocol = None
+        self.transport = None
+        self.clients = set()
+        self.last = None
+        self.samples = 0
+        self.started = time.time()
+        self.closing = False
+        self.logger = OvenRunLogger(fmt,'ovenlog.db',prefix,source=port,rollup=rollup)
+        self.server = OvenServer(loop,address,lambda: OvenClientProtocol(self))
+        self.publisher = None
+        if(publish):
+            self.publisher = OvenPublisher(loop,publish,(os.path.basename(port),))
+        self.open()
+
+    def log(self,msg):
+        if(self.syslog):
+            self.syslog.syslog(msg)
+            return
+        sys.stderr.write("%s ovend: %s\n" % (time.strftime('%Y-%m-%d %H:%M:%S'),msg))
+        sys.stderr.flush()
+
+    def open(self):
+        """Opens the controller's port; on failure, tries again later."""
+        if(self.closing):
+            return
+        self.protocol = OvenDaemonProtocol(self)
+        self.logger.decoder = self.protocol.decoder
+        try:
+            self.transport = open_port(self.loop,self.port,self.protocol)
+        except (EnvironmentError,socket.error,ValueError) as e:   # serial.SerialException is an IOError
+            self.log("cannot open %s - %s" % (self.port,e))
+            self.transport = None
+            self.loop.call_later(REOPEN_DELAY,self.open)
+            return
+        self.log("opened %s" % (self.port))
+
+    def port_lost(self,exc):
+        """Called when the controller's port closes."""
+        self.transport = None
+        if(self.closing):
+            return
+        self.log("lost %s (%s), reopening" % (self.port,exc or 'end of file'))
+        self.loop.call_later(REOPEN_DELAY,self.open)
+
+    def broadcast(self,data):
+        """Relays raw controller output to every client."""
+        for c in list(self.clients):
+            c.relay(data)
+
+    def forward(self,line):
+        """Passes a client's command line to the controller (setpoints coalesced, all paced)."""
+        if(not self.transport or not self.protocol.commander):
+            return
+        key = line.split(b':',1)[0]
+        if(key in (b'target',b'cmd')):
+            self.protocol.commander.setpoint(key,line)
+        else:
+            self.protocol.commander.submit(line)
+
+    def summary(self):
+        """One-line description of the daemon's state, as sent in reply to "daemon?"."""
+        if(self.last is None):
+            state = 'unknown'
+            temp = target = float('nan')
+        else:
+            state = STATE_NAMES[int(self.last['state'])]
+            temp = self.last['temp']*0.25
+            target = self.last['target']*0.25
+        return ("* Daemon: port=%s open=%d state=%s temp=%.2f target=%.2f samples=%d clients=%d uptime=%d\n" %
+                (self.port,self.transport is not None,state,temp,target,self.samples,len(self.clients),
+                 time.time()-self.started)).encode('ascii')
+
+    def close(self):
+        """Closes port, clients, server and log (loop thread only)."""
+        self.closing = True
+        self.server.close()
+        for c in list(self.clients):
+            if(c.transport):
+                c.transport.close()
+        if(self.transport):
+            self.transport.close()
+        if(self.publisher):
+            self.publisher.close()
+        self.logger.close()
+
+
+def daemonize(pidfile=None,logfile=None):
+    """Detaches from the terminal (POSIX double fork); stdout and stderr are appended to logfile
+    (default: /dev/null)."""
+    if(os.fork()):
+        os._exit(0)
+    os.setsid()
+    if(os.fork()):
+        os._exit(0)
+    devnull = os.open(os.devnull,os.O_RDWR)
+    out = devnull
+    if(logfile):
+        out = os.open(logfile,os.O_WRONLY|os.O_APPEND|os.O_CREAT,0o644)
+    os.dup2(devnull,0)
+    os.dup2(out,1)
+    os.dup2(out,2)
+    if(pidfile):
+        f = open(pidfile,'w')
+        f.write("%d\n" % (os.getpid()))
+        f.close()
+
+
+def send_commands(address,commands,wait=0.5):
+    """Sends command lines to a running daemon; returns whatever it replied within wait seconds."""
+    if(address.startswith('unix:')):
+        sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+        sock.connect(address[5:])
+    else:
+        (host,port) = address[4:].rsplit(':',1)
+        sock = socket.create_connection((host,int(port)))
+    sock.sendall(b''.join([c.encode('ascii')+b'\n' for c in commands]))
+    sock.settimeout(wait)
+    replies = []
+    end = time.time() + wait
+    try:
+        while(time.time() < end):
+            data = sock.recv(4096)
+            if(not data):
+                break
+            replies.append(data)
+    except socket.timeout:
+        pass
+    sock.close()
+    # only the daemon's and controller's replies, not the status stream
+    lines = b''.join(replies).split(b'\n')
+    return [l.decode('ascii','replace') for l in lines if l.startswith(b'* ')]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Headless oven controller daemon.")
+    parser.add_argument('-d',action='store_true',help="detach and run in the background")
+    parser.add_argument('--pidfile',default=None)
+    parser.add_argument('--logfile',default=None,help="append messages to this file (default: stderr, or syslog with -d)")
+    parser.add_argument('--listen',default=DEFAULT_ADDRESS,help="client address, unix:path or tcp:host:port")
+    parser.add_argument('--publish',default=None,help="serve samples to subscribers (see ovenpub) on this address")
+    parser.add_argument('--binlog',action='store_true',help="write binary logs (see ovenbinlog)")
+    parser.add_argument('--store',action='store_true',help="add runs to the ovenlog.db session store")
+    parser.add_argument('--rollup',action='store_true',help="merge runs into the rollup database (see ovenrollup)")
+    parser.add_argument('--prefix',default='',help="log file name prefix (may include a directory)")
+    parser.add_argument('--send',action='store_true',help="send the given command lines to a running daemon")
+    parser.add_argument('args',nargs='+',metavar='port|command')
+    args = parser.parse_args()
+
+    if(args.send):
+        for reply in send_commands(args.listen,args.args):
+            sys.stdout.write(reply+'\n')
+        sys.exit(0)
+
+    fmt = (args.store and 'store') or (args.binlog and 'bin') or 'csv'
+    if(args.d):
+        daemonize(args.pidfile and os.path.abspath(args.pidfile),args.logfile and os.path.abspath(args.logfile))
+    elif(args.logfile):
+        f = open(args.logfile,'a')
+        os.dup2(f.fileno(),2)
+        f.close()
+    loop = OvenLoop()
+    daemon = OvenDaemon(loop,args.args[0],args.listen,fmt,args.prefix,args.publish,
+                        args.rollup and 'ovenrollup.db' or None,syslog=(args.d and not args.logfile))
+
+    def terminate(signum,frame):
+        loop.stop()
+    signal.signal(signal.SIGTERM,terminate)
+    signal.signal(signal.SIGINT,terminate)
+
+    loop.run_forever()
+    daemon.close()
+    for i in range(4):
+        loop.run_once(0.05)     # let transports finish closing
+    loop.close()
+    if(args.pidfile and args.d):
+        os.unlink(os.path.abspath(args.pidfile))
@@ -0,0 +1,292 @@
+#! /usr/bin/python
+
+'''
+Golden-run comparison - checks a run against a set of known-good reference runs.
+
+Copyright (c) 2011, Daniel Strother < http://danstrother.com/ >
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+  - Redistributions of source code must retain the above copyright notice,
+    this list of conditions and the following disclaimer.
+  - Redistributions in binary form must reproduce the above copyright
+    notice, this list of conditions and the following disclaimer in the
+    documentation and/or other materials provided with the distribution.
+  - The name of the author may not be used to endorse or promote products
+    derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS" AND ANY EXPRESS OR IMPLIED
+WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Usage:  ovengolden.py build [-j processes] [--dt seconds] golden.npz dir|log [...]
+        ovengolden.py compare [-j processes] [--tolerance C] [--max-lag seconds] [-o envelope.csv]
+                              run golden.npz|dir|log [...]
+
+Runs are resampled to a uniform grid (DT seconds, from their first sample -
+logs start at arbitrary controller times) and aligned in two steps: coarsely on
+their start of heating (the temperature first rising HEAT_RISE above its
+initial level, placed PRE_HEAT seconds into the grid), then finely by the lag
+(within max_lag) that maximizes the cross-correlation of the heating rates. The
+fine alignment of a run against every reference is computed at once, from the
+FFTs of a reference matrix.
+
+The aligned references give a pointwise envelope (min, 5th/50th/95th
+percentile, max) and the run's deviation from each reference (RMS and
+largest). The run passes if it stays within the 5th-95th percentile band
+widened by tolerance degrees wherever at least MIN_COVER references exist.
+
+"build" saves the resampled references (loaded across a process pool) as a
+golden set, so that "compare" only has to load the run; its exit status is 1
+if the run fails.
+'''
+
+# depends on python-numpy
+import argparse
+import glob
+import multiprocessing
+import numpy
+import os
+import sys
+
+from ovenlogs import load_log
+from ovenproto import unwrap_time
+
+DT          = 1.0       # grid spacing (seconds)
+HEAT_RISE   = 5.0       # rise (degrees) above the initial temperature marking the start of heating
+PRE_HEAT    = 30.0      # seconds of grid kept before the start of heating
+SLOPE_SPAN  = 5.0       # heating rates (for fine alignment) are taken over this many seconds
+MAX_LAG     = 30.0      # default fine alignment search range (seconds either way)
+TOLERANCE   = 2.0       # default widening (degrees) of the percentile band a run must stay within
+MIN_COVER   = 3         # grid points covered by fewer references are not judged
+
+
+def resample(batch,dt=DT):
+    """Temperature (degrees) of a run on a uniform grid of dt seconds from its first sample."""
+    t = unwrap_time(batch['time'])
+    t = (t - t[0])*0.25
+    # samples whose time does not advance (garbled or repeated) are dropped; gaps are interpolated across
+    keep = numpy.concatenate(([True],t[1:] > numpy.maximum.accumulate(t)[:-1]))
+    t = t[keep]
+    grid = numpy.arange(0.0,t[-1]+dt/2,dt)
+    return numpy.interp(grid,t,batch['temp'][keep]*0.25).astype(numpy.float32)
+
+
+def heat_start(temps,dt=DT,rise=HEAT_RISE):
+    """Grid index at which each row of temps (NaN padded) first rises rise degrees above
+    its lowest temperature of the first 10 seconds (0 if it never does)."""
+    temps = numpy.atleast_2d(temps)
+    base = numpy.nanmin(temps[:,:max(1,int(round(10.0/dt)))],axis=1)
+    above = temps >= (base+rise)[:,None]
+    return numpy.where(above.any(axis=1),numpy.argmax(above,axis=1),0)
+
+
+def heat_align(temp,dt=DT,pre=PRE_HEAT):
+    """Crops/pads (NaN) a resampled run so that its start of heating is pre seconds into it."""
+    p = int(round(pre/dt))
+    s = int(heat_start(temp,dt)[0])
+    if(s >= p):
+        return temp[s-p:]
+    return numpy.concatenate((numpy.full(p-s,numpy.nan,numpy.float32),temp))
+
+
+def stack(rows):
+    """(m,L) float32 matrix of rows of different lengths, NaN padded."""
+    m = numpy.full((len(rows),max([len(r) for r in rows])),numpy.nan,numpy.float32)
+    for (i,r) in enumerate(rows):
+        m[i,:len(r)] = r
+    return m
+
+
+def slopes(temps,dt=DT):
+    """Heating rate signal of each row (0 where undefined), used for cross-correlation."""
+    k = max(1,int(round(SLOPE_SPAN/dt)))
+    temps = numpy.atleast_2d(temps)
+    s = temps[:,k:] - temps[:,:-k]
+    return numpy.where(numpy.isnan(s),0.0,s)
+
+
+def best_lags(run,refs,max_lag,dt=DT):
+    """Lag (grid points) of every reference that best matches run: refs[i,j+lag[i]] ~ run[j]."""
+    a = slopes(refs,dt)
+    b = slopes(run,dt)[0]
+    n = 1
+    while(n < a.shape[1] + len(b)):
+        n *= 2
+    # circular cross-correlation of all references at once: corr[i,k] = sum_j a[i,j+k]*b[j]
+    corr = numpy.fft.irfft(numpy.fft.rfft(a,n,axis=1)*numpy.conj(numpy.fft.rfft(b,n))[None,:],n,axis=1)
+    k = int(round(max_lag/dt))
+    window = numpy.concatenate((corr[:,n-k:],corr[:,:k+1]),axis=1)     # lags -k..k
+    return numpy.argmax(window,axis=1) - k
+
+
+def shift_rows(refs,lags,length):
+    """(m,length) matrix of refs[i,j+lags[i]], NaN where a reference does not reach."""
+    idx = numpy.arange(length)[None,:] + lags[:,None]
+    valid = (idx >= 0) & (idx < refs.shape[1])
+    out = refs[numpy.arange(len(refs))[:,None],numpy.clip(idx,0,refs.shape[1]-1)]
+    return numpy.where(valid,out,numpy.nan)
+
+
+def envelope(aligned):
+    """Pointwise min, p5, p50, p95, max and count of the non-NaN values of each column."""
+    s = numpy.sort(aligned,axis=0)      # NaNs sort last
+    count = (~numpy.isnan(aligned)).sum(axis=0)
+    cols = numpy.arange(aligned.shape[1])
+    last = numpy.maximum(count-1,0)
+    env = {'count': count}
+    for (name,p) in (('min',0),('p5',5),('p50',50),('p95',95),('max',100)):
+        env[name] = numpy.where(count > 0,s[(last*p)//100,cols],numpy.nan)
+    return env
+
+
+class OvenGoldenSet():
+    """Reference runs, resampled to a common grid and aligned on their start of heating."""
+
+    def __init__(self,temps,names,dt=DT):
+        """temps is a (references,grid) matrix (NaN padded), aligned by heat_align()."""
+        self.temps = numpy.asarray(temps,numpy.float32)
+        self.names = list(names)
+        self.dt = dt
+
+    @staticmethod
+    def from_logs(paths,dt=DT,processes=None):
+        """Loads and resamples every log in paths (files or directories of *.csv/*.ovl) across a process pool."""
+        logs = []
+        for p in paths:
+            if(os.path.isdir(p)):
+                logs += glob.glob(os.path.join(p,'*.csv')) + glob.glob(os.path.join(p,'*.ovl'))
+            else:
+                logs.append(p)
+        logs = sorted(logs)
+        if(processes == 1 or len(logs) < 8):
+            rows = [_load_reference((path,dt)) for path in logs]
+        else:
+            pool = multiprocessing.Pool(processes)
+            try:
+                rows = pool.map(_load_reference,[(path,dt) for path in logs])
+            finally:
+                pool.close()
+                pool.join()
+        kept = [(os.path.basename(path),r) for (path,r) in zip(logs,rows) if r is not None]
+        if(not kept):
+            raise ValueError("no usable reference runs")
+        return OvenGoldenSet(stack([r for (n,r) in kept]),[n for (n,r) in kept],dt)
+
+    @staticmethod
+    def load(path):
+        """Loads a golden set saved by save()."""
+        f = numpy.load(path)
+        try:
+            return OvenGoldenSet(f['temps'],[n for n in f['names'].tolist()],float(f['dt']))
+        finally:
+            f.close()
+
+    def save(self,path):
+        f = open(path,'wb')
+        numpy.savez_compressed(f,temps=self.temps,names=numpy.array(self.names),dt=self.dt)
+        f.close()
+
+    def compare(self,batch,max_lag=MAX_LAG,tolerance=TOLERANCE):
+        """Compares a run (MSG_DTYPE batch) with every reference.
+
+        Returns a dict: 'time' (grid, seconds from the run's start of heating), 'temp' (the
+        run), the envelope() arrays, 'lag' (seconds each reference was shifted by), 'rms' and
+        'max_dev' (deviation from each reference), 'outside' (degrees beyond the widened
+        band, 0 inside), 'worst'/'worst_time' and 'passed'."""
+        temp = heat_align(resample(batch,self.dt),self.dt)
+        lags = best_lags(temp,self.temps,max_lag,self.dt)
+        aligned = shift_rows(self.temps,lags,len(temp))
+
+        with numpy.errstate(invalid='ignore'):
+            dev = temp[None,:] - aligned
+            covered = ~numpy.isnan(dev)
+            n = numpy.maximum(covered.sum(axis=1),1)
+            sq = numpy.where(covered,dev*dev,0.0)
+            absdev = numpy.where(covered,numpy.abs(dev),0.0)
+            env = envelope(aligned)
+            judged = (env['count'] >= MIN_COVER) & ~numpy.isnan(temp)
+            outside = numpy.maximum(temp-(env['p95']+tolerance),(env['p5']-tolerance)-temp)
+            outside = numpy.where(judged,numpy.maximum(outside,0.0),0.0)
+
+        worst = int(numpy.argmax(outside))
+        result = {'time': (numpy.arange(len(temp))*self.dt - PRE_HEAT), 'temp': temp,
+                  'lag': lags*self.dt, 'rms': numpy.sqrt(sq.sum(axis=1)/n), 'max_dev': absdev.max(axis=1),
+                  'outside': outside, 'judged': judged, 'worst': float(outside[worst]),
+                  'worst_time': worst*self.dt - PRE_HEAT, 'passed': not (outside > 0).any()}
+        result.update(env)
+        return result
+
+
+def _load_reference(args):
+    """Pool worker - loads and aligns one reference log (None if unusable)."""
+    (path,dt) = args
+    try:
+        batch = load_log(path)
+    except (IOError,ValueError) as e:
+        sys.stderr.write("%s: %s\n" % (path,e))
+        return None
+    if(len(batch) < 2):
+        sys.stderr.write("%s: too short\n" % (path))
+        return None
+    return heat_align(resample(batch,dt),dt)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare oven runs with known-good reference runs.")
+    sub = parser.add_subparsers(dest='command')
+    p = sub.add_parser('build',help="save reference runs as a golden set")
+    p.add_argument('-j',type=int,default=None,help="worker processes (default: one per CPU)")
+    p.add_argument('--dt',type=float,default=DT,help="grid spacing (seconds)")
+    p.add_argument('golden')
+    p.add_argument('refs',nargs='+')
+    p = sub.add_parser('compare',help="compare a run with a golden set (or reference logs)")
+    p.add_argument('-j',type=int,default=None,help="worker processes (default: one per CPU)")
+    p.add_argument('--tolerance',type=float,default=TOLERANCE,help="degrees allowed outside the 5-95%% band")
+    p.add_argument('--max-lag',type=float,default=MAX_LAG,help="fine alignment search range (seconds)")
+    p.add_argument('--top',type=int,default=5,help="number of closest references printed")
+    p.add_argument('-o',default=None,help="write the run and envelope to this CSV")
+    p.add_argument('run')
+    p.add_argument('refs',nargs='+',help="golden set (.npz) or reference logs")
+    args = parser.parse_args()
+    if(not args.command):
+        parser.error("a command is required")
+
+    if(args.command == 'build'):
+        golden = OvenGoldenSet.from_logs(args.refs,args.dt,args.j)
+        golden.save(args.golden)
+        sys.stdout.write("%d reference runs, %d grid points\n" % golden.temps.shape)
+        sys.exit(0)
+
+    if(len(args.refs) == 1 and args.refs[0].endswith('.npz')):
+        golden = OvenGoldenSet.load(args.refs[0])
+    else:
+        golden = OvenGoldenSet.from_logs(args.refs,processes=args.j)
+    r = golden.compare(load_log(args.run),args.max_lag,args.tolerance)
+
+    order = numpy.argsort(r['rms'])
+    sys.stdout.write("%-24s %8s %8s %8s\n" % ('closest references','lag','rms','max'))
+    for i in order[:args.top].tolist():
+        sys.stdout.write("%-24s %7.1fs %7.2fC %7.2fC\n" % (golden.names[i],r['lag'][i],r['rms'][i],r['max_dev'][i]))
+    sys.stdout.write("%d references, rms median %.2fC; %d of %d points judged: " % (
+        len(golden.names),numpy.median(r['rms']),r['judged'].sum(),len(r['temp'])))
+    if(r['passed']):
+        sys.stdout.write("PASS\n")
+    else:
+        sys.stdout.write("FAIL, %d points outside, worst by %.2fC at %+.0fs\n" % ((r['outside'] > 0).sum(),r['worst'],r['worst_time']))
+
+    if(args.o):
+        f = open(args.o,'w')
+        f.write("time,temp,min,p5,p50,p95,max,count,outside\n")
+        for row in zip(*[r[k].tolist() for k in ('time','temp','min','p5','p50','p95','max','count','outside')]):
+            f.write("%.2f,%.2f,%.2f,%.2f,%.2f,%.2f,%.2f,%d,%.2f\n" % row)
+        f.close()
+    sys.exit(not r['passed'] and 1 or 0)
@@ -0,0 +1,166 @@
+'''
+Fixed-capacity sample history for the oven controller GUI plots.
+
+Copyright (c) 2011, Daniel Strother < http://danstrother.com/ >
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+  - Redistributions of source code must retain the above copyright notice,
+    this list of conditions and the following disclaimer.
+  - Redistributions in binary form must reproduce the above copyright
+    notice, this list of conditions and the following disclaimer in the
+    documentation and/or other materials provided with the distribution.
+  - The name of the author may not be used to endorse or promote products
+    derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS" AND ANY EXPRESS OR IMPLIED
+WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+'''
+
+# depends on python-numpy
+import numpy
+
+from ovenproto import MSG_DTYPE, split_runs
+
+
+class OvenHistory():
+    """Fixed-capacity ring buffer of plotted oven samples.
+
+    Temperatures are kept in the controller's native 0.25C units (int16) and
+    commands in its native 0-255 range (uint8); times are absolute controller
+    times in seconds (float32).
+
+    Every sample is written twice - at index i and at index i+capacity - so the
+    retained samples are always available, oldest first, as one contiguous
+    slice of each column. Appending, trimming and clearing are all O(1)."""
+
+    columns = (
+        ('times',   numpy.float32),
+        ('temp',    numpy.int16),
+        ('target',  numpy.int16),
+        ('cmd',     numpy.uint8),
+    )
+
+    def __init__(self,capacity):
+        """Preallocates storage for capacity samples."""
+        self.capacity = capacity
+        for (name,dtype) in self.columns:
+            setattr(self, name, numpy.zeros(2*capacity, dtype))
+        self.clear()
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        """Discards all samples (storage is retained)."""
+        self.head   = 0     # index of the next sample to be written
+        self.count  = 0     # number of retained samples
+        self.total  = 0     # number of samples added since clear() (retained or not)
+
+    def append(self,time,temp,target,cmd):
+        """Adds a sample, overwriting the oldest one once capacity is reached.
+
+        temp and target are in 0.25C units; cmd is 0-255."""
+        i = self.head
+        j = i + self.capacity
+        self.times[i]   = self.times[j]     = time
+        self.temp[i]    = self.temp[j]      = temp
+        self.target[i]  = self.target[j]    = target
+        self.cmd[i]     = self.cmd[j]       = cmd
+
+        self.head = i+1
+        if(self.head == self.capacity):
+            self.head = 0
+        if(self.count < self.capacity):
+            self.count += 1
+        self.total += 1
+
+    def extend(self,times,temp,target,cmd):
+        """Adds a block of samples (equal-length arrays), as repeated append() would."""
+        n = len(times)
+        self.total += n
+        cols = [times,temp,target,cmd]
+        if(n > self.capacity):
+            cols = [c[n-self.capacity:] for c in cols]
+            n = self.capacity
+        i = self.head
+        first = min(n, self.capacity-i)     # samples written before wrapping around
+        rest = n - first
+        j = i + self.capacity
+        for ((name,dtype),c) in zip(self.columns,cols):
+            col = getattr(self,name)
+            col[i:i+first] = col[j:j+first] = c[:first]
+            if(rest):
+                col[:rest] = col[self.capacity:self.capacity+rest] = c[first:]
+
+        self.head = (i+n) % self.capacity
+        self.count = min(self.count+n, self.capacity)
+
+    def trim(self,n):
+        """Retains only the newest n samples."""
+        if(self.count > n):
+            self.count = n
+
+    def view(self,name):
+        """Returns a contiguous view (oldest first) of the retained samples of one column.
+
+        The view aliases the ring storage - copy it if it must outlive the next append()."""
+        end = self.head + self.capacity
+        return getattr(self,name)[end-self.count:end]
+
+
+class OvenRecent():
+    """The latest messages (MSG_DTYPE records, at most capacity) of one oven's current run.
+
+    A new run (see ovenproto.split_runs) discards the messages of the one before, so
+    that they are not drawn, or replayed, as part of it."""
+
+    def __init__(self,capacity):
+        """Preallocates storage for capacity messages."""
+        self.ring = numpy.zeros(capacity,MSG_DTYPE)
+        self.head = 0       # index of the next message to be written
+        self.count = 0      # number of retained messages
+        self.prev = None    # the last message added (None: none yet)
+
+    def __len__(self):
+        return self.count
+
+    def add(self,batch):
+        """Adds a batch of messages, starting over at every run boundary within it."""
+        if(not len(batch)):
+            return
+        for (seg,new_run) in split_runs(batch,self.prev):
+            if(new_run):
+                self.head = 0
+                self.count = 0
+            self._extend(seg)
+        self.prev = batch[-1].copy()
+
+    def _extend(self,batch):
+        n = len(batch)
+        cap = len(self.ring)
+        if(n >= cap):
+            self.ring[:] = batch[n-cap:]
+            self.head = 0
+        else:
+            i = self.head
+            first = min(n,cap-i)
+            self.ring[i:i+first] = batch[:first]
+            self.ring[:n-first] = batch[first:]
+            self.head = (i+n) % cap
+        self.count = min(self.count+n,cap)
+
+    def samples(self):
+        """The retained messages, oldest first (MSG_DTYPE array)."""
+        if(self.count < len(self.ring)):
+            return self.ring[:self.count]
+        return numpy.concatenate((self.ring[self.head:],self.ring[:self.head]))
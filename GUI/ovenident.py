@@ -0,0 +1,238 @@
+#! /usr/bin/python
+
+'''
+Thermal plant identification from recorded oven runs.
+
+Copyright (c) 2011, Daniel Strother < http://danstrother.com/ >
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+  - Redistributions of source code must retain the above copyright notice,
+    this list of conditions and the following disclaimer.
+  - Redistributions in binary form must reproduce the above copyright
+    notice, this list of conditions and the following disclaimer in the
+    documentation and/or other materials provided with the distribution.
+  - The name of the author may not be used to endorse or promote products
+    derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS" AND ANY EXPRESS OR IMPLIED
+WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Usage:  ovenident.py [-j processes] [-o models.csv] [--max-delay seconds] dir|log [...]
+
+Two plant models are fitted, with u the heater duty (0-1) and T the oven
+temperature:
+
+  fopdt   first order plus dead time: gain K, time constant tau, dead time L
+          tau*dT/dt = K*u(t-L) - (T - ambient)
+  sopdt   second order plus dead time: the same with u passed through two lags
+          tau1 and tau2 in series
+
+Ambient is the run's first temperature; the oven is taken to start at rest.
+The parameters minimize the error of the free-run simulation (output error)
+rather than of the one-step prediction: at 4Hz consecutive temperatures are
+nearly equal, and an equation-error fit mostly models the sensor noise. Time
+constants and dead time are searched on a grid at 1s (every combination at
+once, the gain following by least squares), then refined around the best point
+at the full 4Hz rate. Logs are processed in parallel; one row of fitted
+parameters per run and model is written, skipping earlier results files.
+'''
+
+# depends on python-numpy
+import argparse
+import glob
+import itertools
+import math
+import multiprocessing
+import numpy
+import os
+import sys
+
+from ovenlogs import load_log
+from ovenproto import TIME_WRAP
+
+DT = 0.25   # controller sample period (seconds)
+DECIMATE = 4                                # grid search at every 4th sample period (1s)
+TAU_GRID = numpy.geomspace(1.0,4000.0,48)   # time constants searched (seconds)
+REFINE = 3                                  # refinement rounds at 4Hz
+
+RESULT_COLUMNS = ('log','model','samples','K','tau1','tau2','dead_time','ambient','rmse')
+
+
+def contiguous(batch):
+    """Returns the longest stretch of batch without gaps (or garbled times) in controller time.
+
+    The controller's 16-bit time wrapping around is not a gap."""
+    t = batch['time'].astype(numpy.int64)
+    breaks = numpy.flatnonzero(numpy.diff(t) % TIME_WRAP != 1) + 1
+    bounds = numpy.concatenate(([0],breaks,[len(batch)]))
+    i = numpy.argmax(numpy.diff(bounds))
+    return batch[bounds[i]:bounds[i+1]]
+
+
+def lag(x,taus,dt):
+    """Unity-gain first-order lag, starting at rest, of x through each of taus (seconds).
+
+    x is one signal, or one row per time constant; returns one row per time constant."""
+    a = numpy.exp(-dt/numpy.asarray(taus,dtype=float))
+    x = numpy.broadcast_to(x,(len(a),x.shape[-1]))
+    y = numpy.zeros(x.shape)
+    for k in range(x.shape[1]-1):
+        y[:,k+1] = a*y[:,k] + (1.0-a)*x[:,k]
+    return y
+
+
+def responses(u,taus,dt):
+    """Response to u of each candidate's lags in series (taus: one row of time constants per candidate)."""
+    x = u
+    for s in range(taus.shape[1]):
+        x = lag(x,taus[:,s],dt)
+    return x
+
+
+def fit_gains(e,X,delays):
+    """Least-squares gain for every response in X (rows), delayed by each of delays, to the excursion e.
+
+    Returns (K, sse), both indexed [response, delay]."""
+    n = len(e)
+    K = numpy.zeros((len(X),len(delays)))
+    sse = numpy.zeros(K.shape)
+    for (j,d) in enumerate(delays):
+        x = X[:,:n-d]
+        num = x.dot(e[d:])
+        den = (x*x).sum(axis=1)
+        ok = den > 0
+        K[ok,j] = num[ok]/den[ok]
+        sse[:,j] = (e*e).sum() - K[:,j]*num
+    return (K,sse)
+
+
+def fit_oe(y,u,stages,max_delay):
+    """Output-error fit of stages lags in series plus dead time to a run (4Hz samples), ambient y[0].
+
+    Returns (K, time constants in seconds (largest first), dead time in samples, ambient, rmse)."""
+    ambient = y[0]
+    e = y - ambient
+
+    # grid search at 1s: every combination of time constants (largest first) and dead time
+    m = len(y)//DECIMATE
+    if(m < 8*(stages+2)):
+        raise ValueError("run too short for identification")
+    ed = e[:m*DECIMATE].reshape(m,DECIMATE).mean(axis=1)
+    ud = u[:m*DECIMATE].reshape(m,DECIMATE).mean(axis=1)
+    grid = numpy.array(list(itertools.combinations_with_replacement(TAU_GRID[::-1],stages)))
+    delays = numpy.arange(min(max_delay//DECIMATE,m//3)+1)
+    (K,sse) = fit_gains(ed,responses(ud,grid,DT*DECIMATE),delays)
+    (i,j) = numpy.unravel_index(numpy.argmin(sse),sse.shape)
+    taus = grid[i]
+    d = delays[j]*DECIMATE
+
+    # refine at 4Hz on ever finer grids around the best point
+    step = TAU_GRID[1]/TAU_GRID[0]
+    for r in range(REFINE):
+        grid = numpy.array(list(itertools.product(*[t*step**numpy.linspace(-1,1,5) for t in taus])))
+        delays = numpy.arange(max(d-DECIMATE,0),min(d+DECIMATE,max_delay)+1)
+        (K,sse) = fit_gains(e,responses(u,grid,DT),delays)
+        (i,j) = numpy.unravel_index(numpy.argmin(sse),sse.shape)
+        taus = grid[i]
+        d = delays[j]
+        step = step**0.5
+
+    rmse = math.sqrt(max(sse[i,j],0.0)/len(e))
+    return (float(K[i,j]),sorted([float(t) for t in taus],reverse=True),int(d),float(ambient),rmse)
+
+
+def identify(batch,max_delay=60.0):
+    """Fits first- and second-order plus dead time models to one run.
+
+    Returns list of result dicts (RESULT_COLUMNS); time values are in seconds,
+    temperatures in degrees, K in degrees per full heater duty, rmse that of the
+    free-run simulation."""
+    batch = contiguous(batch)
+    y = batch['temp']*0.25
+    u = batch['cmd']/255.0
+    results = []
+    for (model,stages) in (('fopdt',1),('sopdt',2)):
+        (K,taus,d,ambient,rmse) = fit_oe(y,u,stages,int(max_delay/DT))
+        r = {'model': model, 'samples': len(y), 'K': K, 'tau1': taus[0], 'tau2': float('nan'),
+             'dead_time': d*DT, 'ambient': ambient, 'rmse': rmse}
+        if(stages > 1):
+            r['tau2'] = taus[1]
+        results.append(r)
+    return results
+
+
+def _identify_log(args):
+    """Pool worker - identifies one log file."""
+    (path,max_delay) = args
+    try:
+        results = identify(load_log(path),max_delay)
+    except (ValueError,numpy.linalg.LinAlgError) as e:
+        sys.stderr.write("%s: %s\n" % (path,e))
+        return []
+    for r in results:
+        r['log'] = os.path.basename(path)
+    return results
+
+
+def is_results(path):
+    """True if path is a results file written by this tool (not a log)."""
+    f = open(path,'rb')
+    header = f.readline()
+    f.close()
+    return header.strip() == ','.join(RESULT_COLUMNS).encode('ascii')
+
+
+def identify_logs(paths,processes=None,max_delay=60.0):
+    """Identifies every log in paths (files or directories of *.csv/*.ovl) across a process pool.
+
+    Returns list of result dicts, ordered by log."""
+    logs = []
+    for p in paths:
+        if(os.path.isdir(p)):
+            logs += [c for c in glob.glob(os.path.join(p,'*.csv')) if not is_results(c)]
+            logs += glob.glob(os.path.join(p,'*.ovl'))
+        else:
+            logs.append(p)
+    logs = sorted(logs)
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.map(_identify_log,[(path,max_delay) for path in logs])
+    finally:
+        pool.close()
+        pool.join()
+    return [r for rs in results for r in rs]
+
+
+def write_results(results,f):
+    """Writes identification results as CSV."""
+    f.write(','.join(RESULT_COLUMNS)+'\n')
+    for r in results:
+        f.write('%s,%s,%d,%.4f,%.2f,%.2f,%.2f,%.2f,%.3f\n' % tuple([r[c] for c in RESULT_COLUMNS]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Identify oven thermal models from recorded runs.")
+    parser.add_argument('-j',type=int,default=None,help="worker processes (default: one per CPU)")
+    parser.add_argument('-o',default=None,help="output CSV (default: stdout)")
+    parser.add_argument('--max-delay',type=float,default=60.0,help="longest dead time considered (seconds)")
+    parser.add_argument('logs',nargs='+')
+    args = parser.parse_args()
+
+    results = identify_logs(args.logs,args.j,args.max_delay)
+    if(args.o):
+        f = open(args.o,'w')
+        write_results(results,f)
+        f.close()
+    else:
+        write_results(results,sys.stdout)
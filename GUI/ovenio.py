@@ -0,0 +1,628 @@
+'''
+Event-driven I/O for oven controllers: one loop services any number of ports without per-port threads.
+
+Copyright (c) 2011, Daniel Strother < http://danstrother.com/ >
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+  - Redistributions of source code must retain the above copyright notice,
+    this list of conditions and the following disclaimer.
+  - Redistributions in binary form must reproduce the above copyright
+    notice, this list of conditions and the following disclaimer in the
+    documentation and/or other materials provided with the distribution.
+  - The name of the author may not be used to endorse or promote products
+    derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS" AND ANY EXPRESS OR IMPLIED
+WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+The classes follow asyncio's loop/transport/protocol split (the GUI still runs
+on Python 2, which has no asyncio):
+
+  OvenLoop          select()-based event loop: readers, writers, call_soon(),
+                    call_later(); call_soon_threadsafe() and stop() may be used
+                    from other threads
+  OvenTransport     non-blocking byte stream over a file descriptor (serial
+                    port, pseudo-terminal or TCP socket), with a write buffer
+                    and high/low water marks for flow control
+  OvenThreadTransport
+                    the same for serial ports without a pollable descriptor
+                    (Windows): a reader thread hands data to the loop
+  OvenProtocol      decodes status lines into MSG_DTYPE batches
+
+Transports and protocols belong to their loop's thread; other threads hand
+work to them through call_soon_threadsafe().
+'''
+
+# Qt-free
+# depends on python-numpy
+import collections
+import errno
+import heapq
+import os
+import select
+import socket
+import sys
+import threading
+import time
+import traceback
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None        # Windows: no pollable serial ports, see OvenThreadTransport
+
+from ovencmd import OvenCommander
+from ovenproto import OvenDecoder
+
+_RETRY = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+
+# loop clock: unaffected by changes of the wall-clock time (Python 2 has no monotonic clock)
+clock = getattr(time,'monotonic',time.time)
+
+
+def set_nonblocking(fd):
+    """Puts a file descriptor into non-blocking mode."""
+    if(fcntl is None):
+        return
+    flags = fcntl.fcntl(fd,fcntl.F_GETFL)
+    fcntl.fcntl(fd,fcntl.F_SETFL,flags | os.O_NONBLOCK)
+
+
+def _socketpair():
+    """Connected pair of sockets (select() only takes sockets on Windows, where Python 2 has no socketpair())."""
+    if(hasattr(socket,'socketpair')):
+        return socket.socketpair()
+    listener = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1',0))
+    listener.listen(1)
+    a = socket.create_connection(listener.getsockname())
+    (b,addr) = listener.accept()
+    listener.close()
+    return (b,a)
+
+
+class OvenHandle():
+    """A callback scheduled on an OvenLoop."""
+
+    def __init__(self,when,callback,args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """Prevents the callback from running (if it has not run yet)."""
+        self.cancelled = True
+
+    def run(self):
+        """Runs callback, reporting (and surviving) any exception it raises."""
+        try:
+            self.callback(*self.args)
+        except Exception:
+            sys.stderr.write("exception in callback %r:\n" % (self.callback))
+            traceback.print_exc()
+
+
+class OvenLoop():
+    """Single-threaded select() event loop."""
+
+    def __init__(self):
+        """Creates loop (not running)."""
+        self.readers = {}               # fd -> OvenHandle
+        self.writers = {}
+        self.ready = collections.deque()
+        self.timers = []                # heap of (when, seq, OvenHandle)
+        self.seq = 0
+        self.running = False
+        self.thread = None
+
+        # written to by other threads, to wake the loop out of select()
+        self.wake_r, self.wake_w = _socketpair()
+        self.wake_r.setblocking(False)
+        self.wake_w.setblocking(False)
+        self.add_reader(self.wake_r.fileno(),self._drain_wake)
+
+    def time(self):
+        """Loop clock (seconds, monotonic where available; only intervals are meaningful)."""
+        return clock()
+
+    def add_reader(self,fd,callback,*args):
+        """Calls callback(*args) whenever fd is readable."""
+        self.readers[fd] = OvenHandle(None,callback,args)
+
+    def remove_reader(self,fd):
+        """Stops watching fd for reading; returns True if it was watched."""
+        return self.readers.pop(fd,None) is not None
+
+    def add_writer(self,fd,callback,*args):
+        """Calls callback(*args) whenever fd is writable."""
+        self.writers[fd] = OvenHandle(None,callback,args)
+
+    def remove_writer(self,fd):
+        """Stops watching fd for writing; returns True if it was watched."""
+        return self.writers.pop(fd,None) is not None
+
+    def call_soon(self,callback,*args):
+        """Runs callback(*args) on the next loop iteration."""
+        handle = OvenHandle(None,callback,args)
+        self.ready.append(handle)
+        return handle
+
+    def call_soon_threadsafe(self,callback,*args):
+        """call_soon() for use from other threads."""
+        handle = self.call_soon(callback,*args)
+        self._wake()
+        return handle
+
+    def call_later(self,delay,callback,*args):
+        """Runs callback(*args) after delay seconds; returns a handle that can cancel it."""
+        handle = OvenHandle(self.time()+delay,callback,args)
+        self.seq += 1
+        heapq.heappush(self.timers,(handle.when,self.seq,handle))
+        return handle
+
+    def _wake(self):
+        if(self.wake_w is None):
+            return
+        try:
+            self.wake_w.send(b'x')
+        except socket.error as e:
+            if(e.errno not in _RETRY):
+                raise
+
+    def _drain_wake(self):
+        try:
+            while(self.wake_r.recv(4096)):
+                pass
+        except socket.error as e:
+            if(e.errno not in _RETRY):
+                raise
+
+    def run_once(self,timeout=None):
+        """Waits (at most timeout seconds, or until the next timer) for I/O, then runs all callbacks due."""
+        if(self.ready):
+            timeout = 0
+        elif(self.timers):
+            delay = max(0.0,self.timers[0][0] - self.time())
+            if(timeout is None or delay < timeout):
+                timeout = delay
+
+        try:
+            r,w,x = select.select(list(self.readers),list(self.writers),[],timeout)
+        except (select.error,OSError) as e:
+            if(e.args[0] != errno.EINTR):
+                raise
+            r,w = [],[]
+        for fd in r:
+            handle = self.readers.get(fd)
+            if(handle):
+                self.ready.append(handle)
+        for fd in w:
+            handle = self.writers.get(fd)
+            if(handle):
+                self.ready.append(handle)
+
+        now = self.time()
+        while(self.timers and self.timers[0][0] <= now):
+            self.ready.append(heapq.heappop(self.timers)[2])
+
+        # callbacks scheduled by these callbacks wait for the next iteration
+        for i in range(len(self.ready)):
+            handle = self.ready.popleft()
+            if(not handle.cancelled):
+                handle.run()
+
+    def run_forever(self):
+        """Runs loop until stop() is called."""
+        self.running = True
+        while(self.running):
+            self.run_once()
+
+    def stop(self):
+        """Makes run_forever() return (after finishing the current iteration); thread-safe."""
+        self.running = False
+        self._wake()
+
+    def start_thread(self,name='OvenLoop'):
+        """Runs the loop in a (daemon) background thread."""
+        self.thread = threading.Thread(target=self.run_forever,name=name)
+        self.thread.daemon = True
+        self.thread.start()
+        return self.thread
+
+    def close(self):
+        """Stops loop (waiting for its thread, if any) and releases its wake-up sockets."""
+        self.stop()
+        if(self.thread and self.thread is not threading.current_thread()):
+            self.thread.join()
+        self.thread = None
+        if(self.wake_r is not None):
+            self.wake_r.close()
+            self.wake_w.close()
+            self.wake_r = self.wake_w = None
+
+
+_shared_loop = None
+_shared_lock = threading.Lock()
+
+
+def shared_loop():
+    """Returns the process-wide OvenLoop, started in its own thread on first use."""
+    global _shared_loop
+    with _shared_lock:
+        if(_shared_loop is None):
+            _shared_loop = OvenLoop()
+            _shared_loop.start_thread()
+    return _shared_loop
+
+
+class OvenTransport():
+    """Non-blocking byte stream over a file descriptor, driven by an OvenLoop.
+
+    Created from any thread; the protocol's connection_made() and all further
+    protocol callbacks run in the loop's thread. write() buffers whatever the
+    descriptor does not accept at once; the protocol's pause_writing() is called
+    when the buffer exceeds high_water, and resume_writing() once it has drained
+    below low_water."""
+
+    def __init__(self,loop,fd,protocol,extra=None):
+        """Starts transport. extra may hold the object owning fd ('port' or 'socket'), which is closed with it."""
+        self.loop = loop
+        self.fd = fd
+        self.protocol = protocol
+        self.extra = extra or {}
+        self.buffer = bytearray()
+        self.high_water = 64*1024
+        self.low_water = 16*1024
+        self.closing = False
+        self.reading = True
+        self.protocol_paused = False
+        set_nonblocking(fd)
+        loop.call_soon_threadsafe(self._start)
+
+    def _start(self):
+        self.protocol.connection_made(self)
+        if(self.reading and not self.closing):
+            self.loop.add_reader(self.fd,self._read_ready)
+
+    def get_extra_info(self,name,default=None):
+        """Returns transport details ('port', 'socket', 'name')."""
+        return self.extra.get(name,default)
+
+    def is_closing(self):
+        return self.closing
+
+    def _read_ready(self):
+        try:
+            data = os.read(self.fd,4096)
+        except OSError as e:
+            if(e.errno not in _RETRY):
+                self._fatal(e)      # e.g. EIO once the other side of a pseudo-terminal is gone
+            return
+        if(not data):
+            self.protocol.eof_received()
+            self.close()
+            return
+        self.protocol.data_received(data)
+
+    def pause_reading(self):
+        """Stops delivering received data (it stays in the OS buffers)."""
+        if(self.reading):
+            self.reading = False
+            self.loop.remove_reader(self.fd)
+
+    def resume_reading(self):
+        if(not self.reading and not self.closing):
+            self.reading = True
+            self.loop.add_reader(self.fd,self._read_ready)
+
+    def write(self,data):
+        """Queues data for sending; never blocks."""
+        if(self.closing or not data):
+            return
+        if(not isinstance(data,(bytes,bytearray))):
+            data = data.encode('ascii')
+        if(not self.buffer):
+            try:
+                n = os.write(self.fd,data)
+            except OSError as e:
+                if(e.errno not in _RETRY):
+                    self._fatal(e)
+                    return
+                n = 0
+            data = data[n:]
+            if(not data):
+                return
+            self.loop.add_writer(self.fd,self._write_ready)
+        self.buffer.extend(data)
+        if(not self.protocol_paused and len(self.buffer) > self.high_water):
+            self.protocol_paused = True
+            self.protocol.pause_writing()
+
+    def _write_ready(self):
+        try:
+            n = os.write(self.fd,self.buffer)
+        except OSError as e:
+            if(e.errno not in _RETRY):
+                self._fatal(e)
+            return
+        del self.buffer[:n]
+        if(self.protocol_paused and len(self.buffer) <= self.low_water):
+            self.protocol_paused = False
+            self.protocol.resume_writing()
+        if(not self.buffer):
+            self.loop.remove_writer(self.fd)
+            if(self.closing):
+                self._finish(None)
+
+    def get_write_buffer_size(self):
+        return len(self.buffer)
+
+    def set_write_buffer_limits(self,high=None,low=None):
+        if(high is not None):
+            self.high_water = high
+        if(low is not None):
+            self.low_water = low
+
+    def close(self):
+        """Closes transport once buffered data has been sent."""
+        if(self.closing):
+            return
+        self.closing = True
+        self.loop.remove_reader(self.fd)
+        if(not self.buffer):
+            self.loop.call_soon(self._finish,None)
+
+    def abort(self):
+        """Closes transport immediately, discarding buffered data."""
+        self._fatal(None)
+
+    def _fatal(self,exc):
+        self.closing = True
+        self.buffer = bytearray()
+        self.loop.remove_reader(self.fd)
+        self.loop.remove_writer(self.fd)
+        self.loop.call_soon(self._finish,exc)
+
+    def _finish(self,exc):
+        if(self.fd is None):
+            return
+        try:
+            self.protocol.connection_lost(exc)
+        finally:
+            owner = self.extra.get('port') or self.extra.get('socket')
+            if(owner is not None):
+                owner.close()
+            else:
+                os.close(self.fd)
+            self.fd = None
+
+
+class OvenThreadTransport():
+    """Transport for serial ports that cannot be polled: a thread blocks in read() and passes data to the loop.
+
+    Writes go straight to the port (the controller's command lines are short)."""
+
+    def __init__(self,loop,port,protocol,extra=None):
+        self.loop = loop
+        self.port = port
+        self.protocol = protocol
+        self.extra = extra or {}
+        self.extra['port'] = port
+        self.closing = False
+        self.reading = threading.Event()
+        self.reading.set()
+        loop.call_soon_threadsafe(protocol.connection_made,self)
+        self.thread = threading.Thread(target=self._run,name='OvenThreadTransport')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        exc = None
+        try:
+            while(not self.closing):
+                self.reading.wait()
+                data = self.port.read(self.port.inWaiting() or 1)    # blocks for up to the port timeout
+                if(data and not self.closing):
+                    self.loop.call_soon_threadsafe(self.protocol.data_received,data)
+        except Exception as e:
+            exc = e
+        self.closing = True
+        self.loop.call_soon_threadsafe(self._finish,exc)
+
+    def _finish(self,exc):
+        try:
+            self.protocol.connection_lost(exc)
+        finally:
+            self.port.close()
+
+    def get_extra_info(self,name,default=None):
+        return self.extra.get(name,default)
+
+    def is_closing(self):
+        return self.closing
+
+    def pause_reading(self):
+        self.reading.clear()
+
+    def resume_reading(self):
+        self.reading.set()
+
+    def write(self,data):
+        if(self.closing or not data):
+            return
+        if(not isinstance(data,(bytes,bytearray))):
+            data = data.encode('ascii')
+        self.port.write(data)
+
+    def get_write_buffer_size(self):
+        return 0
+
+    def set_write_buffer_limits(self,high=None,low=None):
+        pass
+
+    def close(self):
+        """Stops the reader thread (within the port timeout); the port is closed once it has."""
+        self.closing = True
+        self.reading.set()
+
+    abort = close
+
+
+class OvenProtocol():
+    """Protocol for a controller's status stream; batch_received() gets every decoded batch.
+
+    Commands should go through commander (an OvenCommander, created on connection),
+    which the protocol keeps informed of the controller's state."""
+
+    def __init__(self,drain=0.0):
+        """drain: seconds after connecting during which received data is stale and discarded."""
+        self.decoder = OvenDecoder()
+        self.transport = None
+        self.paused = False
+        self.commander = None
+        self.drain = drain
+        self.drain_until = None
+
+    def connection_made(self,transport):
+        self.transport = transport
+        self.commander = OvenCommander(transport.loop,self.send,failed=self.command_failed)
+        if(self.drain):
+            self.drain_until = transport.loop.time() + self.drain
+
+    def data_received(self,data):
+        if(self.drain_until is not None):
+            # stale data (buffered before we opened the port) is dropped, up to the first
+            # line that starts after the drain period
+            if(self.transport.loop.time() < self.drain_until):
+                return
+            i = data.find(b'\n')
+            if(i < 0):
+                return
+            data = data[i+1:]
+            self.drain_until = None
+        replies = self.decoder.replies
+        batch = self.decoder.feed(data)
+        if(self.decoder.replies != replies and self.commander):
+            self.commander.replied()
+        if(len(batch)):
+            if(self.commander):
+                self.commander.status(batch)
+            self.batch_received(batch)
+
+    def command_failed(self,line,reason):
+        """Called when a command queued with commander could not be confirmed."""
+        sys.stderr.write("command \"%s\" failed: %s\n" % (line,reason))
+
+    def batch_received(self,batch):
+        """Called (in the loop thread) with each MSG_DTYPE batch of decoded status messages."""
+        pass
+
+    def eof_received(self):
+        pass
+
+    def connection_lost(self,exc):
+        self.transport = None
+        if(self.commander):
+            self.commander.cancel()
+
+    def pause_writing(self):
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+
+    def send(self,data):
+        """Sends data to the controller right away (see commander for paced commands); loop thread only."""
+        if(self.transport):
+            self.transport.write(data)
+
+
+def open_serial(loop,port,protocol,baudrate=57600):
+    """Opens a serial port (or pseudo-terminal, see ovenreplay) for protocol; returns its transport."""
+    import serial
+    if(fcntl is None):
+        s = serial.Serial(port=port,baudrate=baudrate,timeout=0.5)
+        return OvenThreadTransport(loop,s,protocol,{'name': port})
+    s = serial.Serial(port=port,baudrate=baudrate,timeout=0)
+    s.flushInput()
+    return OvenTransport(loop,s.fileno(),protocol,{'port': s, 'name': port})
+
+
+def open_tcp(loop,host,port,protocol):
+    """Connects to a controller exposed over TCP (e.g. a serial-to-network bridge); returns its transport."""
+    sock = socket.create_connection((host,port))
+    return OvenTransport(loop,sock.fileno(),protocol,{'socket': sock, 'name': '%s:%d' % (host,port)})
+
+
+def open_unix(loop,path,protocol):
+    """Connects to a Unix domain socket (e.g. an ovend daemon); returns its transport."""
+    sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+    sock.connect(path)
+    return OvenTransport(loop,sock.fileno(),protocol,{'socket': sock, 'name': 'unix:'+path})
+
+
+def open_port(loop,name,protocol,baudrate=57600):
+    """Opens 'tcp:host:port' with open_tcp(), 'unix:path' with open_unix(), anything else with open_serial()."""
+    if(name.startswith('tcp:')):
+        (host,port) = name[4:].rsplit(':',1)
+        return open_tcp(loop,host,int(port),protocol)
+    if(name.startswith('unix:')):
+        return open_unix(loop,name[5:],protocol)
+    return open_serial(loop,name,protocol,baudrate)
+
+
+class OvenServer():
+    """Listening socket ('tcp:host:port' or 'unix:path') that gives every connection a transport and a new protocol."""
+
+    def __init__(self,loop,address,protocol_factory):
+        """Starts listening on address; protocol_factory() creates each connection's protocol."""
+        self.loop = loop
+        self.address = address
+        self.protocol_factory = protocol_factory
+        self.path = None
+        if(address.startswith('unix:')):
+            self.path = address[5:]
+            if(os.path.exists(self.path)):
+                os.unlink(self.path)    # left behind by a process that did not shut down cleanly
+            self.sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+            self.sock.bind(self.path)
+        elif(address.startswith('tcp:')):
+            (host,port) = address[4:].rsplit(':',1)
+            self.sock = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.SOL_SOCKET,socket.SO_REUSEADDR,1)
+            self.sock.bind((host,int(port)))
+        else:
+            raise ValueError("address must be tcp:host:port or unix:path, not %r" % (address))
+        self.sock.listen(16)
+        self.sock.setblocking(False)
+        loop.call_soon_threadsafe(loop.add_reader,self.sock.fileno(),self._accept)
+
+    def _accept(self):
+        try:
+            (conn,addr) = self.sock.accept()
+        except socket.error as e:
+            if(e.args[0] not in _RETRY):
+                raise
+            return
+        OvenTransport(self.loop,conn.fileno(),self.protocol_factory(),{'socket': conn, 'peer': addr})
+
+    def close(self):
+        """Stops accepting connections (loop thread only); existing ones stay open."""
+        if(self.sock is None):
+            return
+        self.loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+        self.sock = None
+        if(self.path):
+            os.unlink(self.path)
@@ -0,0 +1,148 @@
+'''
+Level-of-detail reduction of plotted oven history, so that curves only receive as many points as can be seen.
+
+Copyright (c) 2011, Daniel Strother < http://danstrother.com/ >
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+  - Redistributions of source code must retain the above copyright notice,
+    this list of conditions and the following disclaimer.
+  - Redistributions in binary form must reproduce the above copyright
+    notice, this list of conditions and the following disclaimer in the
+    documentation and/or other materials provided with the distribution.
+  - The name of the author may not be used to endorse or promote products
+    derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS" AND ANY EXPRESS OR IMPLIED
+WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+'''
+
+# depends on python-numpy
+import numpy
+
+# one bucket of a pyramid level: its extreme values, and when they occurred
+BUCKET_DTYPE = numpy.dtype([
+    ('tmin',    numpy.float32),
+    ('vmin',    numpy.float32),
+    ('tmax',    numpy.float32),
+    ('vmax',    numpy.float32),
+])
+
+
+class OvenLod():
+    """Min/max pyramid over one column of an OvenHistory.
+
+    Level k holds the minimum and maximum of every bucket of 2**k samples, with
+    buckets aligned to the number of samples added since the history was
+    cleared. Each level is a ring big enough for the history's capacity. New
+    samples only touch the newest bucket(s) of each level, so updating costs
+    O(levels) per batch no matter how long the run is. A polyline through the
+    minimum and maximum of each bucket keeps the curve's visible envelope."""
+
+    def __init__(self,history,name):
+        """Creates (empty) pyramid over column name of history."""
+        self.history = history
+        self.name = name
+        self.levels = []
+        k = 1
+        while((history.capacity >> k) >= 1):
+            self.levels.append(numpy.zeros((history.capacity >> k) + 2,BUCKET_DTYPE))
+            k += 1
+        self.reset()
+
+    def reset(self):
+        """Forgets all samples; call when the history is cleared."""
+        self.total = 0      # history.total as of the last update()
+
+    def _children(self,k,c,first,total):
+        """Buckets c (absolute numbers) of level k (0: the samples themselves), and a mask of those that exist."""
+        valid = (c >= (first >> k)) & (c <= ((total-1) >> k))
+        if(k == 0):
+            i = numpy.clip(c-first,0,self.history.count-1)
+            times = self.history.view('times')[i]
+            values = self.history.view(self.name)[i].astype(numpy.float32)
+            return (times,values,times,values,valid)
+        level = self.levels[k-1]
+        b = level[c % len(level)]
+        return (b['tmin'],b['vmin'],b['tmax'],b['vmax'],valid)
+
+    def update(self):
+        """Brings the pyramid up to date with samples added to the history since the last update."""
+        total = self.history.total
+        if(total < self.total):
+            self.total = 0
+        if(total == self.total):
+            return
+        first = total - self.history.count      # absolute number of oldest retained sample
+        start = max(self.total,first)           # first new sample
+        self.total = total
+
+        for k in range(1,len(self.levels)+1):
+            b = numpy.arange(start >> k,((total-1) >> k)+1)
+            c = numpy.empty(2*len(b),numpy.int64)
+            c[0::2] = 2*b
+            c[1::2] = 2*b+1
+            (tmin,vmin,tmax,vmax,valid) = self._children(k-1,c,first,total)
+
+            # of each pair of children, take the (existing) one with the lower minimum / higher maximum
+            lo = numpy.where(valid,vmin,numpy.inf).reshape(-1,2)
+            hi = numpy.where(valid,vmax,-numpy.inf).reshape(-1,2)
+            imin = 2*numpy.arange(len(b)) + (lo[:,1] < lo[:,0])
+            imax = 2*numpy.arange(len(b)) + (hi[:,1] > hi[:,0])
+
+            level = self.levels[k-1]
+            i = b % len(level)
+            level['tmin'][i] = tmin[imin]
+            level['vmin'][i] = vmin[imin]
+            level['tmax'][i] = tmax[imax]
+            level['vmax'][i] = vmax[imax]
+
+    def query(self,t0=None,t1=None,width=1000):
+        """Returns (times, values, level) of a polyline through the history between times t0 and t1
+        (default: all of it), with at most about 2*width points.
+
+        Level 0 means the samples themselves, at full resolution."""
+        self.update()
+        count = self.history.count
+        times = self.history.view('times')
+        values = self.history.view(self.name)
+        (i0,i1) = (0,count)
+        if(t0 is not None):
+            i0 = max(0,numpy.searchsorted(times,t0,'left')-1)     # include one point beyond each edge,
+        if(t1 is not None):
+            i1 = min(count,numpy.searchsorted(times,t1,'right')+1) # so the curve runs to the border
+        n = i1 - i0
+        k = 0
+        while((n >> k) > width and k < len(self.levels)):
+            k += 1
+        if(k == 0):
+            return (times[i0:i1],values[i0:i1],0)
+
+        first = self.history.total - count
+        level = self.levels[k-1]
+        c0 = (first+i0) >> k
+        b = level[numpy.arange(c0,((first+i1-1) >> k)+1) % len(level)]
+
+        # the first bucket may start before sample i0 (trimmed, or no longer in the history):
+        # take it from the samples themselves
+        j = min(i1,((c0+1) << k) - first)
+        lo = i0 + int(numpy.argmin(values[i0:j]))
+        hi = i0 + int(numpy.argmax(values[i0:j]))
+        b[0] = (times[lo],values[lo],times[hi],values[hi])
+        order = b['tmin'] <= b['tmax']
+        t = numpy.empty(2*len(b),numpy.float32)
+        v = numpy.empty(2*len(b),numpy.float32)
+        t[0::2] = numpy.where(order,b['tmin'],b['tmax'])
+        v[0::2] = numpy.where(order,b['vmin'],b['vmax'])
+        t[1::2] = numpy.where(order,b['tmax'],b['tmin'])
+        v[1::2] = numpy.where(order,b['vmax'],b['vmin'])
+        return (t,v,k)
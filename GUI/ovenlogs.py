@@ -0,0 +1,305 @@
+'''
+Loader for recorded oven runs (PID*.csv tuning logs and ovenlog_*.csv files).
+
+Copyright (c) 2011, Daniel Strother < http://danstrother.com/ >
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+  - Redistributions of source code must retain the above copyright notice,
+    this list of conditions and the following disclaimer.
+  - Redistributions in binary form must reproduce the above copyright
+    notice, this list of conditions and the following disclaimer in the
+    documentation and/or other materials provided with the distribution.
+  - The name of the author may not be used to endorse or promote products
+    derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS" AND ANY EXPRESS OR IMPLIED
+WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+'''
+
+# depends on python-numpy
+import numpy
+import os
+import glob
+import time
+
+from ovenproto import MSG_DTYPE, ST_IDLE, ST_MANUAL, STATE_NAMES, EMPTY_BATCH, split_runs, unwrap_time
+import ovenbinlog
+
+# log file variants:
+#   'bare'      - manual-mode status lines, one per row (time,temp,target,HeaterPwr,error,derivative)
+#   'terminal'  - "Terminal log file" capture: date header/footer around manual-mode
+#                 status lines with the additional pid_int column
+#   'ovenlog'   - OvenLogger output, "state,step,time,temp,TtoTarget,target,cmd" in
+#                 seconds/degrees/0-1 units
+#   'binary'    - OvenLogger binary output (see ovenbinlog)
+LOG_VARIANTS = ('bare','terminal','ovenlog','binary')
+
+OVENLOG_HEADER = b'state,step,time,temp,TtoTarget,target,cmd'
+
+# sidecar cache directory, created next to the logs
+CACHE_DIR = '.ovencache'
+
+
+def sniff(head):
+    """Returns the log variant of a file, given its first few hundred bytes."""
+    if(head.startswith(b'Terminal log file')):
+        return 'terminal'
+    if(head.startswith(OVENLOG_HEADER)):
+        return 'ovenlog'
+    if(ovenbinlog.is_binlog(head)):
+        return 'binary'
+    return 'bare'
+
+
+def format_ovenlog(batch,time_offset=0.0):
+    """Formats a batch as OvenLogger CSV rows (times relative to time_offset seconds)."""
+    lines = []
+    for (state,step,t,temp,TtoTarget,target,cmd,error,derivative,pid_int) in batch.tolist():
+        lines.append("%s,%f,%f,%f,%f,%f,%f\n" % (STATE_NAMES[state],step,t*0.25-time_offset,temp*0.25,TtoTarget,target*0.25,cmd/255.0))
+    return ''.join(lines)
+
+
+class OvenRunLogger():
+    """Writes every run of status messages to a CSV (or binary) log file of its own, or to a session store.
+
+    Qt-free; feed it with log_batch() (ovencon's OvenLogger connects it to an OvenComm)."""
+
+    def __init__(self,fmt='csv',store='ovenlog.db',prefix='',source=None,decoder=None,rollup=None):
+        """fmt selects the log format: 'csv', 'bin' (see ovenbinlog) or 'store' (runs are
+        added to the OvenStore database named by store, see ovenstore). Log file names
+        start with prefix (which may include a directory). source (the port) and the
+        coefficients last reported to decoder (an OvenDecoder) are recorded in the store.
+        Every run is also merged into the OvenRollup database named by rollup, if given
+        (see ovenrollup)."""
+        self.fmt = fmt
+        self.prefix = prefix
+        self.source = source
+        self.decoder = decoder
+        self.prev = None            # last message logged
+        self.last_time = None       # its controller time, unwrapped
+        self.f = None
+        self.store = None
+        self.time_offset = 0.0
+        if(fmt == 'store'):
+            from ovenstore import OvenStore
+            self.store = OvenStore(store)
+        self.rollup = None
+        self.rollup_run = None
+        if(rollup):
+            from ovenrollup import OvenRollup
+            self.rollup = OvenRollup(rollup)
+
+    def __del__(self):
+        """Closes open log file."""
+        self.close()
+
+    def close(self):
+        """Closes open log file (and store)."""
+        if(self.f):
+            self.f.close()
+            self.f = None
+        if(self.store):
+            self.store.close()
+            self.store = None
+        if(self.rollup_run):
+            self.rollup_run.close()
+            self.rollup_run = None
+        if(self.rollup):
+            self.rollup.close()
+            self.rollup = None
+
+    def start_new_file(self):
+        """Starts a new time-stamped log file and inserts column headers."""
+        if(self.f):
+            self.f.close()
+        if(self.fmt == 'store'):
+            coefs = self.decoder and self.decoder.coefs
+            self.f = self.store.begin_run(coefs=coefs,source=self.source)
+            name = "%s:%d" % (os.path.abspath(self.store.path),self.f.run_id)
+        elif(self.fmt == 'bin'):
+            name = self.prefix+time.strftime('ovenlog_%Y%m%d%H%M%S.ovl')
+            self.f = ovenbinlog.OvenBinLogWriter(name)
+        else:
+            name = self.prefix+time.strftime('ovenlog_%Y%m%d%H%M%S.csv')
+            self.f = open(name,'a')
+            self.f.write(OVENLOG_HEADER.decode('ascii')+'\n')
+        if(self.rollup):
+            # keyed by the log's absolute path, so that "ovenrollup.py update" knows the run
+            if(self.rollup_run):
+                self.rollup_run.close()
+            self.rollup_run = self.rollup.begin_run(source=os.path.abspath(name))
+
+    def log_batch(self,batch):
+        """Writes messages to log file.
+
+        Opens a new log file whenever a new run begins (see split_runs)."""
+
+        for (seg,new_run) in split_runs(batch,self.prev):
+            times = unwrap_time(seg['time'],self.last_time)
+            self.last_time = int(times[-1])
+            if(not self.f or new_run):
+                # at the start of a run (or if log file not already open), open a new log file
+                self.start_new_file()
+
+                # time_offset is used to make all log files start at time 0
+                # (controller time always increments, and never resets, but wraps at 2**16)
+                self.time_offset = times[0]*0.25
+
+            if(self.fmt != 'csv'):
+                # binary logs and the store keep raw controller times; readers apply the offset
+                self.f.write(seg)
+            else:
+                seg = numpy.array(seg)
+                seg['time'] = times
+                self.f.write(format_ovenlog(seg,self.time_offset))
+            if(self.rollup_run):
+                self.rollup_run.write(seg)
+
+        self.prev = batch[-1].copy()
+
+
+def _numeric_rows(text,ncols,dtype):
+    """Parses comma-separated numeric rows in one vectorized pass; returns (n,ncols) array."""
+    values = numpy.fromstring(text.replace(b'\n',b','),dtype=dtype,sep=',')
+    n = len(values) // ncols
+    return values[:n*ncols].reshape(n,ncols)
+
+
+def _manual_batch(rows):
+    """Converts manual-mode rows (time,temp,target,HeaterPwr,error,derivative[,pid_int]) to a batch."""
+    batch = numpy.zeros(len(rows),MSG_DTYPE)
+    batch['state']      = ST_MANUAL
+    batch['time']       = rows[:,0]
+    batch['temp']       = rows[:,1]
+    batch['target']     = rows[:,2]
+    batch['cmd']        = rows[:,3]
+    batch['error']      = rows[:,4]
+    batch['derivative'] = rows[:,5]
+    if(rows.shape[1] > 6):
+        batch['pid_int'] = rows[:,6]
+    return batch
+
+
+def parse_log(data):
+    """Parses the complete contents (bytes) of a text log file into a MSG_DTYPE batch."""
+    variant = sniff(data[:256])
+    data = data.replace(b'\r',b'')
+
+    if(variant == 'ovenlog'):
+        body = data[len(OVENLOG_HEADER):].strip()
+        if(not body):
+            return EMPTY_BATCH
+        # replace state names by their codes, so that the whole file is numeric
+        for (code,name) in enumerate(STATE_NAMES):
+            body = body.replace(name.encode('ascii')+b',',str(code).encode('ascii')+b',')
+        rows = _numeric_rows(body,7,numpy.float64)
+        batch = numpy.zeros(len(rows),MSG_DTYPE)
+        batch['state']      = rows[:,0]
+        batch['step']       = rows[:,1]
+        batch['time']       = numpy.round(rows[:,2]*4)
+        batch['temp']       = numpy.round(rows[:,3]*4)
+        batch['TtoTarget']  = rows[:,4]
+        batch['target']     = numpy.round(rows[:,5]*4)
+        batch['cmd']        = numpy.round(rows[:,6]*255)
+        return batch
+
+    lines = data.split(b'\n')
+    if(variant == 'terminal'):
+        # drop header/footer lines (and blank lines) around the captured status lines
+        lines = [l for l in lines if l[:1].isdigit()]
+    else:
+        lines = [l for l in lines if l]
+    if(not lines):
+        return EMPTY_BATCH
+
+    # the column count is that of the majority of the first rows; rows garbled in
+    # transmission (with more or fewer fields) are dropped, so they cannot shift the columns
+    counts = [l.count(b',') for l in lines[:16]]
+    commas = max(set(counts),key=counts.count)
+    lines = [l for l in lines if l.count(b',') == commas]
+    return _manual_batch(_numeric_rows(b'\n'.join(lines),commas+1,numpy.int32))
+
+
+def cache_path(path,cachedir=None):
+    """Returns sidecar cache file name for path, keyed by the file's current size and mtime."""
+    st = os.stat(path)
+    d,name = os.path.split(os.path.abspath(path))
+    if(cachedir is None):
+        cachedir = os.path.join(d,CACHE_DIR)
+    return os.path.join(cachedir,'%s.%d.%d.npy' % (name,st.st_size,int(st.st_mtime*1000)))
+
+
+def load_log(path,cache=True,cachedir=None):
+    """Loads a log file as a MSG_DTYPE batch.
+
+    With cache enabled, the parsed batch is stored as a .npy sidecar and subsequent
+    loads of the unmodified file memory-map it (read-only) instead of parsing text.
+    Binary logs are decoded directly, without a sidecar."""
+    f = open(path,'rb')
+    try:
+        head = f.read(len(ovenbinlog.MAGIC))
+    finally:
+        f.close()
+    if(ovenbinlog.is_binlog(head)):
+        return ovenbinlog.read_binlog(path)
+
+    if(not cache):
+        f = open(path,'rb')
+        try:
+            return parse_log(f.read())
+        finally:
+            f.close()
+
+    cpath = cache_path(path,cachedir)
+    if(os.path.exists(cpath)):
+        try:
+            batch = numpy.load(cpath,mmap_mode='r')
+            if(batch.dtype == MSG_DTYPE):
+                return batch
+        except (IOError,ValueError):
+            pass    # damaged sidecar - rebuild it
+
+    batch = load_log(path,cache=False)
+    if(not len(batch)):
+        return batch
+
+    cdir,cname = os.path.split(cpath)
+    if(not os.path.isdir(cdir)):
+        os.makedirs(cdir)
+
+    # remove sidecars of older versions of the file
+    name = os.path.basename(path)
+    for old in os.listdir(cdir):
+        key = old[len(name)+1:-4].split('.')
+        if(old.startswith(name+'.') and old.endswith('.npy') and len(key) == 2 and key[0].isdigit()):
+            os.remove(os.path.join(cdir,old))
+
+    # write to temporary file first, so that a partial sidecar is never picked up
+    tmp = cpath + '.%d.tmp' % os.getpid()
+    f = open(tmp,'wb')
+    try:
+        numpy.save(f,batch)
+    finally:
+        f.close()
+    os.rename(tmp,cpath)
+    return numpy.load(cpath,mmap_mode='r')
+
+
+def load_logs(paths,cache=True,cachedir=None):
+    """Loads several log files (list of paths, or a glob pattern); returns {path: batch}."""
+    if(isinstance(paths,str)):
+        paths = sorted(glob.glob(paths))
+    logs = {}
+    for path in paths:
+        logs[path] = load_log(path,cache,cachedir)
+    return logs
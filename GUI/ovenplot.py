@@ -0,0 +1,429 @@
+'''
+Qwt plots of oven controller data for the GUI (imported on first use, see ovencon.OvenLazy).
+
+Copyright (c) 2011, Daniel Strother < http://danstrother.com/ >
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+  - Redistributions of source code must retain the above copyright notice,
+    this list of conditions and the following disclaimer.
+  - Redistributions in binary form must reproduce the above copyright
+    notice, this list of conditions and the following disclaimer in the
+    documentation and/or other materials provided with the distribution.
+  - The name of the author may not be used to endorse or promote products
+    derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS" AND ANY EXPRESS OR IMPLIED
+WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+'''
+
+# depends on python-qt4, python-qwt5-qt4, python-numpy
+from PyQt4 import QtGui, QtCore
+import PyQt4.Qwt5 as Qwt
+import numpy
+import time
+
+from ovenhist import OvenHistory
+from ovenlod import OvenLod
+from ovenproto import ST_IDLE, ST_RUN, split_runs, unwrap_time
+from ovenprofile import profile_trajectory, locate, follows, LOCATE_SAMPLES
+from oventrace import tracer, clock
+
+
+class OvenRenderScheduler(QtCore.QObject):
+    """Coalesces plot redraws, so that plots are redrawn at most max_fps times per second.
+
+    Plots mark themselves dirty when new data arrives; any number of messages
+    received between two frames result in a single refresh/replot per plot."""
+
+    def __init__(self,parent=None,max_fps=20):
+        """Creates (idle) frame timer."""
+        super(OvenRenderScheduler,self).__init__(parent)
+
+        self.plots = []
+        self.last_frame = 0.0
+        self.set_max_fps(max_fps)
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.render)
+
+    def set_max_fps(self,max_fps):
+        """Sets maximum redraw rate (frames per second)."""
+        self.max_fps = max_fps
+        self.interval = 1.0/max_fps
+
+    def add_plot(self,plot):
+        """Registers a plot to be redrawn by this scheduler."""
+        plot.dirty = False
+        self.plots.append(plot)
+
+    def mark_dirty(self,plot):
+        """Flags plot for redrawing, and schedules next frame (if not already scheduled)."""
+        plot.dirty = True
+        if(not self.timer.isActive()):
+            # render immediately if a frame is due; otherwise wait out the remainder of the interval
+            delay = self.last_frame + self.interval - time.time()
+            self.timer.start(max(0,int(delay*1000)))
+
+    def render(self):
+        """Timer callback - refreshes and redraws every dirty plot."""
+        self.last_frame = time.time()
+        t = clock()
+        for plot in self.plots:
+            if(plot.dirty):
+                plot.dirty = False
+                if(plot.refresh()):
+                    plot.replot()
+        if(tracer.enabled):
+            tracer.frame(t)
+
+
+class OvenPlot(Qwt.QwtPlot):
+    """Common base-class for plotting oven data."""
+
+    # history columns handed to curves through a level-of-detail pyramid
+    lod_columns = ()
+
+    def __init__(self,comm,parent=None,scheduler=None):
+        """Connents newBatch handler to OvenComm instance and sets up common plot format."""
+        super(OvenPlot,self).__init__(parent)
+
+        self.comm = comm
+
+        if(not scheduler):
+            scheduler = OvenRenderScheduler(parent=self)
+        self.scheduler = scheduler
+        self.scheduler.add_plot(self)
+        
+        self.setCanvasBackground(QtCore.Qt.white)
+
+        # plot grid
+        grid = Qwt.QwtPlotGrid()
+        pen = QtGui.QPen(QtCore.Qt.DotLine)
+        pen.setColor(QtCore.Qt.black)
+        pen.setWidth(0)
+        grid.setPen(pen)
+        grid.attach(self)
+
+        # plot legend and x-axis (y-axis handled in derived classes)
+        self.insertLegend(Qwt.QwtLegend(), Qwt.QwtPlot.BottomLegend)
+        self.setAxisTitle(Qwt.QwtPlot.xBottom, "Time (seconds)")
+
+        # rubber-band zoom (right click zooms out); plots autoscale while not zoomed
+        self.zoomer = Qwt.QwtPlotZoomer(Qwt.QwtPlot.xBottom, Qwt.QwtPlot.yLeft,
+            Qwt.QwtPicker.DragSelection, Qwt.QwtPicker.AlwaysOff, self.canvas(), False)
+        self.connect(self.zoomer, QtCore.SIGNAL('zoomed(const QwtDoubleRect &)'), self.zoomed_handler)
+
+        self.time_offset = 0.0
+        self.max_idle = (120*4)
+        self.max_history = (4*3600*4)   # 4 hours at 4Hz
+        self.prev = None                # last message plotted
+        self.last_time = None           # its controller time, unwrapped
+
+        self.history = OvenHistory(self.max_history)
+        self.lods = dict([(name,OvenLod(self.history,name)) for name in self.lod_columns])
+        self.lod_level = 0
+        self.reset_plot()
+        
+        comm.newBatch.connect(self.newBatch_handler)
+
+    def newBatch_handler(self,batch):
+        """Callback for newBatch signals - adds new data to plot."""
+
+        if(tracer.enabled):
+            t = clock()
+
+        # the controller's time wraps every ~4.55h: plot (and search the history by) unwrapped time
+        msgs = numpy.array(batch)
+        msgs['time'] = unwrap_time(batch['time'],self.last_time)
+        self.last_time = int(msgs['time'][-1])
+
+        for (seg,new_run) in split_runs(msgs,self.prev):
+            if(new_run):
+                # each run starts with a clean plot, at time 0
+                self.time_offset = seg['time'][0]*0.25
+                self.reset_plot()
+            self.update_plot(seg)
+
+        self.prev = msgs[-1].copy()
+
+        if(tracer.enabled):
+            tracer.handled(batch,'plot',t)
+
+    def add_history(self,batch):
+        """Appends messages to plot history."""
+        self.history.extend(batch['time']*0.25,batch['temp'],batch['target'],batch['cmd'])
+
+    def update_plot(self,batch):
+        """Adds new data to plot, and prunes old data.
+
+        Idle messages in batch (if any) must precede all others, as split_runs() guarantees."""
+
+        n_idle = numpy.count_nonzero(batch['state'] == ST_IDLE)
+        if(n_idle):
+            self.add_history(batch[:n_idle])
+
+            # when idle, newest entry is always at time 0
+            # (so transition to non-idle state begins at time 0);
+            # history keeps absolute times, so only the offset has to move
+            self.time_offset = batch['time'][n_idle-1]*0.25
+
+            # when idle, limit visible window of time to max_idle entries
+            self.history.trim(self.max_idle)
+
+        if(n_idle < len(batch)):
+            self.add_history(batch[n_idle:])
+
+        # actual redraw is deferred to (and coalesced by) the render scheduler
+        self.scheduler.mark_dirty(self)
+
+    def refresh(self):
+        """Hands current history to plot curves; invoked by the render scheduler.
+
+        Returns True if the plot needs a replot (False if it has already drawn the changes itself)."""
+        return True
+
+    def zoomed(self):
+        """True while the user has zoomed in."""
+        return self.zoomer.zoomRectIndex() > 0
+
+    def zoomed_handler(self,rect):
+        """Callback for zoomer - resumes autoscaling once zoomed out completely."""
+        if(not self.zoomed()):
+            self.setAxisAutoScale(Qwt.QwtPlot.xBottom)
+            self.setAxisAutoScale(Qwt.QwtPlot.yLeft)
+        self.scheduler.mark_dirty(self)
+
+    def replot(self):
+        """Redraws plot; while not zoomed, the zoomer's base follows the autoscaled axes."""
+        super(OvenPlot,self).replot()
+        if(not self.zoomed()):
+            self.zoomer.setZoomBase(False)
+
+    def curve_data(self,name,scale=1.0):
+        """Returns (times,values) of a history column to hand to a curve.
+
+        Times are relative to time_offset. Long histories are reduced to the min/max of
+        buckets of samples (about two points per pixel column of the canvas); zooming in
+        far enough restores full resolution. Sets lod_level (0: full resolution)."""
+        (t0,t1) = (None,None)
+        if(self.zoomed()):
+            x = self.axisScaleDiv(Qwt.QwtPlot.xBottom)
+            (t0,t1) = (x.lowerBound()+self.time_offset,x.upperBound()+self.time_offset)
+        (times,values,self.lod_level) = self.lods[name].query(t0,t1,max(self.canvas().width(),1))
+        return (times - self.time_offset, values*scale)
+
+    def reset_plot(self):
+        """Resets plot to empty (no data) state."""
+        self.history.clear()
+        for lod in self.lods.values():
+            lod.reset()
+
+
+class OvenTempPlot(OvenPlot):
+    """Class for plotting temperatures in oven."""
+
+    lod_columns = ('temp','target')
+
+    def __init__(self,comm,parent=None,scheduler=None):
+        """Sets up OvenTempPlot-specific formatting."""
+
+        # expected profile of the current run: static layer, set once per run (or on resume)
+        self.profile = None         # selected profile (PROFILE_NAMES index); None: detect from run
+        self.tolerance = 5.0        # width of tolerance band around the profile (degrees)
+        self.anchor = None          # (profile,anchor) of the run, see ovenprofile.locate()
+        self.pending = []           # run-state messages not yet matched to a profile
+        self.npending = 0           # (at most LOCATE_SAMPLES; then the run matches none: None)
+        self.layer_changed = True
+        self.drawn = 0              # points of the measured curve already drawn
+
+        super(OvenTempPlot,self).__init__(comm,parent,scheduler)
+
+        self.setTitle("Temperature")
+        self.setAxisTitle(Qwt.QwtPlot.yLeft, "Temperature (degrees celsius)")
+
+        self.c_band_lo = Qwt.QwtPlotCurve("Tolerance")
+        self.c_band_hi = Qwt.QwtPlotCurve()
+        self.c_band_hi.setItemAttribute(Qwt.QwtPlotItem.Legend,False)
+        self.c_profile = Qwt.QwtPlotCurve("Profile")
+        self.c_target = Qwt.QwtPlotCurve("Target")
+        self.c_temp = Qwt.QwtPlotCurve("Sensed")
+
+        self.c_band_lo.attach(self)
+        self.c_band_hi.attach(self)
+        self.c_profile.attach(self)
+        self.c_target.attach(self)
+        self.c_temp.attach(self)
+        
+        pen = QtGui.QPen()
+        pen.setColor(QtCore.Qt.black)
+        pen.setWidth(3)
+       
+        self.c_target.setPen(pen)
+        self.c_temp.setPen(QtGui.QPen(QtCore.Qt.red))
+
+        pen = QtGui.QPen(QtCore.Qt.DashLine)
+        pen.setColor(QtCore.Qt.gray)
+        self.c_band_lo.setPen(pen)
+        self.c_band_hi.setPen(pen)
+
+        pen = QtGui.QPen()
+        pen.setColor(QtCore.Qt.darkGray)
+        pen.setWidth(3)
+        self.c_profile.setPen(pen)
+
+    def set_profile(self,profile):
+        """Selects the profile drawn for runs (PROFILE_NAMES index), or None to detect it from the run."""
+        self.profile = profile
+        self.anchor = None
+        self.pending = []
+        self.npending = 0
+        self.layer_changed = True
+        self.scheduler.mark_dirty(self)
+
+    def update_plot(self,batch):
+        """Adds new data to plot, and places the profile layer once the run's profile is known."""
+
+        run = batch[batch['state'] == ST_RUN]
+        if(len(run)):
+            if(self.anchor and not follows(run,*self.anchor)):
+                # paused and resumed (profile time stood still), or a different profile
+                self.anchor = None
+                self.pending = []
+                self.npending = 0
+                self.layer_changed = True
+            if(not self.anchor and self.npending is not None):
+                run = run[:LOCATE_SAMPLES-self.npending]
+                self.pending.append(numpy.array(run))
+                self.npending += len(run)
+                self.anchor = locate(numpy.concatenate(self.pending),self.profile)
+                if(self.anchor):
+                    self.pending = []
+                    self.npending = 0
+                    self.layer_changed = True
+                elif(self.npending >= LOCATE_SAMPLES):
+                    # follows no profile: stop trying until the plot is reset
+                    self.pending = []
+                    self.npending = None
+
+        super(OvenTempPlot,self).update_plot(batch)
+
+    def reset_plot(self):
+        """Resets plot to empty (no data) state, and removes the profile layer."""
+        super(OvenTempPlot,self).reset_plot()
+        self.anchor = None
+        self.pending = []
+        self.npending = 0
+        self.layer_changed = True
+
+    def refresh_layer(self):
+        """Sets the data of the static profile layer (profile curve and tolerance band)."""
+        if(self.anchor):
+            (profile,anchor) = self.anchor
+            target = profile_trajectory(profile)['target']*0.25
+            times = (anchor + numpy.arange(len(target)))*0.25 - self.time_offset
+            self.c_profile.setData(times,target)
+            self.c_band_lo.setData(times,target-self.tolerance)
+            self.c_band_hi.setData(times,target+self.tolerance)
+        else:
+            for c in (self.c_profile,self.c_band_lo,self.c_band_hi):
+                c.setData([],[])
+        self.layer_changed = False
+
+    def in_scale(self,times,temps):
+        """True if all points lie within the current axis scales (so that the axes need no update)."""
+        x = self.axisScaleDiv(Qwt.QwtPlot.xBottom)
+        y = self.axisScaleDiv(Qwt.QwtPlot.yLeft)
+        return (len(times) == 0 or
+                (x.lowerBound() <= times.min() and times.max() <= x.upperBound() and
+                 y.lowerBound() <= temps.min() and temps.max() <= y.upperBound()))
+
+    def refresh(self):
+        """Hands current history to plot curves.
+
+        While the profile layer is shown, the controller's target follows it and is not
+        drawn separately; measured temperatures that fall within the (profile-spanning)
+        axes are drawn incrementally on top of the cached canvas instead of replotting
+        (only possible while the curve has every sample, i.e. at full resolution)."""
+
+        (times,temps) = self.curve_data('temp',0.25)
+        self.c_temp.setData(times,temps)
+
+        full = (self.layer_changed or not self.anchor or self.lod_level > 0 or self.zoomed() or
+                self.drawn == 0 or self.drawn > len(times))
+        if(self.layer_changed):
+            self.refresh_layer()
+        if(not self.anchor):
+            self.c_target.setData(*self.curve_data('target',0.25))
+        elif(full):
+            self.c_target.setData([],[])
+
+        if(not full and self.in_scale(times[self.drawn-1:],temps[self.drawn-1:])):
+            if(len(times) > self.drawn):
+                self.c_temp.draw(self.drawn-1,len(times)-1)
+            self.drawn = len(times)
+            return False
+
+        self.drawn = len(times)
+        return True
+
+
+class OvenCommandPlot(OvenPlot):
+    """Class for plotting power commands to oven."""
+
+    lod_columns = ('cmd',)
+
+    def __init__(self,comm,parent=None,scheduler=None):
+        """Sets up OvenCommandPlot-specific formatting."""
+
+        super(OvenCommandPlot,self).__init__(comm,parent,scheduler)
+
+        self.setTitle("Commands")
+        self.setAxisTitle(Qwt.QwtPlot.yLeft, "Command")
+
+        self.c_cmd = Qwt.QwtPlotCurve("Command")
+
+        self.c_cmd.attach(self)
+        
+        pen = QtGui.QPen()
+        pen.setColor(QtCore.Qt.black)
+        pen.setWidth(4)
+       
+        self.c_cmd.setPen(pen)
+
+    def refresh(self):
+        """Hands current history to plot curves."""
+
+        self.c_cmd.setData(*self.curve_data('cmd',100.0/255.0))
+        return True
+
+
+class OvenPlots(QtGui.QWidget):
+    """Widget containing all GUI plots for oven controller."""
+
+    def __init__(self,comm,parent=None,max_fps=20):
+        """Creates plots and assigns layouts."""
+
+        super(OvenPlots,self).__init__(parent)
+
+        # both plots share one render scheduler, so they are redrawn in the same frame
+        self.scheduler = OvenRenderScheduler(parent=self,max_fps=max_fps)
+
+        self.temps = OvenTempPlot(comm,parent=self,scheduler=self.scheduler)
+        self.commands = OvenCommandPlot(comm,parent=self,scheduler=self.scheduler)
+
+        l = QtGui.QVBoxLayout()
+        l.addWidget(self.temps)
+        l.addWidget(self.commands)
+
+        self.setLayout(l)
@@ -0,0 +1,218 @@
+#! /usr/bin/python
+
+'''
+Reflow profile compiler, and the target trajectories the controller follows for each profile.
+
+Copyright (c) 2011, Daniel Strother < http://danstrother.com/ >
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+  - Redistributions of source code must retain the above copyright notice,
+    this list of conditions and the following disclaimer.
+  - Redistributions in binary form must reproduce the above copyright
+    notice, this list of conditions and the following disclaimer in the
+    documentation and/or other materials provided with the distribution.
+  - The name of the author may not be used to endorse or promote products
+    derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS" AND ANY EXPRESS OR IMPLIED
+WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Usage:  ovenprofile.py compile time:temp time:temp time:temp time:temp time:temp time:temp time:temp
+        ovenprofile.py show lead|kester|lead-free
+
+'compile' turns setpoints (seconds and degrees, starting from the controller's
+25C at time 0) into the step table for profiles[] in oven_profile.c - the
+replacement for reflow_profiles.ods. The firmware always runs all STEPS (7)
+steps of a profile, and a step of zero length would wrap its step timer, so
+exactly 7 setpoints are needed; a profile with fewer points makes up the count
+by repeating a temperature at a later time (a hold step, rate 0).
+'show' prints the target trajectory a profile produces, one row per 0.25s tick.
+'''
+
+# depends on python-numpy
+import numpy
+import sys
+
+from ovenproto import PROFILE_NAMES, PROFILE_TABLES, ST_RUN, TIME_WRAP
+
+START_TEMP  = 25*1024   # profile_reset(): room temp start point (1/1024 degrees)
+MAX_STEPS   = 7         # STEPS in oven_profile.h
+
+# target trajectory of a profile, one entry per tick while it runs, as profile_update() reports it
+TRAJECTORY_DTYPE = numpy.dtype([
+    ('step',        numpy.uint8),
+    ('TtoTarget',   numpy.uint16),      # seconds until the next step
+    ('target',      numpy.int16),       # 0.25C units
+])
+
+_trajectories = {}
+
+
+def compile_profile(setpoints):
+    """Compiles (time,temp) setpoints (seconds, degrees) into a (delta_time,temp_rate) step table.
+
+    Each segment is rounded to whole 0.25s ticks and whole 1/1024 degree rates; the rate
+    of every segment is chosen from the fixed-point temperature actually reached, so that
+    rounding errors do not accumulate from one step to the next.
+
+    Exactly MAX_STEPS setpoints are required: the firmware runs every entry of a profile,
+    and a missing (zero) entry would wrap its step timer rather than end the profile."""
+    if(len(setpoints) != MAX_STEPS):
+        raise ValueError("the firmware runs exactly %d steps, got %d setpoints" % (MAX_STEPS,len(setpoints)))
+    table = []
+    t_prev = 0
+    temp = START_TEMP
+    for (t,target) in setpoints:
+        t = int(round(t*4))
+        delta = t - t_prev
+        if(not 0 < delta <= 0xFFFF):
+            raise ValueError("step ending at %.2fs must last between 0.25s and %.2fs" % (t*0.25,0xFFFF*0.25))
+        rate = int(round((target*1024 - temp) / float(delta)))
+        if(not -0x8000 <= rate <= 0x7FFF):
+            raise ValueError("step ending at %.2fs is too steep" % (t*0.25))
+        table.append((delta,rate))
+        temp += delta*rate
+        t_prev = t
+    return tuple(table)
+
+
+def setpoints(table):
+    """Inverse of compile_profile(): the (time,temp) points (seconds, degrees) a step table reaches."""
+    points = []
+    t = 0
+    temp = START_TEMP
+    for (delta,rate) in table:
+        t += delta
+        temp += delta*rate
+        points.append((t*0.25, temp/1024.0))
+    return points
+
+
+def trajectory(table):
+    """Target trajectory (TRAJECTORY_DTYPE array) of a step table, as produced by profile_reset()
+    followed by profile_update() on every tick, until it reports the profile done.
+
+    Results are cached per table, and returned read-only."""
+    table = tuple([tuple(s) for s in table])
+    traj = _trajectories.get(table)
+    if(traj is not None):
+        return traj
+
+    delta = numpy.array([s[0] for s in table],numpy.int64)
+    rate = numpy.array([s[1] for s in table],numpy.int64)
+    if((delta <= 0).any()):
+        raise ValueError("zero-length profile step")    # would wrap profile_time in the firmware
+    n = delta.sum()
+    ends = numpy.cumsum(delta)
+
+    # step index and ticks left in the step after this tick's decrement of profile_time
+    s = numpy.repeat(numpy.arange(len(table)),delta)
+    left = ends[s] - numpy.arange(1,n+1)
+
+    # on the last tick of a step, profile_update() has already moved on to the next one
+    last = (left == 0)
+    next_delta = numpy.append(delta[1:],0)
+    step = s + 1 + last
+    time_left = numpy.where(last,next_delta[s],left)
+
+    traj = numpy.zeros(n,TRAJECTORY_DTYPE)
+    traj['step'] = step
+    traj['TtoTarget'] = time_left >> 2
+    profile_temp = START_TEMP + numpy.cumsum(rate[s])
+    traj['target'] = (profile_temp >> 8).astype(numpy.int16)   # wraps like int16_t
+    traj.flags.writeable = False
+    _trajectories[table] = traj
+    return traj
+
+
+def profile_trajectory(profile):
+    """Target trajectory of one of the firmware's profiles (PROFILE_NAMES entry or index)."""
+    if(not isinstance(profile,int)):
+        profile = PROFILE_NAMES.index(profile)
+    return trajectory(PROFILE_TABLES[profile])
+
+
+def follows(batch,profile,anchor):
+    """True if the run-state samples in batch lie on a profile's trajectory, with the sample
+    reported at controller time t being trajectory entry t-anchor.
+
+    Times are compared modulo the controller's time wrap (profiles are far shorter), so
+    raw and unwrapped times both work, across the wrap too."""
+    run = batch[batch['state'] == ST_RUN]
+    traj = profile_trajectory(profile)
+    idx = (run['time'].astype(numpy.int64) - anchor) % TIME_WRAP
+    if(not len(run) or idx.max() >= len(traj)):
+        return False
+    t = traj[idx]
+    return bool((t['step'] == run['step']).all() and (t['TtoTarget'] == run['TtoTarget']).all() and
+                (t['target'] == run['target']).all())
+
+
+LOCATE_SAMPLES = 240    # run-state samples (one minute) that are plenty for locate() at the start of a run
+
+
+def locate(batch,profile=None):
+    """Finds which profile (if not given) the run-state samples in batch follow, and where.
+
+    Returns (profile,anchor) as used by follows(), or None if the samples match no
+    profile, or still match more than one position (the first few seconds of a run)."""
+    run = batch[batch['state'] == ST_RUN]
+    if(not len(run)):
+        return None
+    if(profile is None):
+        profiles = range(len(PROFILE_TABLES))
+    else:
+        profiles = [profile]
+
+    found = None
+    t0 = int(run['time'][0])
+    for p in profiles:
+        traj = profile_trajectory(p)
+        first = numpy.flatnonzero((traj['step'] == run['step'][0]) & (traj['TtoTarget'] == run['TtoTarget'][0]) &
+                                  (traj['target'] == run['target'][0]))
+        for i in first.tolist():
+            if(follows(run,p,t0-i)):
+                if(found):
+                    return None     # ambiguous
+                found = (p,t0-i)
+    return found
+
+
+def format_table(table,name='Profile'):
+    """Formats a step table (of exactly MAX_STEPS steps) as an entry of profiles[] in oven_profile.c."""
+    if(len(table) != MAX_STEPS):
+        raise ValueError("profiles[] entries have exactly %d steps, got %d" % (MAX_STEPS,len(table)))
+    lines = ["\t{\t// %s" % (name)]
+    for (i,(delta,rate)) in enumerate(table):
+        lines.append("\t\t{ %d, %d }%s" % (delta,rate,(i < len(table)-1) and ',' or ''))
+    lines.append("\t}")
+    return '\n'.join(lines) + '\n'
+
+
+if __name__ == '__main__':
+    if(len(sys.argv) < 3 or sys.argv[1] not in ('compile','show')):
+        sys.stderr.write("usage: %s compile time:temp (x7)\n"
+                         "       %s show %s\n" % (sys.argv[0],sys.argv[0],'|'.join(PROFILE_NAMES)))
+        sys.exit(1)
+
+    if(sys.argv[1] == 'compile'):
+        points = [tuple([float(v) for v in p.split(':')]) for p in sys.argv[2:]]
+        table = compile_profile(points)
+        sys.stdout.write(format_table(table))
+        for ((t,temp),(t_got,temp_got)) in zip(points,setpoints(table)):
+            sys.stderr.write("%8.2fs %7.2fC -> %8.2fs %8.3fC\n" % (t,temp,t_got,temp_got))
+    else:
+        traj = profile_trajectory(sys.argv[2])
+        sys.stdout.write("time,step,TtoTarget,target\n")
+        for (i,(step,TtoTarget,target)) in enumerate(traj.tolist()):
+            sys.stdout.write("%.2f,%d,%d,%.2f\n" % ((i+1)*0.25,step,TtoTarget,target*0.25))
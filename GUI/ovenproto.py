@@ -0,0 +1,386 @@
+'''
+Oven controller serial protocol - status message decoding.
+
+Copyright (c) 2011, Daniel Strother < http://danstrother.com/ >
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+  - Redistributions of source code must retain the above copyright notice,
+    this list of conditions and the following disclaimer.
+  - Redistributions in binary form must reproduce the above copyright
+    notice, this list of conditions and the following disclaimer in the
+    documentation and/or other materials provided with the distribution.
+  - The name of the author may not be used to endorse or promote products
+    derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS" AND ANY EXPRESS OR IMPLIED
+WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+'''
+
+# no Qt dependencies - usable by GUI, logging and analysis tools alike
+# depends on python-numpy
+import numpy
+
+# controller states (ST_* in ovencon.c)
+ST_FAULT    = 0
+ST_IDLE     = 1
+ST_RUN      = 2
+ST_DONE     = 3
+ST_PAUSE    = 4
+ST_MANUAL   = 5
+
+# controller state names (state_names[] in ovencon.c, padded to 8 characters there)
+STATE_NAMES = ('fault','idle','run','done','pause','manual')
+
+# states in which the controller sends status lines
+REPORTING_STATES = (ST_RUN,ST_MANUAL)
+
+# the controller's time (uint16_t in ovencon.c, 0.25s ticks) wraps every ~4.55 hours
+TIME_WRAP = 1 << 16
+
+# silence (0.25s ticks) after which a run or manual message starts a new run
+RUN_GAP = 8
+
+# reflow profiles, in the order of profiles[] in oven_profile.c
+PROFILE_NAMES = ('lead','kester','lead-free')
+
+# profile step tables (profiles[] in oven_profile.c): (delta_time, temp_rate) per step,
+# delta_time in 0.25s ticks, temp_rate in 1/1024 degrees per tick
+PROFILE_TABLES = (
+    ((960,64),(720,135),(120,213),(180,85),(120,0),(180,-228),(360,-441)),     # lead
+    ((720,178),(300,102),(120,171),(100,154),(40,0),(120,-213),(200,-205)),   # kester
+    ((960,80),(720,142),(120,171),(180,114),(120,0),(180,-341),(360,-441)),   # lead-free
+)
+
+# raw (space-stripped) state field -> state code
+_states = {}
+for _code,_name in enumerate(STATE_NAMES):
+    _states[_name.capitalize().encode('ascii')] = _code
+
+# one status message in the controller's native units:
+# time in 0.25s ticks, temperatures in 0.25C, TtoTarget in seconds, cmd 0-255
+MSG_DTYPE = numpy.dtype([
+    ('state',       numpy.uint8),
+    ('step',        numpy.uint8),
+    ('time',        numpy.uint32),
+    ('temp',        numpy.int16),
+    ('TtoTarget',   numpy.uint16),
+    ('target',      numpy.int16),
+    ('cmd',         numpy.uint8),
+    ('error',       numpy.int16),
+    ('derivative',  numpy.int16),
+    ('pid_int',     numpy.int32),
+])
+
+EMPTY_BATCH = numpy.zeros(0,MSG_DTYPE)
+
+# (min,max) of each MSG_DTYPE field, in field order
+FIELD_LIMITS = tuple([(int(numpy.iinfo(MSG_DTYPE[k]).min),int(numpy.iinfo(MSG_DTYPE[k]).max)) for k in MSG_DTYPE.names])
+
+
+def make_batch(records):
+    """Packs a list of raw record tuples (MSG_DTYPE field order) into a batch array."""
+    if(not records):
+        return EMPTY_BATCH
+    return numpy.array(records,MSG_DTYPE)
+
+
+def split_runs(batch,prev=None):
+    """Splits batch where a new run begins.
+
+    The controller only reports in RUN and MANUAL, so a run begins with a run or
+    manual message that follows silence (more than RUN_GAP ticks) or a message of
+    another state - unless it carries on the profile where the previous message
+    left it (a pause). Recorded idle messages also begin a run when they follow
+    any other state; within a segment, idle messages (if any) precede all others.
+
+    prev is the message preceding the batch (None: the batch starts the stream).
+    Yields (segment,new_run) pairs; new_run is True if the segment begins a run."""
+    if(not len(batch)):
+        return
+    if(prev is None):
+        prev = batch[0]
+    state = batch['state']
+    p = numpy.empty(len(batch),MSG_DTYPE)     # message preceding each one
+    p[0] = prev
+    p[1:] = batch[:-1]
+    idle = (state == ST_IDLE)
+    pidle = (p['state'] == ST_IDLE)
+
+    silent = (batch['time'].astype(numpy.int64) - p['time']) % TIME_WRAP > RUN_GAP
+    profile = numpy.isin(state,(ST_RUN,ST_PAUSE)) & numpy.isin(p['state'],(ST_RUN,ST_PAUSE))
+    carries_on = profile & ((batch['step'] > p['step']) |
+                            ((batch['step'] == p['step']) & (batch['TtoTarget'] <= p['TtoTarget'])))
+    begins = numpy.isin(state,REPORTING_STATES) & (silent | (state != p['state'])) & ~carries_on
+    new = (idle & ~pidle) | (begins & ~pidle)
+
+    starts = numpy.flatnonzero(new).tolist()
+    if(not starts or starts[0] != 0):
+        starts.insert(0,0)
+    starts.append(len(batch))
+    for i in range(len(starts)-1):
+        a = starts[i]
+        yield (batch[a:starts[i+1]], bool(new[a]))
+
+
+def unwrap_time(t,last=None):
+    """Controller times t as a continuation of the unwrapped time last (None: starting at t[0]).
+
+    The controller's time wraps at 2**16; every step is taken to be the shortest one
+    modulo 2**16 (forwards or backwards), so gaps must stay under ~2.3 hours."""
+    t = t.astype(numpy.int64) % TIME_WRAP
+    if(last is None):
+        last = int(t[0])
+    steps = numpy.diff(numpy.concatenate(([last % TIME_WRAP],t)))
+    steps = (steps + TIME_WRAP//2) % TIME_WRAP - TIME_WRAP//2
+    return last + numpy.cumsum(steps)
+
+
+class OvenMsg(object):
+    """Class representing a single status message sent from the oven control hardware.
+
+    Values are in seconds, degrees celsius and 0-1 (cmd); batches of messages are
+    kept as MSG_DTYPE arrays in the controller's native units instead."""
+
+    __slots__ = ('state','time','step','target','TtoTarget','cmd','temp','error','derivative','pid_int')
+
+    def __init__(self,rec=None):
+        """Sets sane default message contents, or takes them from a raw record/batch row."""
+        if(rec is not None):
+            self.set_record(rec)
+            return
+        self.state      = 'idle'
+        self.time       = 0.0
+        self.step       = 0
+        self.target     = 0.0
+        self.TtoTarget  = 0.0
+        self.cmd        = 0.0
+        self.temp       = 0.0
+        self.error      = 0.0
+        self.derivative = 0.0
+        self.pid_int    = 0.0
+
+    def set_record(self,rec):
+        """Sets message contents from a raw record (tuple or batch row, MSG_DTYPE field order)."""
+        (state,step,time,temp,TtoTarget,target,cmd,error,derivative,pid_int) = rec
+        self.state      = STATE_NAMES[state]
+        self.step       = int(step)
+        self.time       = time*0.25
+        self.temp       = temp*0.25
+        self.TtoTarget  = float(TtoTarget)
+        self.target     = target*0.25
+        self.cmd        = cmd/255.0
+        self.error      = error*0.25
+        self.derivative = derivative*0.25
+        self.pid_int    = pid_int*0.25
+
+    def record(self):
+        """Returns message contents as a raw record tuple (MSG_DTYPE field order)."""
+        return (STATE_NAMES.index(self.state), self.step, int(round(self.time*4)),
+                int(round(self.temp*4)), int(self.TtoTarget), int(round(self.target*4)),
+                int(round(self.cmd*255)), int(round(self.error*4)),
+                int(round(self.derivative*4)), int(round(self.pid_int*4)))
+
+    def parse(self,msg):
+        """Parses message contents from a single comma-separated line.
+
+        Returns 1 on success, 0 if the line is not a status message.
+        See decode_line() for the supported layouts."""
+
+        rec = decode_line(msg)
+        if(rec is None):
+            return 0
+        self.set_record(rec)
+        return 1
+
+
+def decode_line(line):
+    """Decodes one status line (without its new-line) into a raw record tuple.
+
+    On the microcontroller, ST_RUN status lines are generated with the C code:
+    sprintf_P(tx_msg,PSTR("%s,%u,%u,%d,%u,%d,%u\\n"),
+        state_names[state],
+        step,
+        time,
+        temp,
+        TtoTarget,
+        target,
+        HeaterPwr);
+
+    ..and ST_MANUAL status lines with:
+    sprintf_P(tx_msg,PSTR("%u,%d,%d,%u,%d,%d,%d\\n"),
+        time,
+        temp,
+        target,
+        HeaterPwr,
+        error,
+        derivative,
+        pid_int);
+
+    Older firmware omitted pid_int from the manual layout (6 fields, as in the
+    PID*.csv tuning logs); that is accepted as well.
+
+    The record keeps the controller's units (see MSG_DTYPE), in MSG_DTYPE field order.
+    Returns None if the line is not a status message, or if a field does not fit
+    its MSG_DTYPE type (a line garbled in transmission)."""
+
+    f = line.split(b',')
+    n = len(f)
+    try:
+        if(f[0][:1].isdigit()):
+            if(n == 7):
+                rec = (ST_MANUAL,0,int(f[0]),int(f[1]),0,int(f[2]),int(f[3]),int(f[4]),int(f[5]),int(f[6]))
+            elif(n == 6):
+                rec = (ST_MANUAL,0,int(f[0]),int(f[1]),0,int(f[2]),int(f[3]),int(f[4]),int(f[5]),0)
+            else:
+                return None
+        else:
+            if(n != 7):
+                return None
+            state = _states.get(f[0].strip())
+            if(state is None):
+                return None
+            rec = (state,int(f[1]),int(f[2]),int(f[3]),int(f[4]),int(f[5]),int(f[6]),0,0,0)
+    except ValueError:
+        return None
+    for (v,(lo,hi)) in zip(rec,FIELD_LIMITS):
+        if(v < lo or v > hi):
+            return None
+    return rec
+
+
+def encode_line(rec):
+    """Formats a raw record (MSG_DTYPE field order) exactly as the controller sends it.
+
+    Inverse of decode_line(): manual-mode records use the ST_MANUAL layout, all
+    others the ST_RUN layout (with the state name padded as in state_names[])."""
+    (state,step,time,temp,TtoTarget,target,cmd,error,derivative,pid_int) = rec
+    if(state == ST_MANUAL):
+        line = "%u,%d,%d,%u,%d,%d,%d\n" % (time,temp,target,cmd,error,derivative,pid_int)
+    else:
+        line = "%-8s,%u,%u,%d,%u,%d,%u\n" % (STATE_NAMES[state].capitalize(),step,time,temp,TtoTarget,target,cmd)
+    return line.encode('ascii')
+
+
+def encode_lines(batch):
+    """Formats a whole batch as the controller would send it; returns bytes."""
+    return b''.join([encode_line(rec) for rec in batch.tolist()])
+
+
+class OvenDecoder():
+    """Incremental decoder for the controller's serial stream.
+
+    Bytes are read straight into a reusable receive buffer; every complete line
+    in it is decoded, and a trailing partial line is carried over to the next read.
+    Each read returns the batch (MSG_DTYPE array) of messages decoded from it."""
+
+    def __init__(self,bufsize=4096):
+        """Allocates receive buffer (bufsize must exceed the longest line)."""
+        self.buf        = bytearray(bufsize)
+        self.view       = memoryview(self.buf)
+        self.fill       = 0     # bytes currently held in buf (a partial line)
+        self.errors     = 0     # lines that were not status messages
+        self.overflows  = 0     # over-long lines that were discarded
+        self.coefs      = None  # last (k_p,k_i,k_d) reported by "* Coefs:" reply
+        self.replies    = 0     # "* Coefs:" replies received (each proves the controller was idle)
+        self.last_read  = 0     # bytes obtained by the last read_from()
+
+    def reset(self):
+        """Discards any buffered partial line."""
+        self.fill = 0
+
+    def read_from(self,f,size=None):
+        """Reads up to size bytes (default: remaining buffer space) from file-like f.
+
+        Returns the batch of decoded messages; an empty batch if nothing complete arrived.
+        At end of file, nothing is read and an empty batch is returned."""
+        space = len(self.buf) - self.fill
+        if(size is None or size > space):
+            size = space
+        readinto = getattr(f,'readinto',None)
+        if(readinto):
+            n = readinto(self.view[self.fill:self.fill+size])
+        else:
+            data = f.read(size)
+            n = len(data)
+            self.view[self.fill:self.fill+n] = data
+        self.last_read = n or 0
+        if(not n):
+            return EMPTY_BATCH
+        return make_batch(self._consume(self.fill+n))
+
+    def feed(self,data):
+        """Decodes bytes that were already read elsewhere; returns batch of decoded messages."""
+        records = []
+        view = memoryview(data)
+        pos = 0
+        while(pos < len(view)):
+            n = min(len(view)-pos, len(self.buf)-self.fill)
+            self.view[self.fill:self.fill+n] = view[pos:pos+n]
+            pos += n
+            records.extend(self._consume(self.fill+n))
+        return make_batch(records)
+
+    def _consume(self,end):
+        """Decodes complete lines in buf[:end]; keeps the remainder as pending partial line."""
+        last = self.buf.rfind(b'\n',0,end)
+        if(last < 0):
+            if(end == len(self.buf)):
+                # no line terminator in a full buffer - drop it (as the firmware does)
+                self.overflows += 1
+                end = 0
+            self.fill = end
+            return []
+
+        records = self.decode_lines(self.view[:last].tobytes())
+
+        # move partial line to front of buffer
+        tail = end - (last+1)
+        if(tail):
+            self.view[:tail] = self.view[last+1:end]
+        self.fill = tail
+        return records
+
+    def decode_lines(self,chunk):
+        """Decodes a block of complete, new-line separated lines; returns list of raw records."""
+        records = []
+        append = records.append
+        for line in chunk.split(b'\n'):
+            rec = decode_line(line.rstrip(b'\r'))
+            if(rec is not None):
+                append(rec)
+            elif(line.startswith(b'* Coefs:') and len(line[8:].split()) == 3):
+                self.coefs = tuple([int(k) for k in line[8:].split()])
+                self.replies += 1
+            elif(line):
+                self.errors += 1
+        return records
+
+    def iter_batches(self,f,size=None):
+        """Yields batches of decoded messages from file-like f until end of file (log replay, bulk import)."""
+        while(True):
+            space = len(self.buf) - self.fill
+            if(size is None or size > space):
+                n = space
+            else:
+                n = size
+            batch = self.read_from(f,n)
+            if(not self.last_read):
+                break
+            if(len(batch)):
+                yield batch
+        if(self.fill):
+            # final line without terminator
+            records = self.decode_lines(self.view[:self.fill].tobytes())
+            self.fill = 0
+            if(records):
+                yield make_batch(records)
@@ -0,0 +1,303 @@
+#! /usr/bin/python
+
+'''
+Telemetry fan-out: publishes every decoded sample to any number of TCP subscribers.
+
+Copyright (c) 2011, Daniel Strother < http://danstrother.com/ >
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+  - Redistributions of source code must retain the above copyright notice,
+    this list of conditions and the following disclaimer.
+  - Redistributions in binary form must reproduce the above copyright
+    notice, this list of conditions and the following disclaimer in the
+    documentation and/or other materials provided with the distribution.
+  - The name of the author may not be used to endorse or promote products
+    derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS" AND ANY EXPRESS OR IMPLIED
+WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Usage:  ovenpub.py [--stats] address
+
+(subscribes to a publisher - ovencon/ovensuper/ovend started with --publish -
+and prints the samples it receives as CSV, or once a second a rate summary)
+
+Stream format (little-endian): frames of
+
+  type (uint8), channel (uint8), payload length (uint32), payload
+
+  F_HELLO     JSON: {"version", "channels": [oven names], "fields": [MSG_DTYPE names]};
+              always the first frame
+  F_RECORDS   n raw MSG_DTYPE records (packed, WIRE_DTYPE)
+  F_BLOCK     one delta-encoded block (see ovenbinlog), used when smaller than raw
+  F_DROPPED   samples of channel not delivered to this subscriber (uint32) since
+              the last F_DROPPED, because it did not keep up
+
+Each subscriber has a bounded queue. The publisher never waits for a
+subscriber: a slow one either loses the oldest queued frames (policy 'drop') or
+is sent every 2nd, 4th, ... sample while it is behind (policy 'decimate');
+either way it is told how many samples it missed.
+'''
+
+# Qt-free
+# depends on python-numpy
+import argparse
+import collections
+import json
+import numpy
+import socket
+import struct
+import sys
+import time
+
+from ovenbinlog import encode_block, decode_block
+from ovenio import OvenServer
+from ovenproto import MSG_DTYPE, STATE_NAMES
+
+VERSION     = 1
+FRAME       = struct.Struct('<BBI')
+F_HELLO     = 0
+F_RECORDS   = 1
+F_BLOCK     = 2
+F_DROPPED   = 3
+
+WIRE_DTYPE  = MSG_DTYPE.newbyteorder('<')
+POLICIES    = ('drop','decimate')
+MAX_LEVEL   = 6             # decimation to at most every 64th sample
+SNDBUF      = 32*1024       # kernel send buffer per subscriber (left alone, it may grow to megabytes)
+
+
+def encode_frame(ftype,channel,payload):
+    return FRAME.pack(ftype,channel,len(payload)) + payload
+
+
+def encode_batch(batch,channel):
+    """Data frame for a batch: raw records, or a delta-encoded block where that is smaller."""
+    raw = batch.astype(WIRE_DTYPE).tobytes()
+    if(len(batch) > 4 and len(batch) < 0x10000):
+        block = encode_block(batch)
+        if(len(block) < len(raw)):
+            return encode_frame(F_BLOCK,channel,block)
+    return encode_frame(F_RECORDS,channel,raw)
+
+
+class OvenSubscriber():
+    """Protocol for one subscriber connection (publisher side)."""
+
+    def __init__(self,publisher):
+        self.publisher = publisher
+        self.transport = None
+        self.paused = False
+        self.queue = collections.deque()    # (frame, channel, samples) waiting for the socket
+        self.queued = 0                     # bytes in queue
+        self.dropped = {}                   # channel -> samples not delivered, not yet reported
+        self.level = 0                      # decimation: every 2**level-th sample is sent
+        self.seen = 0                       # samples offered (for decimation phase)
+        self.escalated = False              # level raised since the socket last drained
+
+    def connection_made(self,transport):
+        self.transport = transport
+        # keep little in the socket and transport buffers, so that the queue (and its policy) decides what is sent
+        sock = transport.get_extra_info('socket')
+        if(sock is not None):
+            sock.setsockopt(socket.SOL_SOCKET,socket.SO_SNDBUF,SNDBUF)
+        transport.set_write_buffer_limits(16*1024,4*1024)
+        hello = json.dumps({'version': VERSION, 'channels': list(self.publisher.channels),
+                            'fields': list(MSG_DTYPE.names)})
+        transport.write(encode_frame(F_HELLO,0,hello.encode('ascii')))
+        self.publisher.clients.add(self)
+
+    def data_received(self,data):
+        pass            # subscribers do not send anything
+
+    def eof_received(self):
+        pass
+
+    def connection_lost(self,exc):
+        self.publisher.clients.discard(self)
+        self.transport = None
+
+    def pause_writing(self):
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+        self.flush()
+
+    def lose(self,channel,n):
+        self.dropped[channel] = self.dropped.get(channel,0) + n
+
+    def offer(self,batch,channel,frame):
+        """Sends (or queues) a published batch; frame is its encoding for subscribers that are not behind."""
+        n = len(batch)
+        if(self.level):
+            # keep every 2**level-th sample, counting across batches
+            step = 1 << self.level
+            first = (-self.seen) % step
+            self.seen += n
+            kept = batch[first::step]
+            self.lose(channel,n-len(kept))
+            if(not len(kept)):
+                return
+            frame = encode_batch(kept,channel)
+            n = len(kept)
+        else:
+            self.seen += n
+
+        if(not self.paused and not self.queue):
+            self.transport.write(frame)
+            return
+        self.queue.append((frame,channel,n))
+        self.queued += len(frame)
+        while(self.queued > self.publisher.max_queue and len(self.queue) > 1):
+            (old,ch,m) = self.queue.popleft()
+            self.queued -= len(old)
+            self.lose(ch,m)
+            if(self.publisher.policy == 'decimate' and not self.escalated and self.level < MAX_LEVEL):
+                self.level += 1
+                self.escalated = True
+
+    def flush(self):
+        """Sends queued frames (and loss reports) while the socket takes them."""
+        if(not self.transport):
+            return
+        for (ch,n) in list(self.dropped.items()):
+            self.transport.write(encode_frame(F_DROPPED,ch,struct.pack('<I',n)))
+        self.dropped = {}
+        self.escalated = False
+        while(self.queue and not self.paused):
+            (frame,ch,n) = self.queue.popleft()
+            self.queued -= len(frame)
+            self.transport.write(frame)
+        if(not self.queue and not self.paused and self.level):
+            self.level -= 1         # caught up: halve the decimation
+
+
+class OvenPublisher():
+    """Fans batches out to every subscriber connected to address.
+
+    Created from any thread; publish() and close() run in the OvenLoop's thread."""
+
+    def __init__(self,loop,address,channels=('oven',),policy='drop',max_queue=256*1024):
+        """Starts listening on address (tcp:host:port or unix:path). channels names the ovens published
+        (channel numbers are indexes into it); slow subscribers are handled per policy
+        once more than max_queue bytes are waiting for them."""
+        if(policy not in POLICIES):
+            raise ValueError("policy must be one of %s" % (', '.join(POLICIES)))
+        self.loop = loop
+        self.channels = tuple(channels)
+        self.policy = policy
+        self.max_queue = max_queue
+        self.clients = set()
+        self.published = 0
+        self.server = OvenServer(loop,address,lambda: OvenSubscriber(self))
+
+    def publish(self,batch,channel=0):
+        """Sends batch to every subscriber (loop thread only); never blocks."""
+        if(not len(batch)):
+            return
+        self.published += len(batch)
+        if(not self.clients):
+            return
+        frame = encode_batch(batch,channel)
+        for c in list(self.clients):
+            c.offer(batch,channel,frame)
+
+    def publish_threadsafe(self,batch,channel=0):
+        """publish() for use from other threads."""
+        self.loop.call_soon_threadsafe(self.publish,batch,channel)
+
+    def close(self):
+        """Stops listening and disconnects all subscribers, once their queues are sent (loop thread only)."""
+        self.server.close()
+        for c in list(self.clients):
+            if(c.transport):
+                c.paused = False
+                c.flush()
+                c.transport.close()
+
+
+class OvenFeed():
+    """Incremental decoder of a publisher's stream (subscriber side)."""
+
+    def __init__(self):
+        self.buf = b''
+        self.hello = None
+        self.dropped = {}   # channel -> total samples reported lost
+
+    def feed(self,data):
+        """Decodes received bytes; returns list of (channel, batch) for the complete data frames."""
+        self.buf += data
+        out = []
+        pos = 0
+        while(len(self.buf) - pos >= FRAME.size):
+            (ftype,channel,length) = FRAME.unpack_from(self.buf,pos)
+            end = pos + FRAME.size + length
+            if(len(self.buf) < end):
+                break
+            payload = self.buf[pos+FRAME.size:end]
+            pos = end
+            if(ftype == F_HELLO):
+                self.hello = json.loads(payload.decode('ascii'))
+            elif(ftype == F_RECORDS):
+                out.append((channel,numpy.frombuffer(payload,WIRE_DTYPE).astype(MSG_DTYPE)))
+            elif(ftype == F_BLOCK):
+                out.append((channel,decode_block(payload)))
+            elif(ftype == F_DROPPED):
+                self.dropped[channel] = self.dropped.get(channel,0) + struct.unpack('<I',payload)[0]
+        self.buf = self.buf[pos:]
+        return out
+
+
+def subscribe(address):
+    """Connects to a publisher at tcp:host:port or unix:path; returns the socket."""
+    if(address.startswith('unix:')):
+        sock = socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+        sock.connect(address[5:])
+        return sock
+    (host,port) = address[4:].rsplit(':',1)
+    return socket.create_connection((host,int(port)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Subscribe to live oven telemetry.")
+    parser.add_argument('--stats',action='store_true',help="print sample and loss rates instead of samples")
+    parser.add_argument('address',help="publisher address, tcp:host:port or unix:path")
+    args = parser.parse_args()
+
+    sock = subscribe(args.address)
+    feed = OvenFeed()
+    samples = 0
+    last = time.time()
+    try:
+        while(True):
+            data = sock.recv(65536)
+            if(not data):
+                break
+            for (channel,batch) in feed.feed(data):
+                samples += len(batch)
+                if(args.stats):
+                    continue
+                name = feed.hello and feed.hello['channels'][channel] or channel
+                for (state,step,t,temp,TtoTarget,target,cmd,error,derivative,pid_int) in batch.tolist():
+                    sys.stdout.write("%s,%s,%d,%d,%.2f,%d,%.2f,%d\n" % (name,STATE_NAMES[state],step,t,temp*0.25,
+                                                                       TtoTarget,target*0.25,cmd))
+            now = time.time()
+            if(args.stats and now - last >= 1.0):
+                sys.stdout.write("%.0f samples/s, dropped %s\n" % (samples/(now-last),feed.dropped))
+                sys.stdout.flush()
+                samples = 0
+                last = now
+    except KeyboardInterrupt:
+        pass
+    sock.close()
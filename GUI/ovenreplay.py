@@ -0,0 +1,157 @@
+#! /usr/bin/python
+
+'''
+Replays recorded oven logs through a pseudo-terminal, standing in for the controller hardware.
+
+Copyright (c) 2011, Daniel Strother < http://danstrother.com/ >
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+  - Redistributions of source code must retain the above copyright notice,
+    this list of conditions and the following disclaimer.
+  - Redistributions in binary form must reproduce the above copyright
+    notice, this list of conditions and the following disclaimer in the
+    documentation and/or other materials provided with the distribution.
+  - The name of the author may not be used to endorse or promote products
+    derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS" AND ANY EXPRESS OR IMPLIED
+WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Usage:  ovenreplay.py [--speed N] [--loop] log [log...]
+
+Prints the pseudo-terminal's path, which can be handed to ovencon.py in place
+of a serial port. Logs (PID*.csv, ovenlog_*.csv or .ovl) are streamed in the
+controller's wire format at N times real time (--speed 0: as fast as the
+reader accepts them); throughput is reported when the replay ends. As from the
+firmware, only run and manual samples are sent (idle stretches pass in
+silence), and times wrap at 2**16 ticks.
+'''
+
+# POSIX only (pty)
+import argparse
+import numpy
+import os
+import pty
+import select
+import sys
+import time
+import tty
+
+from ovenproto import encode_lines, unwrap_time, REPORTING_STATES, TIME_WRAP
+from ovenlogs import load_log
+
+
+class OvenReplay():
+    """Streams recorded samples into the master side of a pseudo-terminal."""
+
+    def __init__(self,batches,speed=1.0,loop=False):
+        """Opens pseudo-terminal. batches is a list of MSG_DTYPE batches, replayed in order."""
+        self.batches = batches
+        self.speed = speed
+        self.loop = loop
+        self.samples = 0
+        self.nbytes = 0
+
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)      # no echo, no new-line translation
+        self.path = os.ttyname(self.slave)
+
+    def close(self):
+        """Closes pseudo-terminal."""
+        os.close(self.master)
+        os.close(self.slave)
+
+    def drain_commands(self):
+        """Reads (and reports) any commands the host sent to the 'controller'."""
+        while(select.select([self.master],[],[],0)[0]):
+            data = os.read(self.master,1024)
+            if(not data):
+                break
+            sys.stderr.write("host: %r\n" % (data))
+
+    def send(self,data):
+        """Writes data to the pseudo-terminal, blocking while the reader is behind."""
+        view = memoryview(data)
+        while(len(view)):
+            r,w,x = select.select([self.master],[self.master],[])
+            if(r):
+                self.drain_commands()
+            if(w):
+                n = os.write(self.master,view)
+                view = view[n:]
+                self.nbytes += n
+
+    def run(self):
+        """Replays all batches (repeatedly, if looping); returns elapsed time in seconds."""
+        start = time.time()
+        base = 0            # replay clock at start of current batch (0.25s ticks)
+        next_time = None    # controller time (unwrapped) of next sample, so that time never runs backwards
+        while(True):
+            for batch in self.batches:
+                if(not len(batch)):
+                    continue
+                times = unwrap_time(batch['time'])
+                times = numpy.maximum.accumulate(times) - times[0]     # tolerate garbled times
+                first_time = int(batch['time'][0]) if next_time is None else next_time
+                next_time = first_time + int(times[-1]) + 1
+                end = base + times[-1] + 1
+
+                # the firmware only reports in run and manual states
+                reporting = numpy.isin(batch['state'],REPORTING_STATES)
+                batch = numpy.array(batch[reporting])
+                batch['time'] = (times[reporting] + first_time) % TIME_WRAP
+                times = times[reporting]
+
+                i = 0
+                while(i < len(batch)):
+                    if(self.speed > 0):
+                        # send every sample that is due; sleep until the next one is
+                        now = (time.time()-start)*4*self.speed - base
+                        j = numpy.searchsorted(times,now,'right')
+                        if(j <= i):
+                            time.sleep((times[i]-now)/(4.0*self.speed))
+                            continue
+                    else:
+                        j = min(len(batch),i+256)
+                    self.send(encode_lines(batch[i:j]))
+                    self.samples += j-i
+                    i = j
+
+                base = end
+            if(not self.loop):
+                break
+        return time.time()-start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay oven logs through a pseudo-terminal.")
+    parser.add_argument('--speed',type=float,default=1.0,help="replay speed relative to real time (0: unthrottled)")
+    parser.add_argument('--loop',action='store_true',help="repeat logs until interrupted")
+    parser.add_argument('--wait',action='store_true',help="wait for Enter before starting (to connect the GUI first)")
+    parser.add_argument('logs',nargs='+')
+    args = parser.parse_args()
+
+    replay = OvenReplay([load_log(path) for path in args.logs],args.speed,args.loop)
+    sys.stdout.write("%s\n" % (replay.path))
+    sys.stdout.flush()
+    if(args.wait):
+        sys.stdin.readline()
+
+    try:
+        elapsed = replay.run()
+    except KeyboardInterrupt:
+        elapsed = None
+    else:
+        sys.stderr.write("replayed %d samples (%d bytes) in %.3fs - %.0f samples/s\n" % (
+            replay.samples, replay.nbytes, elapsed, replay.samples/max(elapsed,1e-6)))
+    replay.close()
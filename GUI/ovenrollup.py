@@ -0,0 +1,513 @@
+#! /usr/bin/python
+
+'''
+Multi-resolution rollups of oven runs, for long-term trends.
+
+Copyright (c) 2011, Daniel Strother < http://danstrother.com/ >
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+  - Redistributions of source code must retain the above copyright notice,
+    this list of conditions and the following disclaimer.
+  - Redistributions in binary form must reproduce the above copyright
+    notice, this list of conditions and the following disclaimer in the
+    documentation and/or other materials provided with the distribution.
+  - The name of the author may not be used to endorse or promote products
+    derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS" AND ANY EXPRESS OR IMPLIED
+WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Usage:  ovenrollup.py update rollup.db log [log ...]
+        ovenrollup.py show rollup.db run|step|day [--since YYYY-MM-DD] [--until YYYY-MM-DD] [--step N]
+        ovenrollup.py series rollup.db run_id [--resolution seconds]
+
+A rollup database holds, for every run, aggregates of the run as a whole, of
+each profile step (the 'step' field) and of each day, plus the run's
+temperature, target and heater duty downsampled to RESOLUTIONS. Aggregates
+cover the active (run, pause, manual) samples: temperature range, temperature
+error (temp - target) and heater duty (cmd, 0-1) as min/max/mean and
+percentiles. Every aggregate keeps its sums and histograms, so new samples are
+merged in without revisiting old ones - either live (OvenRunLogger's rollup
+option) or by "update", which only reads logs that have grown since.
+'''
+
+# depends on python-numpy
+import argparse
+import glob
+import numpy
+import os
+import sqlite3
+import sys
+import time
+
+from ovenproto import ST_RUN, ST_PAUSE, ST_MANUAL, unwrap_time
+
+ACTIVE_STATES   = (ST_RUN,ST_PAUSE,ST_MANUAL)
+ACTIVE          = numpy.zeros(256,bool)     # indexed by state code
+ACTIVE[list(ACTIVE_STATES)] = True
+RESOLUTIONS     = (1,10,60)         # seconds per downsampled series bucket
+
+ERR_RANGE       = 128.0             # temperature error histogram: -128C..+128C (clipped),
+ERR_BINS        = 512               # in 0.5C bins
+DUTY_BINS       = 64                # heater duty histogram: 4 cmd steps per bin
+
+# mergeable statistics of a set of samples (one record per aggregate, kept as a blob)
+STATS_DTYPE = numpy.dtype([
+    ('n',           numpy.int64),       # active samples
+    ('first_time',  numpy.int64),       # controller time of first and last sample (any state)
+    ('last_time',   numpy.int64),
+    ('temp_min',    numpy.float64),
+    ('temp_max',    numpy.float64),
+    ('err_sum',     numpy.float64),
+    ('err_sumsq',   numpy.float64),
+    ('err_min',     numpy.float64),
+    ('err_max',     numpy.float64),
+    ('duty_sum',    numpy.float64),
+    ('duty_sumsq',  numpy.float64),
+    ('duty_min',    numpy.float64),
+    ('duty_max',    numpy.float64),
+    ('err_hist',    numpy.uint32, (ERR_BINS,)),
+    ('duty_hist',   numpy.uint32, (DUTY_BINS,)),
+])
+
+# one bucket of a downsampled series, in the controller's units
+SERIES_DTYPE = numpy.dtype([
+    ('bucket',      numpy.uint32),      # (unwrapped time - run's first time) // resolution
+    ('n',           numpy.uint16),
+    ('temp_min',    numpy.int16),
+    ('temp_max',    numpy.int16),
+    ('temp_sum',    numpy.int32),
+    ('target_sum',  numpy.int32),
+    ('cmd_sum',     numpy.int32),
+])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id          INTEGER PRIMARY KEY,
+    source      TEXT UNIQUE,        -- log file (absolute path) or other origin of the samples
+    size        INTEGER,            -- log file size and mtime when last read by update
+    mtime       REAL,
+    started     REAL NOT NULL,      -- unix time of first sample
+    date        TEXT NOT NULL,      -- local date of first sample (YYYY-MM-DD)
+    first_time  INTEGER,            -- controller time of first and last sample (0.25s ticks,
+                                    -- last_time unwrapped: it counts on past 65535)
+    last_time   INTEGER,
+    samples     INTEGER NOT NULL DEFAULT 0,
+    duration    REAL,               -- seconds
+    peak_temp   REAL,               -- degrees celsius
+    peak_time   REAL                -- seconds after first sample
+);
+CREATE INDEX IF NOT EXISTS runs_date ON runs (date);
+CREATE TABLE IF NOT EXISTS aggregates (
+    scope       TEXT NOT NULL,      -- 'run', 'step' or 'day'
+    key         TEXT NOT NULL,      -- run id, 'run id:step' or date
+    run_id      INTEGER,
+    step        INTEGER,
+    date        TEXT NOT NULL,
+    samples     INTEGER,            -- active samples
+    start       REAL,               -- seconds after the run's first sample (run and step)
+    duration    REAL,
+    temp_min    REAL,
+    temp_max    REAL,
+    err_mean    REAL,
+    err_std     REAL,
+    err_min     REAL,
+    err_max     REAL,
+    err_p5      REAL,
+    err_p50     REAL,
+    err_p95     REAL,
+    duty_mean   REAL,
+    duty_min    REAL,
+    duty_max    REAL,
+    duty_p5     REAL,
+    duty_p50    REAL,
+    duty_p95    REAL,
+    stats       BLOB NOT NULL,      -- STATS_DTYPE record the columns above are derived from
+    PRIMARY KEY (scope, key)
+);
+CREATE INDEX IF NOT EXISTS aggregates_date ON aggregates (scope, date);
+CREATE INDEX IF NOT EXISTS aggregates_run ON aggregates (run_id);
+CREATE TABLE IF NOT EXISTS series (
+    id          INTEGER PRIMARY KEY,
+    run_id      INTEGER NOT NULL REFERENCES runs(id),
+    resolution  INTEGER NOT NULL,   -- seconds per bucket
+    data        BLOB NOT NULL       -- SERIES_DTYPE array of the buckets of one add() (the first may
+                                    -- continue the previous row's last bucket)
+);
+CREATE INDEX IF NOT EXISTS series_run ON series (run_id, resolution, id);
+"""
+
+SUMMARY_COLUMNS = ('samples','start','duration','temp_min','temp_max',
+                   'err_mean','err_std','err_min','err_max','err_p5','err_p50','err_p95',
+                   'duty_mean','duty_min','duty_max','duty_p5','duty_p50','duty_p95')
+
+
+def empty_stats():
+    """STATS_DTYPE record of no samples."""
+    s = numpy.zeros(1,STATS_DTYPE)[0]
+    s['first_time'] = -1
+    for k in ('temp_min','err_min','duty_min'):
+        s[k] = numpy.inf
+    for k in ('temp_max','err_max','duty_max'):
+        s[k] = -numpy.inf
+    return s
+
+
+def batch_stats(batch):
+    """STATS_DTYPE record of a batch's samples."""
+    s = empty_stats()
+    if(not len(batch)):
+        return s
+    s['first_time'] = batch['time'][0]
+    s['last_time'] = batch['time'][-1]
+    active = ACTIVE[batch['state']]
+    if(not active.any()):
+        return s
+    a = batch[active]
+    temp = a['temp']*0.25
+    err = temp - a['target']*0.25
+    duty = a['cmd']/255.0
+    s['n'] = len(a)
+    s['temp_min'] = temp.min()
+    s['temp_max'] = temp.max()
+    s['err_sum'] = err.sum()
+    s['err_sumsq'] = numpy.dot(err,err)
+    s['err_min'] = err.min()
+    s['err_max'] = err.max()
+    s['duty_sum'] = duty.sum()
+    s['duty_sumsq'] = numpy.dot(duty,duty)
+    s['duty_min'] = duty.min()
+    s['duty_max'] = duty.max()
+    k = numpy.clip(((err+ERR_RANGE)*(ERR_BINS/(2*ERR_RANGE))).astype(numpy.int64),0,ERR_BINS-1)
+    s['err_hist'] = numpy.bincount(k,minlength=ERR_BINS)
+    s['duty_hist'] = numpy.bincount(a['cmd'].astype(numpy.int64)*DUTY_BINS//256,minlength=DUTY_BINS)
+    return s
+
+
+def merge_stats(a,b):
+    """STATS_DTYPE record of the union of the samples of a and b (b following a)."""
+    s = empty_stats()
+    s['n'] = a['n'] + b['n']
+    s['first_time'] = a['first_time'] if a['first_time'] >= 0 else b['first_time']
+    s['last_time'] = b['last_time'] if b['first_time'] >= 0 else a['last_time']
+    for k in ('err_sum','err_sumsq','duty_sum','duty_sumsq','err_hist','duty_hist'):
+        s[k] = a[k] + b[k]
+    for k in ('temp_min','err_min','duty_min'):
+        s[k] = min(a[k],b[k])
+    for k in ('temp_max','err_max','duty_max'):
+        s[k] = max(a[k],b[k])
+    return s
+
+
+def hist_percentile(hist,p,lo,width):
+    """p-th percentile of a histogram whose bin k covers lo+k*width .. lo+(k+1)*width (bin centre)."""
+    cum = numpy.cumsum(hist)
+    k = int(numpy.searchsorted(cum,p/100.0*cum[-1]))
+    return lo + (min(k,len(hist)-1)+0.5)*width
+
+
+def stats_summary(s,run_first=None):
+    """dict of SUMMARY_COLUMNS for a STATS_DTYPE record (start and duration need the run's first time)."""
+    d = dict([(k,None) for k in SUMMARY_COLUMNS])
+    if(run_first is not None and s['first_time'] >= 0):
+        d['start'] = (s['first_time']-run_first)*0.25
+        d['duration'] = (s['last_time']-s['first_time'])*0.25
+    n = int(s['n'])
+    d['samples'] = n
+    if(not n):
+        return d
+    d['temp_min'] = float(s['temp_min'])
+    d['temp_max'] = float(s['temp_max'])
+    for q in ('err','duty'):
+        mean = s[q+'_sum']/n
+        d[q+'_mean'] = float(mean)
+        d[q+'_min'] = float(s[q+'_min'])
+        d[q+'_max'] = float(s[q+'_max'])
+    d['err_std'] = float(numpy.sqrt(max(0.0,s['err_sumsq']/n - d['err_mean']**2)))
+    for p in (5,50,95):
+        # bin centres, clamped to the exact extremes
+        e = hist_percentile(s['err_hist'],p,-ERR_RANGE,2*ERR_RANGE/ERR_BINS)
+        d['err_p%d' % (p)] = float(min(max(e,s['err_min']),s['err_max']))
+        u = hist_percentile(s['duty_hist'],p,0.0,256.0/DUTY_BINS)/255.0
+        d['duty_p%d' % (p)] = float(min(max(u,s['duty_min']),s['duty_max']))
+    return d
+
+
+def downsample(batch,first_time,resolution):
+    """SERIES_DTYPE buckets of resolution seconds, counted from controller time first_time, of a batch."""
+    if(not len(batch)):
+        return numpy.zeros(0,SERIES_DTYPE)
+    b = (batch['time'].astype(numpy.int64) - first_time)//(resolution*4)
+    starts = numpy.concatenate(([0],numpy.flatnonzero(numpy.diff(b))+1))
+    s = numpy.zeros(len(starts),SERIES_DTYPE)
+    s['bucket'] = b[starts]
+    s['n'] = numpy.diff(numpy.concatenate((starts,[len(batch)])))
+    s['temp_min'] = numpy.minimum.reduceat(batch['temp'],starts)
+    s['temp_max'] = numpy.maximum.reduceat(batch['temp'],starts)
+    s['temp_sum'] = numpy.add.reduceat(batch['temp'].astype(numpy.int64),starts)
+    s['target_sum'] = numpy.add.reduceat(batch['target'].astype(numpy.int64),starts)
+    s['cmd_sum'] = numpy.add.reduceat(batch['cmd'].astype(numpy.int64),starts)
+    return s
+
+
+def merge_series(s):
+    """Combines consecutive buckets of s that have the same bucket number (where chunks meet)."""
+    if(not len(s)):
+        return s
+    starts = numpy.concatenate(([0],numpy.flatnonzero(numpy.diff(s['bucket'].astype(numpy.int64)))+1))
+    if(len(starts) == len(s)):
+        return s
+    m = numpy.zeros(len(starts),SERIES_DTYPE)
+    m['bucket'] = s['bucket'][starts]
+    m['temp_min'] = numpy.minimum.reduceat(s['temp_min'],starts)
+    m['temp_max'] = numpy.maximum.reduceat(s['temp_max'],starts)
+    for k in ('n','temp_sum','target_sum','cmd_sum'):
+        m[k] = numpy.add.reduceat(s[k],starts)
+    return m
+
+
+def log_started(path):
+    """Start time of a log file: from an ovenlog_YYYYmmddHHMMSS name, else the file's mtime."""
+    import re
+    m = re.search(r'(\d{14})',os.path.basename(path))
+    if(m):
+        return time.mktime(time.strptime(m.group(1),'%Y%m%d%H%M%S'))
+    return os.path.getmtime(path)
+
+
+class OvenRollupRun():
+    """Feeds the samples of one run into an OvenRollup; used like a log file (write/close)."""
+
+    def __init__(self,rollup,run_id,block_size):
+        """Use OvenRollup.begin_run() to create."""
+        self.rollup = rollup
+        self.run_id = run_id
+        self.block_size = block_size
+        self.pending = []
+        self.npending = 0
+
+    def write(self,batch):
+        """Appends a batch of samples; they are merged into the rollup every block_size samples."""
+        if(not len(batch)):
+            return
+        self.pending.append(numpy.array(batch))
+        self.npending += len(batch)
+        if(self.npending >= self.block_size):
+            self.flush()
+
+    def flush(self):
+        """Merges buffered samples into the rollup."""
+        if(self.npending):
+            samples = numpy.concatenate(self.pending)
+            self.pending = []
+            self.npending = 0
+            self.rollup.add(self.run_id,samples)
+
+    def close(self):
+        self.flush()
+
+
+class OvenRollup():
+    """Per-run, per-step and per-day aggregates and downsampled series of runs, in one SQLite file."""
+
+    def __init__(self,path='ovenrollup.db'):
+        """Opens (creating, if necessary) the rollup database."""
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        """Closes the database."""
+        if(self.db):
+            self.db.close()
+            self.db = None
+
+    def begin_run(self,started=None,source=None,block_size=240):
+        """Adds a new run; returns an OvenRollupRun used to feed its samples."""
+        return OvenRollupRun(self,self._new_run(started,source),block_size)
+
+    def _new_run(self,started=None,source=None):
+        if(started is None):
+            started = time.time()
+        cur = self.db.execute("INSERT INTO runs (started,date,source) VALUES (?,?,?)",
+            (started, time.strftime('%Y-%m-%d',time.localtime(started)), source))
+        self.db.commit()
+        return cur.lastrowid
+
+    def add(self,run_id,batch):
+        """Merges the next samples of a run into its aggregates, its day's and its series.
+
+        The controller's time is unwrapped to continue the run's last time. Samples not later
+        than those already merged are ignored (a run fed live may also be updated from its
+        log); returns the number of samples merged."""
+        db = self.db
+        (date,first_time,last_time,samples,peak_temp,peak_time) = db.execute(
+            "SELECT date,first_time,last_time,samples,peak_temp,peak_time FROM runs WHERE id=?",(run_id,)).fetchone()
+        if(not len(batch)):
+            return 0
+        batch = numpy.array(batch)
+        batch['time'] = unwrap_time(batch['time'],last_time)
+        if(first_time is None):
+            first_time = int(batch['time'][0])
+            batch = batch[batch['time'] >= first_time]
+        else:
+            batch = batch[batch['time'] > last_time]
+        if(not len(batch)):
+            return 0
+
+        inc = batch_stats(batch)
+        self._merge(('run',str(run_id),run_id,None,date),inc,first_time)
+        self._merge(('day',date,None,None,date),inc,None)
+        steps = batch['step']
+        for step in numpy.unique(steps).tolist():
+            self._merge(('step','%d:%d' % (run_id,step),run_id,step,date),batch_stats(batch[steps == step]),first_time)
+
+        for res in RESOLUTIONS:
+            db.execute("INSERT INTO series (run_id,resolution,data) VALUES (?,?,?)",
+                (run_id,res,sqlite3.Binary(downsample(batch,first_time,res).tobytes())))
+
+        i = int(numpy.argmax(batch['temp']))
+        if(peak_temp is None or batch['temp'][i]*0.25 > peak_temp):
+            peak_temp = batch['temp'][i]*0.25
+            peak_time = (int(batch['time'][i])-first_time)*0.25
+        last_time = int(batch['time'][-1])
+        db.execute("UPDATE runs SET first_time=?, last_time=?, samples=?, duration=?, peak_temp=?, peak_time=? WHERE id=?",
+            (first_time, last_time, samples+len(batch), (last_time-first_time)*0.25, float(peak_temp), peak_time, run_id))
+        db.commit()
+        return len(batch)
+
+    def _merge(self,ident,inc,run_first):
+        (scope,key,run_id,step,date) = ident
+        row = self.db.execute("SELECT stats FROM aggregates WHERE scope=? AND key=?",(scope,key)).fetchone()
+        s = inc
+        if(row):
+            s = merge_stats(numpy.frombuffer(bytes(row[0]),STATS_DTYPE)[0],inc)
+        d = stats_summary(s,run_first)
+        cols = ('scope','key','run_id','step','date') + SUMMARY_COLUMNS + ('stats',)
+        values = [scope,key,run_id,step,date] + [d[k] for k in SUMMARY_COLUMNS] + [sqlite3.Binary(s.tobytes())]
+        self.db.execute("INSERT OR REPLACE INTO aggregates (%s) VALUES (%s)" % (','.join(cols),','.join('?'*len(cols))),values)
+
+    def update_log(self,path):
+        """Merges whatever a log file gained since it was last read (all of it, the first time).
+
+        Returns the number of samples added. A log file is one run; logs that shrank are skipped."""
+        from ovenlogs import load_log
+        source = os.path.abspath(path)
+        st = os.stat(path)
+        row = self.db.execute("SELECT id,size,mtime,samples,first_time FROM runs WHERE source=?",(source,)).fetchone()
+        if(row and row[1] == st.st_size and row[2] == st.st_mtime):
+            return 0
+        batch = load_log(path,cache=False)
+        if(row is None):
+            run_id = self._new_run(log_started(path),source)
+            done = 0
+        else:
+            (run_id,size,mtime,done,first_time) = row
+            if(len(batch) < done):
+                sys.stderr.write("%s: log has fewer samples than its rollup, skipped\n" % (path))
+                return 0
+            if(done and first_time is not None):
+                # CSV logs restart time at 0, while runs fed live keep the controller's time
+                batch = numpy.array(batch)
+                batch['time'] += first_time - int(batch['time'][0])
+        added = self.add(run_id,batch[done:])
+        self.db.execute("UPDATE runs SET size=?, mtime=? WHERE id=?",(st.st_size,st.st_mtime,run_id))
+        self.db.commit()
+        return added
+
+    def aggregates(self,scope='run',since=None,until=None,run_id=None,step=None):
+        """Summary rows (as dicts, oldest first) of one scope's aggregates, without their stats.
+
+        since/until are 'YYYY-MM-DD' dates (until is exclusive)."""
+        where = ["scope = ?"]
+        args = [scope]
+        for (col,op,value) in (('date','>=',since),('date','<',until),('run_id','=',run_id),('step','=',step)):
+            if(value is not None):
+                where.append("%s %s ?" % (col,op))
+                args.append(value)
+        cols = ('key','run_id','step','date') + SUMMARY_COLUMNS
+        cur = self.db.execute("SELECT %s FROM aggregates WHERE %s ORDER BY date, run_id, step" % (','.join(cols),' AND '.join(where)),args)
+        return [dict(zip(cols,row)) for row in cur.fetchall()]
+
+    def runs(self,since=None,until=None):
+        """Rows (as dicts, oldest first) of the runs table."""
+        where = []
+        args = []
+        for (col,op,value) in (('date','>=',since),('date','<',until)):
+            if(value is not None):
+                where.append("%s %s ?" % (col,op))
+                args.append(value)
+        sql = "SELECT * FROM runs"
+        if(where):
+            sql += " WHERE " + " AND ".join(where)
+        cur = self.db.execute(sql+" ORDER BY started",args)
+        names = [d[0] for d in cur.description]
+        return [dict(zip(names,row)) for row in cur.fetchall()]
+
+    def series(self,run_id,resolution=10):
+        """Downsampled series of a run: dict of arrays 'time' (bucket start, seconds after the
+        run's first sample), 'temp_min', 'temp_max', 'temp', 'target' (degrees) and 'duty' (0-1)."""
+        rows = self.db.execute("SELECT data FROM series WHERE run_id=? AND resolution=? ORDER BY id",(run_id,resolution)).fetchall()
+        s = merge_series(numpy.frombuffer(b''.join([bytes(r[0]) for r in rows]),SERIES_DTYPE))
+        n = numpy.maximum(s['n'],1).astype(numpy.float64)
+        return {'time': s['bucket']*float(resolution),
+                'temp_min': s['temp_min']*0.25, 'temp_max': s['temp_max']*0.25,
+                'temp': s['temp_sum']*0.25/n, 'target': s['target_sum']*0.25/n,
+                'duty': s['cmd_sum']/255.0/n}
+
+
+def _fmt(v,spec):
+    return '-' if v is None else spec % (v)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Maintain and query rollups of oven runs.")
+    sub = parser.add_subparsers(dest='command')
+    p = sub.add_parser('update',help="merge new or grown logs into the rollup")
+    p.add_argument('db')
+    p.add_argument('logs',nargs='+',help="log files (or glob patterns)")
+    p = sub.add_parser('show',help="print aggregates")
+    p.add_argument('db')
+    p.add_argument('scope',choices=('run','step','day'))
+    p.add_argument('--since',default=None)
+    p.add_argument('--until',default=None)
+    p.add_argument('--step',type=int,default=None)
+    p = sub.add_parser('series',help="print a run's downsampled series")
+    p.add_argument('db')
+    p.add_argument('run_id',type=int)
+    p.add_argument('--resolution',type=int,default=10,choices=RESOLUTIONS)
+    args = parser.parse_args()
+    if(not args.command):
+        parser.error("a command is required")
+
+    rollup = OvenRollup(args.db)
+    if(args.command == 'update'):
+        for pattern in args.logs:
+            for path in sorted(glob.glob(pattern)) or [pattern]:
+                n = rollup.update_log(path)
+                if(n):
+                    sys.stdout.write("%s: %d samples\n" % (path,n))
+    elif(args.command == 'show'):
+        sys.stdout.write("%-12s %-10s %7s %8s %8s %7s %7s %7s %7s %6s %6s %6s\n" % ('key','date','samples','start','duration',
+            'Tmax','err','err p5','err p95','duty','d p5','d p95'))
+        for r in rollup.aggregates(args.scope,args.since,args.until,step=args.step):
+            sys.stdout.write("%-12s %-10s %7d %8s %8s %7s %7s %7s %7s %6s %6s %6s\n" % (r['key'],r['date'],r['samples'],
+                _fmt(r['start'],'%.1f'),_fmt(r['duration'],'%.1f'),_fmt(r['temp_max'],'%.2f'),_fmt(r['err_mean'],'%.2f'),
+                _fmt(r['err_p5'],'%.2f'),_fmt(r['err_p95'],'%.2f'),_fmt(r['duty_mean'],'%.3f'),
+                _fmt(r['duty_p5'],'%.3f'),_fmt(r['duty_p95'],'%.3f')))
+    else:
+        s = rollup.series(args.run_id,args.resolution)
+        sys.stdout.write("time,temp_min,temp_max,temp,target,duty\n")
+        for row in zip(*[s[k].tolist() for k in ('time','temp_min','temp_max','temp','target','duty')]):
+            sys.stdout.write("%.0f,%.2f,%.2f,%.3f,%.3f,%.4f\n" % row)
+    rollup.close()
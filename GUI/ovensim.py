@@ -0,0 +1,272 @@
+#! /usr/bin/python
+
+'''
+Closed-loop simulation of the oven controller, for tuning PID gains without burning real runs.
+
+Copyright (c) 2011, Daniel Strother < http://danstrother.com/ >
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+  - Redistributions of source code must retain the above copyright notice,
+    this list of conditions and the following disclaimer.
+  - Redistributions in binary form must reproduce the above copyright
+    notice, this list of conditions and the following disclaimer in the
+    documentation and/or other materials provided with the distribution.
+  - The name of the author may not be used to endorse or promote products
+    derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS" AND ANY EXPRESS OR IMPLIED
+WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Usage:  ovensim.py [-j processes] [--profile name] [--plant log | --model K,tau[,L[,ambient]]]
+                   [--kp lo:hi] [--ki lo:hi] [--kd lo:hi] [--top N]
+
+The 4Hz tick of ovencon.c (profile_update, then pid_update, then the SSR
+setting) is reproduced with the firmware's integer arithmetic - shift gains,
+the 10s delayed derivative, the anti-windup rule and int16/int32 wrap-around -
+for a whole array of (k_p,k_i,k_d) candidates at once. The oven itself is a
+first- or second-order plus dead time model, as fitted by ovenident (whichever
+reproduces the log better; a fit worse than --max-rmse is refused, as its
+scores would mean nothing). The gain grid is split across a process pool;
+candidates are ranked by overshoot plus RMS tracking error.
+'''
+
+# depends on python-numpy
+import argparse
+import multiprocessing
+import numpy
+import sys
+import time
+
+from ovenproto import PROFILE_NAMES
+from ovenprofile import profile_trajectory
+
+DT          = 0.25      # tick period (seconds)
+K_DIV       = 8         # k_div in oven_pid.c
+K_DELAY     = 40        # k_delay in oven_pid.c (derivative over 10s)
+PID_PREV0   = 88        # pid_reset() fills the delay line with 22C
+
+# rough figures for a toaster oven, used when no fitted model is given:
+# K (degrees above ambient at full power), tau1, tau2 (seconds), dead time (seconds), ambient
+DEFAULT_MODEL = (250.0, 150.0, 0.0, 10.0, 25.0)
+MAX_PLANT_RMSE = 5.0    # degrees: worse fits of --plant (free-run simulation error) are refused
+
+RESULT_DTYPE = numpy.dtype([
+    ('k_p',         numpy.uint8),
+    ('k_i',         numpy.uint8),
+    ('k_d',         numpy.uint8),
+    ('overshoot',   numpy.float64),     # peak temperature above peak target (degrees)
+    ('rms_error',   numpy.float64),     # RMS of target-temp over the run (degrees)
+    ('max_error',   numpy.float64),     # largest |target-temp| (degrees)
+    ('score',       numpy.float64),     # overshoot + rms_error, lower is better
+])
+
+
+def _wrap(x,bits):
+    """Wraps int64 values to signed integers of the given width (two's complement)."""
+    half = 1 << (bits-1)
+    return ((x + half) & ((half << 1) - 1)) - half
+
+
+class OvenPid():
+    """pid_update() of oven_pid.c for an array of gain sets, evaluated side by side."""
+
+    def __init__(self,k_p,k_i,k_d):
+        """Gains are arrays (or scalars) of shift counts; state as after pid_reset()."""
+        (k_p,k_i,k_d) = numpy.broadcast_arrays(*[numpy.asarray(k,numpy.int64) for k in (k_p,k_i,k_d)])
+        self.k_p = k_p.ravel()
+        self.k_i = k_i.ravel()
+        self.k_d = k_d.ravel()
+        n = len(self.k_p)
+        self.prev = numpy.empty((K_DELAY,n),numpy.int64)
+        self.prev.fill(PID_PREV0)
+        self.prev_index = 0
+        self.pid_int = numpy.zeros(n,numpy.int64)
+        self.error = numpy.zeros(n,numpy.int64)
+        self.derivative = numpy.zeros(n,numpy.int64)
+
+    def _shift(self,x,k):
+        """(int32)x << k, as on the AVR: bits shifted beyond 32 are lost."""
+        return _wrap(numpy.left_shift(x,numpy.minimum(k,32)),32)
+
+    def update(self,temp,target):
+        """One pid_update(temp,target); returns command array (0-255)."""
+        temp = numpy.asarray(temp,numpy.int64) + numpy.zeros_like(self.k_p)
+        self.error = _wrap(target - temp,16)
+        self.derivative = _wrap(self.prev[self.prev_index] - temp,16)
+        self.prev[self.prev_index] = temp
+        self.prev_index = (self.prev_index + 1) % K_DELAY
+
+        command = self._shift(self.error,self.k_p)
+        command = _wrap(command + self._shift(self.pid_int,self.k_i),32)
+        command = _wrap(command + self._shift(self.derivative,self.k_d),32)
+        command >>= K_DIV
+
+        unsaturated = (command >= 0) & (command <= 255)
+        unwinding = ((command > 0) & (self.error < 0)) | ((command < 0) & (self.error > 0))
+        self.pid_int = _wrap(self.pid_int + numpy.where(unsaturated | unwinding,self.error,0),32)
+
+        return numpy.clip(command,0,255)
+
+
+class OvenPlant():
+    """Discrete plus-dead-time thermal model: T[k+1] = a1*T[k] + a2*T[k-1] + b*u[k-d] + c."""
+
+    def __init__(self,K,tau1,tau2=0.0,dead_time=0.0,ambient=25.0):
+        """Model parameters as reported by ovenident (tau2 of 0 or nan: first order)."""
+        p1 = numpy.exp(-DT/tau1)
+        if(tau2 and tau2 == tau2):
+            p2 = numpy.exp(-DT/tau2)
+        else:
+            p2 = 0.0
+        self.a = (p1+p2, -p1*p2)
+        gain = (1.0-p1)*(1.0-p2)
+        self.b = K*gain
+        self.c = ambient*gain
+        self.d = int(round(dead_time/DT))
+        self.ambient = ambient
+
+    def simulate(self,pid,target,start=None):
+        """Closes the loop between plant and pid (an OvenPid) over a target trajectory.
+
+        Heater power goes through ssr_set()'s 25 levels. Returns (temp, cmd) arrays of
+        shape (ticks, candidates), temp in 0.25C units as read by the thermocouple."""
+        n = len(pid.k_p)
+        ticks = len(target)
+        if(start is None):
+            start = self.ambient
+        (a1,a2) = self.a
+        T = numpy.empty(n)
+        T.fill(start)
+        T_prev = T.copy()
+        duty = numpy.zeros((self.d+1,n))    # ring of heater duties, oldest applied next
+        temps = numpy.empty((ticks,n),numpy.int16)
+        cmds = numpy.empty((ticks,n),numpy.uint8)
+        for k in range(ticks):
+            temp = numpy.floor(T*4).astype(numpy.int64)
+            cmd = pid.update(temp,int(target[k]))
+            temps[k] = temp
+            cmds[k] = cmd
+            duty[k % (self.d+1)] = (cmd*24 // 255) / 24.0
+            u = duty[(k+1) % (self.d+1)]
+            (T,T_prev) = (a1*T + a2*T_prev + self.b*u + self.c, T)
+        return (temps,cmds)
+
+
+def evaluate(temps,target):
+    """Tracking metrics (overshoot, rms_error, max_error; degrees) per candidate."""
+    err = (target[:,None] - temps.astype(numpy.int64)) * 0.25
+    overshoot = numpy.maximum(temps.max(axis=0)*0.25 - target.max()*0.25,0.0)
+    return (overshoot, numpy.sqrt((err**2).mean(axis=0)), numpy.abs(err).max(axis=0))
+
+
+def simulate_gains(gains,profile=0,model=DEFAULT_MODEL):
+    """Simulates one profile run for every (k_p,k_i,k_d) row of gains; returns RESULT_DTYPE array."""
+    gains = numpy.asarray(gains,numpy.int64).reshape(-1,3)
+    target = profile_trajectory(profile)['target']
+    pid = OvenPid(gains[:,0],gains[:,1],gains[:,2])
+    (temps,cmds) = OvenPlant(*model).simulate(pid,target)
+
+    results = numpy.zeros(len(gains),RESULT_DTYPE)
+    results['k_p'] = gains[:,0]
+    results['k_i'] = gains[:,1]
+    results['k_d'] = gains[:,2]
+    (results['overshoot'],results['rms_error'],results['max_error']) = evaluate(temps,target)
+    results['score'] = results['overshoot'] + results['rms_error']
+    return results
+
+
+def _simulate_chunk(args):
+    """Pool worker - simulates one chunk of the gain grid."""
+    return simulate_gains(*args)
+
+
+def gain_grid(k_p,k_i,k_d):
+    """All combinations of the given k_p, k_i and k_d values, as an (n,3) array."""
+    grid = numpy.meshgrid(k_p,k_i,k_d,indexing='ij')
+    return numpy.stack([g.ravel() for g in grid],axis=1)
+
+
+def sweep(gains,profile=0,model=DEFAULT_MODEL,processes=None,chunk=None):
+    """Simulates all gain sets across a process pool; returns results sorted by score (best first).
+
+    By default the grid is cut into two chunks per worker - larger chunks amortize
+    the per-tick overhead better than many small ones."""
+    gains = numpy.asarray(gains,numpy.int64).reshape(-1,3)
+    if(chunk is None):
+        chunk = max(1024,-(-len(gains) // (2*(processes or multiprocessing.cpu_count()))))
+    chunks = [(gains[i:i+chunk],profile,model) for i in range(0,len(gains),chunk)]
+    if(processes == 1 or len(chunks) == 1):
+        results = [_simulate_chunk(c) for c in chunks]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_simulate_chunk,chunks)
+        finally:
+            pool.close()
+            pool.join()
+    results = numpy.concatenate(results)
+    return results[numpy.argsort(results['score'],kind='mergesort')]
+
+
+def _range(text):
+    """Parses 'lo:hi' (inclusive) or a single value into a list of shift counts."""
+    if(':' in text):
+        (lo,hi) = text.split(':')
+        return list(range(int(lo),int(hi)+1))
+    return [int(text)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Simulate the oven controller over a grid of PID gains.")
+    parser.add_argument('-j',type=int,default=None,help="worker processes (default: one per CPU)")
+    parser.add_argument('--profile',default=PROFILE_NAMES[0],choices=PROFILE_NAMES)
+    parser.add_argument('--plant',default=None,help="identify the plant model from this log (see ovenident)")
+    parser.add_argument('--max-rmse',type=float,default=MAX_PLANT_RMSE,
+                        help="largest simulation error (degrees) of a --plant fit that is used (default %.1f)" % (MAX_PLANT_RMSE))
+    parser.add_argument('--model',default=None,help="plant model K,tau1[,tau2[,dead_time[,ambient]]]")
+    parser.add_argument('--kp',default='0:24',help="k_p range lo:hi (default 0:24)")
+    parser.add_argument('--ki',default='0:24',help="k_i range lo:hi (default 0:24)")
+    parser.add_argument('--kd',default='0:24',help="k_d range lo:hi (default 0:24)")
+    parser.add_argument('--top',type=int,default=20,help="number of results printed")
+    args = parser.parse_args()
+
+    model = DEFAULT_MODEL
+    if(args.model):
+        values = [float(v) for v in args.model.split(',')]
+        model = tuple(values + list(DEFAULT_MODEL[len(values):]))
+    elif(args.plant):
+        from ovenident import identify
+        from ovenlogs import load_log
+        fits = [r for r in identify(load_log(args.plant)) if r['rmse'] == r['rmse']]
+        if(not fits):
+            sys.stderr.write("%s: no plant model could be fitted\n" % (args.plant))
+            sys.exit(1)
+        r = min(fits,key=lambda r: r['rmse'])
+        if(r['rmse'] > args.max_rmse):
+            sys.stderr.write("%s: best plant model (%s) misses the log by %.2fC RMS, more than --max-rmse %.2fC; "
+                             "refusing to score gains against it\n" % (args.plant,r['model'],r['rmse'],args.max_rmse))
+            sys.exit(1)
+        sys.stderr.write("plant: %s fit, %.2fC RMS from the log\n" % (r['model'],r['rmse']))
+        model = (r['K'],r['tau1'],r['tau2'],r['dead_time'],r['ambient'])
+    (K,tau1,tau2,dead_time,ambient) = model
+    sys.stderr.write("plant: K=%.1f tau1=%.1fs tau2=%s dead time=%.2fs ambient=%.1fC\n" % (K,tau1,
+                     (tau2 and tau2 == tau2) and '%.1fs' % (tau2) or '-',dead_time,ambient))
+
+    gains = gain_grid(_range(args.kp),_range(args.ki),_range(args.kd))
+    start = time.time()
+    results = sweep(gains,PROFILE_NAMES.index(args.profile),model,args.j)
+    sys.stderr.write("simulated %d gain sets in %.2fs\n" % (len(results),time.time()-start))
+
+    sys.stdout.write("k_p,k_i,k_d,overshoot,rms_error,max_error,score\n")
+    for r in results[:args.top].tolist():
+        sys.stdout.write("%d,%d,%d,%.2f,%.2f,%.2f,%.2f\n" % r)
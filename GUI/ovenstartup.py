@@ -0,0 +1,123 @@
+#! /usr/bin/python
+
+'''
+Startup benchmark - how long until the GUI is usable.
+
+Copyright (c) 2011, Daniel Strother < http://danstrother.com/ >
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+  - Redistributions of source code must retain the above copyright notice,
+    this list of conditions and the following disclaimer.
+  - Redistributions in binary form must reproduce the above copyright
+    notice, this list of conditions and the following disclaimer in the
+    documentation and/or other materials provided with the distribution.
+  - The name of the author may not be used to endorse or promote products
+    derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS" AND ANY EXPRESS OR IMPLIED
+WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Usage:  ovenstartup.py [-n runs] [--imports-only] log [...]
+
+Replays the logs through a pseudo-terminal (see ovenreplay) and starts
+"ovencon.py --startup-time" on it n times, reporting (min/median/max, in
+seconds from process launch) when ovencon's module started executing, when its
+window was created, first painted, and first received a sample. The import
+time of each GUI module on its own (in a fresh interpreter) is reported as
+well; --imports-only skips the GUI runs (and needs no logs or display).
+'''
+
+# depends on python-numpy
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+MODULES = ('ovenproto','ovenio','ovenlogs','ovend','ovencon','ovenplot')
+EVENTS = ('module','window','paint','sample')
+
+
+def median(values):
+    v = sorted(values)
+    return v[len(v)//2]
+
+
+def import_time(module,runs):
+    """Wall-clock seconds for a fresh interpreter to import module (minus a bare interpreter start); None if it fails."""
+    def launch(code):
+        t0 = time.time()
+        p = subprocess.Popen([sys.executable,'-c',code],cwd=HERE,stdout=subprocess.PIPE,stderr=subprocess.PIPE)
+        p.communicate()
+        return (time.time()-t0,p.returncode)
+    base = median([launch('pass')[0] for i in range(runs)])
+    times = []
+    for i in range(runs):
+        (t,rc) = launch('import %s' % (module))
+        if(rc != 0):
+            return None
+        times.append(t-base)
+    return times
+
+
+def gui_startup(port,runs):
+    """Times of each EVENTS entry, per run, relative to launching ovencon."""
+    results = []
+    for i in range(runs):
+        t0 = time.time()
+        p = subprocess.Popen([sys.executable,os.path.join(HERE,'ovencon.py'),'--startup-time',port],
+                             cwd=HERE,stdout=subprocess.PIPE)
+        (out,err) = p.communicate()
+        for line in out.decode('ascii','replace').splitlines():
+            if(line.startswith('startup: ')):
+                times = dict([(k,float(v)-t0) for (k,v) in [f.split('=') for f in line[9:].split()]])
+                results.append(times)
+    return results
+
+
+def report(name,values):
+    if(not values):
+        sys.stdout.write("%-16s %8s\n" % (name,'-'))
+    else:
+        sys.stdout.write("%-16s %8.3f %8.3f %8.3f\n" % (name,min(values),median(values),max(values)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure oven GUI startup latency.")
+    parser.add_argument('-n',type=int,default=5,help="runs per measurement")
+    parser.add_argument('--imports-only',action='store_true')
+    parser.add_argument('logs',nargs='*')
+    args = parser.parse_args()
+
+    sys.stdout.write("%-16s %8s %8s %8s\n" % ('','min','median','max'))
+    for m in MODULES:
+        report('import '+m,import_time(m,args.n))
+
+    if(args.imports_only):
+        sys.exit(0)
+    if(not args.logs):
+        parser.error("logs to replay are required for the GUI measurement")
+
+    from ovenlogs import load_log
+    from ovenreplay import OvenReplay
+    replay = OvenReplay([load_log(path) for path in args.logs],1.0,True)
+    t = threading.Thread(target=replay.run)
+    t.daemon = True
+    t.start()
+
+    results = gui_startup(replay.path,args.n)
+    for e in EVENTS:
+        report(e,[r[e] for r in results if e in r])
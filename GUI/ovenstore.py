@@ -0,0 +1,267 @@
+#! /usr/bin/python
+
+'''
+Indexed session store for oven runs - one SQLite database instead of one CSV file per run.
+
+Copyright (c) 2011, Daniel Strother < http://danstrother.com/ >
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+  - Redistributions of source code must retain the above copyright notice,
+    this list of conditions and the following disclaimer.
+  - Redistributions in binary form must reproduce the above copyright
+    notice, this list of conditions and the following disclaimer in the
+    documentation and/or other materials provided with the distribution.
+  - The name of the author may not be used to endorse or promote products
+    derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS" AND ANY EXPRESS OR IMPLIED
+WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Each run has one summary row (start time, profile, PID coefficients, peak
+temperature, duration, ...) in the indexed 'runs' table (a profile not given
+is recognized from the run's first samples, see ovenprofile.locate), so that queries over
+runs never touch sample data. Samples are kept in 'blocks' as delta-encoded
+blobs (see ovenbinlog).
+'''
+
+# depends on python-numpy
+import numpy
+import os
+import re
+import sqlite3
+import sys
+import time
+
+from ovenproto import MSG_DTYPE, EMPTY_BATCH, PROFILE_NAMES, ST_RUN, unwrap_time
+from ovenbinlog import encode_block, decode_block
+from ovenprofile import LOCATE_SAMPLES, locate
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id          INTEGER PRIMARY KEY,
+    started     REAL NOT NULL,      -- unix time of first sample
+    date        TEXT NOT NULL,      -- local date of first sample (YYYY-MM-DD)
+    profile     TEXT,               -- PROFILE_NAMES entry, NULL if unknown
+    k_p         INTEGER,
+    k_i         INTEGER,
+    k_d         INTEGER,
+    source      TEXT,               -- port or imported file name
+    first_time  INTEGER,            -- controller time of first sample (0.25s ticks)
+    samples     INTEGER NOT NULL DEFAULT 0,
+    duration    REAL,               -- seconds
+    peak_temp   REAL,               -- degrees celsius
+    peak_time   REAL                -- seconds after first sample
+);
+CREATE INDEX IF NOT EXISTS runs_date ON runs (date);
+CREATE INDEX IF NOT EXISTS runs_started ON runs (started);
+CREATE INDEX IF NOT EXISTS runs_profile ON runs (profile, started);
+CREATE TABLE IF NOT EXISTS blocks (
+    run_id      INTEGER NOT NULL REFERENCES runs(id),
+    seq         INTEGER NOT NULL,
+    data        BLOB NOT NULL,
+    PRIMARY KEY (run_id, seq)
+);
+"""
+
+
+class OvenStoreRun():
+    """Writer for the samples of one run in an OvenStore; used like a log file (write/close)."""
+
+    def __init__(self,store,run_id,block_size,profile=None):
+        """Use OvenStore.begin_run() to create."""
+        self.store = store
+        self.run_id = run_id
+        self.block_size = block_size
+        self.profile = profile
+        self.head = []          # first run-state samples, to recognize the profile by
+        self.nhead = 0
+        self.pending = []
+        self.npending = 0
+        self.seq = 0
+        self.samples = 0
+        self.first_time = None
+        self.last_time = None
+        self.peak_temp = None
+        self.peak_time = None
+
+    def write(self,batch):
+        """Appends a batch of samples, keeping the run summary up to date."""
+        if(not len(batch)):
+            return
+        times = unwrap_time(batch['time'],self.last_time)     # the controller's time wraps at 2**16
+        if(self.first_time is None):
+            self.first_time = int(times[0])
+        self.last_time = int(times[-1])
+        self.samples += len(batch)
+        if(self.profile is None and self.nhead < LOCATE_SAMPLES):
+            run = (batch['state'] == ST_RUN)
+            head = numpy.array(batch[run][:LOCATE_SAMPLES-self.nhead],MSG_DTYPE)
+            if(len(head)):
+                head['time'] = times[run][:len(head)]
+                self.head.append(head)
+                self.nhead += len(head)
+
+        i = numpy.argmax(batch['temp'])
+        if(self.peak_temp is None or batch['temp'][i] > self.peak_temp):
+            self.peak_temp = int(batch['temp'][i])
+            self.peak_time = int(times[i])
+
+        self.pending.append(numpy.array(batch,MSG_DTYPE))
+        self.npending += len(batch)
+        if(self.npending >= self.block_size):
+            self.flush()
+
+    def flush(self):
+        """Writes buffered samples and the current summary to the store."""
+        db = self.store.db
+        if(self.npending):
+            samples = numpy.concatenate(self.pending)
+            self.pending = []
+            self.npending = 0
+            rows = []
+            for i in range(0,len(samples),self.block_size):
+                rows.append((self.run_id,self.seq,sqlite3.Binary(encode_block(samples[i:i+self.block_size]))))
+                self.seq += 1
+            db.executemany("INSERT INTO blocks (run_id,seq,data) VALUES (?,?,?)",rows)
+
+        if(self.first_time is not None):
+            db.execute("UPDATE runs SET first_time=?, samples=?, duration=?, peak_temp=?, peak_time=? WHERE id=?",
+                (self.first_time, self.samples, (self.last_time-self.first_time)*0.25,
+                 self.peak_temp*0.25, (self.peak_time-self.first_time)*0.25, self.run_id))
+        db.commit()
+
+    def close(self):
+        """Writes remaining samples and final summary, with the profile the run followed if it was not given."""
+        if(self.profile is None and self.head):
+            found = locate(numpy.concatenate(self.head))
+            self.head = []
+            if(found):
+                self.profile = PROFILE_NAMES[found[0]]
+                self.store.db.execute("UPDATE runs SET profile=? WHERE id=?",(self.profile,self.run_id))
+        self.flush()
+
+
+class OvenStore():
+    """Session store holding runs, their samples and per-run summaries in one SQLite file."""
+
+    def __init__(self,path='ovenlog.db'):
+        """Opens (creating, if necessary) the store."""
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        """Closes the store."""
+        if(self.db):
+            self.db.close()
+            self.db = None
+
+    def begin_run(self,started=None,profile=None,coefs=None,source=None,block_size=240):
+        """Adds a new run; returns an OvenStoreRun used to write its samples.
+
+        profile is a PROFILE_NAMES entry (or its index; None: recognized when the run is
+        closed), coefs a (k_p,k_i,k_d) tuple."""
+        if(started is None):
+            started = time.time()
+        if(isinstance(profile,int)):
+            profile = PROFILE_NAMES[profile]
+        (k_p,k_i,k_d) = coefs or (None,None,None)
+        cur = self.db.execute("INSERT INTO runs (started,date,profile,k_p,k_i,k_d,source) VALUES (?,?,?,?,?,?,?)",
+            (started, time.strftime('%Y-%m-%d',time.localtime(started)), profile, k_p, k_i, k_d, source))
+        self.db.commit()
+        return OvenStoreRun(self,cur.lastrowid,block_size,profile)
+
+    def find_runs(self,profile=None,since=None,until=None,min_peak=None,max_peak=None,min_duration=None):
+        """Returns summary rows (as dicts, oldest first) of runs matching all given criteria.
+
+        since/until are 'YYYY-MM-DD' dates (compared with the date column) or unix times
+        (until is exclusive). Only the runs table and its indexes are consulted."""
+        where = []
+        args = []
+        if(profile is not None):
+            if(isinstance(profile,int)):
+                profile = PROFILE_NAMES[profile]
+            where.append("profile = ?")
+            args.append(profile)
+        for (op,value) in (('>=',since),('<',until)):
+            if(value is None):
+                continue
+            col = isinstance(value,str) and 'date' or 'started'
+            where.append("%s %s ?" % (col,op))
+            args.append(value)
+        for (col,op,value) in (('peak_temp','>',min_peak),('peak_temp','<',max_peak),('duration','>=',min_duration)):
+            if(value is not None):
+                where.append("%s %s ?" % (col,op))
+                args.append(value)
+
+        sql = "SELECT * FROM runs"
+        if(where):
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY started"
+        cur = self.db.execute(sql,args)
+        names = [d[0] for d in cur.description]
+        return [dict(zip(names,row)) for row in cur.fetchall()]
+
+    def run_samples(self,run_id):
+        """Returns all samples of a run as a MSG_DTYPE batch."""
+        blocks = [decode_block(bytes(data)) for (data,) in
+            self.db.execute("SELECT data FROM blocks WHERE run_id=? ORDER BY seq",(run_id,))]
+        if(not blocks):
+            return EMPTY_BATCH
+        return numpy.concatenate(blocks)
+
+    def delete_run(self,run_id):
+        """Removes a run and its samples."""
+        self.db.execute("DELETE FROM blocks WHERE run_id=?",(run_id,))
+        self.db.execute("DELETE FROM runs WHERE id=?",(run_id,))
+        self.db.commit()
+
+    def import_log(self,path,profile=None,coefs=None):
+        """Imports a log file (any format ovenlogs can read) as one run; returns its run id.
+
+        The run's start time is taken from an ovenlog_YYYYmmddHHMMSS name, else from the file's mtime."""
+        from ovenlogs import load_log
+        batch = load_log(path,cache=False)
+        m = re.search(r'(\d{14})',os.path.basename(path))
+        if(m):
+            started = time.mktime(time.strptime(m.group(1),'%Y%m%d%H%M%S'))
+        else:
+            started = os.path.getmtime(path)
+        run = self.begin_run(started,profile,coefs,source=os.path.basename(path))
+        run.write(batch)
+        run.close()
+        return run.run_id
+
+
+if __name__ == '__main__':
+    # ovenstore.py import <store.db> <log files...>
+    # ovenstore.py runs <store.db> [profile] [since] [min_peak]
+    if(len(sys.argv) < 3 or sys.argv[1] not in ('import','runs')):
+        sys.stderr.write("usage: %s import store.db logs...\n"
+                         "       %s runs store.db [profile|-] [since YYYY-MM-DD|-] [min_peak|-]\n" % (sys.argv[0],sys.argv[0]))
+        sys.exit(1)
+    store = OvenStore(sys.argv[2])
+    if(sys.argv[1] == 'import'):
+        for path in sys.argv[3:]:
+            sys.stdout.write("%s -> run %d\n" % (path,store.import_log(path)))
+    else:
+        args = [(a != '-' and a or None) for a in sys.argv[3:6]]
+        args += [None]*(3-len(args))
+        (profile,since,min_peak) = args
+        if(min_peak is not None):
+            min_peak = float(min_peak)
+        for r in store.find_runs(profile=profile,since=since,min_peak=min_peak):
+            sys.stdout.write("%4d  %s  %-9s  peak %6.2fC  %7.1fs  %s\n" % (r['id'],
+                time.strftime('%Y-%m-%d %H:%M',time.localtime(r['started'])), r['profile'] or '-',
+                r['peak_temp'] or 0.0, r['duration'] or 0.0, r['source'] or ''))
+    store.close()
@@ -0,0 +1,270 @@
+#! /usr/bin/python
+
+'''
+Multi-oven supervisor - monitors a line of oven controllers from one process.
+
+Copyright (c) 2011, Daniel Strother < http://danstrother.com/ >
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+  - Redistributions of source code must retain the above copyright notice,
+    this list of conditions and the following disclaimer.
+  - Redistributions in binary form must reproduce the above copyright
+    notice, this list of conditions and the following disclaimer in the
+    documentation and/or other materials provided with the distribution.
+  - The name of the author may not be used to endorse or promote products
+    derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS" AND ANY EXPRESS OR IMPLIED
+WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Usage:  ovensuper.py [--binlog|--store] [--rollup] [--publish address] [name=]port [[name=]port ...]
+
+Every port (serial device or tcp:host:port) is serviced by the one shared I/O
+loop (see ovenio) and logged separately: to name_ovenlog_*.csv/.ovl files, or
+with --store to ovenlog_name.db (and with --rollup, summarized in
+ovenrollup_name.db, see ovenrollup). The dashboard shows a compact tile per oven;
+double-click a tile for its plots and controls. Detail windows are only built
+while open, so an oven costs a tile and a few minutes of samples otherwise.
+With --publish, the samples of all ovens are served to subscribers (see ovenpub),
+one channel per oven.
+'''
+
+# depends on python-qt4, python-serial, python-numpy (python-qwt5-qt4 for detail plots)
+from PyQt4 import QtGui, QtCore
+import math
+import numpy
+import os
+import serial
+import socket
+import sys
+
+from ovencon import OvenComm, OvenLogger, OvenControls, OvenLazy
+from ovenhist import OvenRecent
+from ovenproto import STATE_NAMES, ST_FAULT, ST_RUN, ST_MANUAL
+
+TILE_SECONDS    = 600       # history kept (and drawn) by each tile
+TILE_FPS        = 2         # dashboard repaint rate
+
+
+class OvenTile(QtGui.QWidget):
+    """Compact view of one oven: state, temperatures and a sparkline of the last TILE_SECONDS.
+
+    Painted directly (no child widgets), and only by the dashboard timer, so that
+    a tile costs the same however fast its oven reports."""
+
+    opened = QtCore.pyqtSignal('PyQt_PyObject')
+
+    def __init__(self,name,comm,parent=None):
+        """Creates tile for comm (None if its port could not be opened)."""
+        super(OvenTile,self).__init__(parent)
+        self.name = name
+        self.comm = comm
+        self.error = None
+        self.recent = OvenRecent(TILE_SECONDS*4)    # latest samples of the current run
+        self.dirty = True
+        self.setMinimumSize(180,110)
+        if(comm):
+            comm.newBatch.connect(self.newBatch_handler)
+
+    def newBatch_handler(self,batch):
+        """Callback for newBatch signals - keeps the latest samples of the current run."""
+        self.recent.add(batch)
+        self.dirty = True
+
+    def mouseDoubleClickEvent(self,ev):
+        if(self.comm):
+            self.opened.emit(self)
+
+    def paintEvent(self,ev):
+        p = QtGui.QPainter(self)
+        r = self.rect().adjusted(1,1,-2,-2)
+        p.setPen(QtCore.Qt.darkGray)
+        p.drawRect(r)
+        p.setPen(QtCore.Qt.black)
+        p.drawText(r.adjusted(4,2,-4,0),QtCore.Qt.AlignLeft|QtCore.Qt.AlignTop,self.name)
+
+        if(self.error):
+            p.setPen(QtCore.Qt.red)
+            p.drawText(r,QtCore.Qt.AlignCenter|QtCore.Qt.TextWordWrap,self.error)
+            return
+        if(not len(self.recent)):
+            p.drawText(r,QtCore.Qt.AlignCenter,"no data")
+            return
+
+        last = self.recent.prev
+        state = int(last['state'])
+        color = {ST_FAULT: QtCore.Qt.red, ST_RUN: QtCore.Qt.darkGreen, ST_MANUAL: QtCore.Qt.blue}.get(state,QtCore.Qt.black)
+        p.setPen(color)
+        p.drawText(r.adjusted(4,2,-4,0),QtCore.Qt.AlignRight|QtCore.Qt.AlignTop,STATE_NAMES[state])
+        font = p.font()
+        font.setPointSize(max(font.pointSize(),8)*2)
+        p.setFont(font)
+        p.setPen(QtCore.Qt.black)
+        p.drawText(r.adjusted(4,18,-4,0),QtCore.Qt.AlignLeft|QtCore.Qt.AlignTop,
+                   "%.1f (%.0f)" % (last['temp']*0.25,last['target']*0.25))
+
+        # sparkline: one point per pixel column, temperature (red) over target (gray)
+        spark = r.adjusted(4,r.height()//2,-4,-4)
+        data = self.recent.samples()
+        idx = numpy.linspace(0,len(data)-1,min(len(data),max(2,spark.width()))).astype(int)
+        temp = data['temp'][idx]*0.25
+        target = data['target'][idx]*0.25
+        lo = min(temp.min(),target.min())
+        hi = max(temp.max(),target.max(),lo+10.0)
+        xs = spark.left() + numpy.arange(len(idx))*(spark.width()/float(max(1,len(idx)-1)))
+        for (values,pen) in ((target,QtCore.Qt.gray),(temp,QtCore.Qt.red)):
+            ys = spark.bottom() - (values-lo)*(spark.height()/(hi-lo))
+            p.setPen(pen)
+            p.drawPolyline(QtGui.QPolygonF([QtCore.QPointF(x,y) for (x,y) in zip(xs.tolist(),ys.tolist())]))
+
+
+class OvenDetail(QtGui.QWidget):
+    """Plots and controls of one oven, in a window of its own."""
+
+    def __init__(self,tile):
+        """Creates window, starting the plots with the samples tile has kept."""
+        super(OvenDetail,self).__init__()
+        self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+        self.setWindowTitle('Reflow Oven - %s' % (tile.name))
+        self.resize(1000,600)
+
+        def build(parent):
+            from ovenplot import OvenPlots
+            plots = OvenPlots(tile.comm,parent=parent)
+            recent = tile.recent.samples()
+            if(len(recent)):
+                plots.temps.newBatch_handler(recent)
+                plots.commands.newBatch_handler(recent)
+            return plots
+        self.plots = OvenLazy(build,parent=self)
+        self.controls = OvenControls(tile.comm,parent=self)
+
+        l = QtGui.QHBoxLayout()
+        l.addWidget(self.plots)
+        l.addWidget(self.controls)
+        self.setLayout(l)
+
+
+class OvenSupervisor(QtGui.QMainWindow):
+    """Dashboard of all supervised ovens."""
+
+    def __init__(self,ports,log_format='csv',publish=None,rollup=False):
+        """Opens every (name,port) and sets up its logger and tile; publish is an address to serve samples on,
+        rollup enables run rollups."""
+
+        super(OvenSupervisor,self).__init__()
+        self.setWindowTitle('Reflow Oven Supervisor')
+
+        self.comms = {}
+        self.loggers = {}
+        self.tiles = []
+        self.details = {}
+        self.publisher = None
+        if(publish):
+            from ovenpub import OvenPublisher
+            from ovenio import shared_loop
+            self.publisher = OvenPublisher(shared_loop(),publish,[name for (name,port) in ports])
+
+        grid = QtGui.QGridLayout()
+        columns = int(math.ceil(math.sqrt(len(ports))))
+        for (i,(name,port)) in enumerate(ports):
+            comm = None
+            error = None
+            try:
+                comm = OvenComm(parent=self,port=port)
+            except (serial.SerialException,socket.error) as e:
+                error = "failed to open %s - %s" % (port,e)
+            if(comm):
+                self.comms[name] = comm
+                comm.publisher = self.publisher
+                comm.channel = i
+                self.loggers[name] = OvenLogger(comm,fmt=log_format,store='ovenlog_%s.db' % (name),prefix=name+'_',
+                                                rollup=rollup and 'ovenrollup_%s.db' % (name) or None)
+                comm.commandFailed.connect(lambda msg,name=name: self.statusBar().showMessage(
+                    "%s: command failed - %s" % (name,msg),5000))
+            tile = OvenTile(name,comm,parent=self)
+            tile.error = error
+            tile.opened.connect(self.open_detail)
+            self.tiles.append(tile)
+            grid.addWidget(tile,i//columns,i%columns)
+
+        w = QtGui.QWidget(self)
+        w.setLayout(grid)
+        self.setCentralWidget(w)
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.repaint_tiles)
+        self.timer.start(1000//TILE_FPS)
+
+    def repaint_tiles(self):
+        """Repaints tiles that received samples since the last call."""
+        for tile in self.tiles:
+            if(tile.dirty):
+                tile.dirty = False
+                tile.update()
+
+    def open_detail(self,tile):
+        """Shows (creating if necessary) the detail window of tile's oven."""
+        detail = self.details.get(tile.name)
+        if(detail is None):
+            detail = OvenDetail(tile)
+            detail.destroyed.connect(lambda obj=None,name=tile.name: self.details.pop(name,None))
+            self.details[tile.name] = detail
+        detail.show()
+        detail.raise_()
+
+    def closeEvent(self,ev):
+        for detail in list(self.details.values()):
+            detail.close()
+        ev.accept()
+
+
+def parse_ports(args):
+    """Turns [name=]port arguments into (name,port) pairs; names default to the port's base name."""
+    ports = []
+    for a in args:
+        if('=' in a):
+            (name,port) = a.split('=',1)
+        else:
+            port = a
+            name = os.path.basename(port.rstrip('/')).replace(':','_')
+        ports.append((name,port))
+    return ports
+
+
+if __name__ == '__main__':
+    app = QtGui.QApplication(sys.argv)
+    args = sys.argv[1:]
+    log_format = 'csv'
+    if('--binlog' in args):
+        args.remove('--binlog')
+        log_format = 'bin'
+    if('--store' in args):
+        args.remove('--store')
+        log_format = 'store'
+    rollup = False
+    if('--rollup' in args):
+        args.remove('--rollup')
+        rollup = True
+    publish = None
+    if('--publish' in args):
+        i = args.index('--publish')
+        publish = args[i+1]
+        del args[i:i+2]
+    if(not args):
+        sys.stderr.write("usage: %s [--binlog|--store] [--rollup] [--publish address] [name=]port [[name=]port ...]\n" % (sys.argv[0]))
+        sys.exit(1)
+
+    sup = OvenSupervisor(parse_ports(args),log_format,publish,rollup)
+    sup.show()
+    sys.exit(app.exec_())
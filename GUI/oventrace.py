@@ -0,0 +1,208 @@
+'''
+Latency tracing of the inbound telemetry pipeline (serial read to replot).
+
+Copyright (c) 2011, Daniel Strother < http://danstrother.com/ >
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+  - Redistributions of source code must retain the above copyright notice,
+    this list of conditions and the following disclaimer.
+  - Redistributions in binary form must reproduce the above copyright
+    notice, this list of conditions and the following disclaimer in the
+    documentation and/or other materials provided with the distribution.
+  - The name of the author may not be used to endorse or promote products
+    derived from this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE AUTHOR "AS IS" AND ANY EXPRESS OR IMPLIED
+WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF
+MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO
+EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED
+TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+Each batch is followed through the stages of the GUI's pipeline:
+
+  decode    data_received() of the port's protocol: bytes to MSG_DTYPE batch (I/O thread)
+  signal    queued newBatch signal: emitted in the I/O thread, delivered in the GUI thread
+  log       OvenLogger.log_batch()
+  plot      OvenPlot.newBatch_handler() (each plot)
+  frame     batch handled until the render scheduler's next frame starts
+  render    one frame of the render scheduler (all dirty plots replotted)
+  total     bytes received until the frame showing them is drawn
+
+Durations go into log-scale histograms (two buckets per octave, from 1us), so
+recording costs a few dictionary and list operations. Gauges keep the current
+and peak values of queue depths. The global tracer is disabled by default;
+every hook then costs one attribute test.
+'''
+
+# Qt-free
+import collections
+import json
+import math
+import threading
+import time
+
+clock = getattr(time,'monotonic',time.time)    # Python 2 has no monotonic clock
+
+STAGES = ('decode','signal','log','plot','frame','render','total')
+BUCKETS = 64                # 1us * 2**(k/2): up to about 35 minutes
+MAX_TRACKED = 256           # batches followed at once (older ones are forgotten)
+
+
+class OvenHistogram():
+    """Log-scale histogram of durations (seconds)."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = [0]*BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self,seconds):
+        us = seconds*1e6
+        k = 0
+        if(us > 1.0):
+            k = min(BUCKETS-1,int(2*math.log(us,2)))
+        self.counts[k] += 1
+        self.count += 1
+        self.total += seconds
+        if(seconds > self.max):
+            self.max = seconds
+
+    def percentile(self,p):
+        """Upper bound (seconds) of the bucket holding the p-th percentile."""
+        if(not self.count):
+            return 0.0
+        need = p/100.0*self.count
+        seen = 0
+        for (k,n) in enumerate(self.counts):
+            seen += n
+            if(seen >= need and n):
+                return min(self.max,2**((k+1)/2.0)*1e-6)
+        return self.max
+
+    def summary(self):
+        """dict of count, mean, p50, p90, p99 and max (seconds)."""
+        return {'count': self.count, 'mean': self.count and self.total/self.count or 0.0,
+                'p50': self.percentile(50), 'p90': self.percentile(90), 'p99': self.percentile(99),
+                'max': self.max}
+
+
+class OvenTracer():
+    """Per-stage latency histograms and queue depth gauges of the telemetry pipeline."""
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.reset()
+
+    def enable(self,on=True):
+        self.enabled = on
+
+    def reset(self):
+        """Clears all histograms and gauges."""
+        with self.lock:
+            self.stages = dict([(s,OvenHistogram()) for s in STAGES])
+            self.gauges = {}                            # name -> [current, peak]
+            self.batches = collections.OrderedDict()    # id(batch) -> [received, emitted, delivered, plotted]
+            self.unrendered = set()                     # ids of plotted batches awaiting a frame
+            self.queued = 0                             # batches emitted, but not yet delivered
+            self.started = time.time()
+
+    def gauge(self,name,value):
+        """Sets a queue depth (or other level)."""
+        g = self.gauges.get(name)
+        if(g is None):
+            self.gauges[name] = [value,value]
+        else:
+            g[0] = value
+            if(value > g[1]):
+                g[1] = value
+
+    def received(self,batch,t_read,nbytes):
+        """batch was decoded from nbytes of data that arrived at t_read (clock()), and is about to be emitted."""
+        now = clock()
+        self.stages['decode'].add(now-t_read)
+        with self.lock:
+            self.gauge('bytes per read',nbytes)
+            self.gauge('samples per batch',len(batch))
+            self.batches[id(batch)] = [t_read,now,None,None]
+            self.queued += 1
+            while(len(self.batches) > MAX_TRACKED):
+                (k,b) = self.batches.popitem(last=False)
+                if(b[2] is None):
+                    self.queued -= 1
+            self.gauge('signal queue',self.queued)
+
+    def handled(self,batch,stage,t_start):
+        """A GUI-thread handler of batch (stage 'log' or 'plot') that started at t_start has finished."""
+        now = clock()
+        with self.lock:
+            b = self.batches.get(id(batch))
+            if(b is None):
+                return
+            if(b[2] is None):
+                b[2] = t_start
+                self.queued -= 1
+                self.stages['signal'].add(t_start-b[1])
+            self.stages[stage].add(now-t_start)
+            if(stage == 'plot'):
+                # plots are the last handlers: the batch now waits for the next frame
+                b[3] = now
+                self.unrendered.add(id(batch))
+                self.gauge('awaiting frame',len(self.unrendered))
+
+    def frame(self,t_start):
+        """A render frame that started at t_start has finished."""
+        now = clock()
+        self.stages['render'].add(now-t_start)
+        with self.lock:
+            for k in self.unrendered:
+                b = self.batches.pop(k,None)
+                if(b is not None):
+                    self.stages['frame'].add(max(0.0,t_start-b[3]))
+                    self.stages['total'].add(now-b[0])
+            self.unrendered = set()
+
+    def snapshot(self):
+        """dict of all histograms (as summaries) and gauges."""
+        with self.lock:
+            return {'time': time.time(), 'since': self.started,
+                    'stages': dict([(s,self.stages[s].summary()) for s in STAGES]),
+                    'gauges': dict([(k,{'current': v[0], 'peak': v[1]}) for (k,v) in self.gauges.items()])}
+
+    def format(self):
+        """Human-readable table of snapshot()."""
+        snap = self.snapshot()
+        lines = ["%-10s %7s %9s %9s %9s %9s %9s" % ('stage','count','mean','p50','p90','p99','max')]
+        for s in STAGES:
+            h = snap['stages'][s]
+            lines.append("%-10s %7d %9s %9s %9s %9s %9s" % (s,h['count'],
+                _ms(h['mean']),_ms(h['p50']),_ms(h['p90']),_ms(h['p99']),_ms(h['max'])))
+        lines.append('')
+        for (k,v) in sorted(snap['gauges'].items()):
+            lines.append("%-16s %6s (peak %s)" % (k,v['current'],v['peak']))
+        return '\n'.join(lines)
+
+    def dump(self,path):
+        """Appends snapshot() to path, as one JSON object per line."""
+        f = open(path,'a')
+        f.write(json.dumps(self.snapshot(),sort_keys=True)+'\n')
+        f.close()
+
+
+def _ms(seconds):
+    return "%.3fms" % (seconds*1e3)
+
+
+# the process-wide tracer used by the pipeline's hooks
+tracer = OvenTracer()
@@ -0,0 +1,77 @@
+'''
+Tests of the binary log format (run with "python -m pytest" or "python -m unittest").
+'''
+
+# Qt-free
+# depends on python-numpy
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+from ovenbinlog import OvenBinLogWriter, read_binlog, binlog_to_csv, encode_block, decode_block
+from ovenproto import MSG_DTYPE, ST_MANUAL, TIME_WRAP
+
+
+def manual_session(n,t0):
+    """n manual-mode messages from controller time t0 (wrapping like the controller's)."""
+    b = numpy.zeros(n,MSG_DTYPE)
+    b['state'] = ST_MANUAL
+    b['time'] = (numpy.arange(n) + t0) % TIME_WRAP
+    b['temp'] = 100 + (numpy.arange(n) % 300)
+    b['target'] = 600
+    b['cmd'] = numpy.arange(n) % 256
+    return b
+
+
+class OvenBinLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir,'log.ovl')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self,batch,close=True):
+        w = OvenBinLogWriter(self.path,block_size=50)
+        for i in range(0,len(batch),37):
+            w.write(batch[i:i+37])
+        if(close):
+            w.close()
+        else:
+            w.flush()
+            w.f.close()         # as if the process died: no index
+            w.f = None
+
+    def test_block_round_trip(self):
+        b = manual_session(240,TIME_WRAP-100)
+        self.assertEqual(decode_block(encode_block(b)).tolist(),b.tolist())
+
+    def test_window_across_time_wrap(self):
+        t0 = TIME_WRAP-600
+        b = manual_session(1500,t0)
+        for close in (True,False):
+            self.write(b,close)
+            self.assertEqual(read_binlog(self.path).tolist(),b.tolist())
+            # 500 ticks either side of the wrap, in unwrapped time
+            w = read_binlog(self.path,TIME_WRAP-100,TIME_WRAP+400)
+            self.assertEqual(w.tolist(),b[500:1000].tolist())
+            self.assertEqual(len(read_binlog(self.path,TIME_WRAP+800)),1500-1400)
+            self.assertEqual(len(read_binlog(self.path,None,t0+10)),10)
+
+    def test_csv_times_do_not_wrap(self):
+        self.write(manual_session(1000,TIME_WRAP-200))
+        csv = os.path.join(self.dir,'log.csv')
+        binlog_to_csv(self.path,csv)
+        f = open(csv)
+        rows = f.read().splitlines()[1:]
+        f.close()
+        times = [float(r.split(',')[2]) for r in rows]
+        self.assertEqual(times[0],0.0)
+        self.assertEqual(times[-1],999*0.25)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+'''
+Tests of the golden-run comparison (run with "python -m pytest" or "python -m unittest").
+'''
+
+# Qt-free
+# depends on python-numpy
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+from ovengolden import OvenGoldenSet, heat_align, resample, stack
+from ovenprofile import profile_trajectory
+from ovenproto import MSG_DTYPE, ST_RUN, TIME_WRAP
+
+
+def profile_run(delay,t0,offset=0.0,drift=0.0,seed=0):
+    """A kester run: delay seconds at 25C, then the profile's target lagging 10s behind,
+    plus noise, an offset and a drift (degrees per minute of heating)."""
+    target = profile_trajectory('kester')['target']*0.25
+    d = int(delay*4)
+    n = d + len(target)
+    temp = numpy.full(n,25.0)
+    lagged = numpy.concatenate((numpy.full(40,25.0),target[:-40]))
+    temp[d:] = lagged + offset + drift*numpy.arange(len(target))/240.0
+    temp += numpy.random.RandomState(seed).normal(0,0.3,n)
+    b = numpy.zeros(n,MSG_DTYPE)
+    b['state'] = ST_RUN
+    b['time'] = (numpy.arange(n) + t0) % TIME_WRAP
+    b['temp'] = numpy.round(temp*4)
+    return b
+
+
+def golden_set():
+    refs = [profile_run(10+7*i,1000*i,offset=0.4*(i-2),seed=i) for i in range(5)]
+    return OvenGoldenSet(stack([heat_align(resample(r)) for r in refs]),['ref%d' % (i) for i in range(5)])
+
+
+class OvenGoldenTest(unittest.TestCase):
+
+    def test_resample_across_time_wrap(self):
+        b = profile_run(20,TIME_WRAP-1000)
+        t = resample(b)
+        self.assertEqual(len(t),int((len(b)-1)*0.25+0.5)+1)
+        self.assertTrue(numpy.allclose(t,resample(profile_run(20,0)),atol=0.01))
+
+    def test_time_shifted_run_passes(self):
+        r = golden_set().compare(profile_run(55,TIME_WRAP-600,seed=9))
+        self.assertTrue(r['passed'])
+        self.assertTrue((r['rms'] < 1.5).all())
+        self.assertTrue((numpy.abs(r['lag']) <= 1.0).all())
+
+    def test_drifted_run_fails(self):
+        r = golden_set().compare(profile_run(25,5000,drift=1.0,seed=9))
+        self.assertFalse(r['passed'])
+        self.assertTrue(r['worst_time'] > 60)          # fine at the start of heating, not later
+
+    def test_save_load(self):
+        d = tempfile.mkdtemp()
+        try:
+            g = golden_set()
+            path = os.path.join(d,'golden.npz')
+            g.save(path)
+            h = OvenGoldenSet.load(path)
+            self.assertEqual(h.names,g.names)
+            numpy.testing.assert_array_equal(h.temps,g.temps)    # NaN padding included
+        finally:
+            shutil.rmtree(d)
+
+
+if __name__ == '__main__':
+    unittest.main()
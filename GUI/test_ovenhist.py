@@ -0,0 +1,56 @@
+'''
+Tests of the dashboard tiles' recent-message ring (run with "python -m pytest" or "python -m unittest").
+'''
+
+# Qt-free
+# depends on python-numpy
+import numpy
+import unittest
+
+from ovenhist import OvenRecent
+from ovenproto import MSG_DTYPE, ST_MANUAL, ST_RUN, TIME_WRAP
+
+
+def messages(state,times,TtoTarget=0):
+    b = numpy.zeros(len(times),MSG_DTYPE)
+    b['state'] = state
+    b['time'] = numpy.asarray(times) % TIME_WRAP
+    b['temp'] = numpy.arange(len(times))
+    b['TtoTarget'] = TtoTarget
+    return b
+
+
+class OvenRecentTest(unittest.TestCase):
+
+    def add(self,recent,batch,chunk):
+        for i in range(0,len(batch),chunk):
+            recent.add(batch[i:i+chunk])
+
+    def test_keeps_latest(self):
+        b = messages(ST_MANUAL,range(1000))
+        for chunk in (7,100,1000):
+            r = OvenRecent(240)
+            self.add(r,b,chunk)
+            self.assertEqual(r.samples().tolist(),b[-240:].tolist())
+            self.assertEqual(r.prev.tolist(),b[-1].tolist())
+
+    def test_session_across_time_wrap(self):
+        b = messages(ST_MANUAL,range(TIME_WRAP-100,TIME_WRAP+100))
+        r = OvenRecent(1000)
+        self.add(r,b,30)
+        self.assertEqual(r.samples().tolist(),b.tolist())
+
+    def test_new_run_starts_over(self):
+        # manual session, then after silence a profile run: only the run is kept
+        a = messages(ST_MANUAL,range(0,300))
+        b = messages(ST_RUN,range(700,800),numpy.arange(300,200,-1))
+        for chunk in (30,400):
+            r = OvenRecent(240)
+            self.add(r,numpy.concatenate((a,b)),chunk)
+            self.assertEqual(r.samples().tolist(),b.tolist())
+        r.add(b[:0])
+        self.assertEqual(len(r),100)
+
+
+if __name__ == '__main__':
+    unittest.main()
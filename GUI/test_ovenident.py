@@ -0,0 +1,82 @@
+'''
+Tests of the thermal model identification (run with "python -m pytest" or "python -m unittest").
+'''
+
+# Qt-free
+# depends on python-numpy
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+from ovenident import contiguous, identify, is_results, lag, write_results
+from ovenproto import MSG_DTYPE, ST_MANUAL, TIME_WRAP
+
+
+def fopdt_run(K,tau,dead_time,ambient,t0=0,n=2400):
+    """Manual session of a first-order plus dead time oven, from controller time t0."""
+    u = numpy.zeros(n)
+    u[40:1200] = 1.0
+    u[1600:2000] = 0.5
+    d = int(dead_time/0.25)
+    y = ambient + K*lag(numpy.concatenate((numpy.zeros(d),u[:n-d])),[tau],0.25)[0]
+    b = numpy.zeros(n,MSG_DTYPE)
+    b['state'] = ST_MANUAL
+    b['time'] = (numpy.arange(n) + t0) % TIME_WRAP
+    b['temp'] = numpy.round(y*4)
+    b['cmd'] = numpy.round(u*255)
+    return b
+
+
+class IdentifyTest(unittest.TestCase):
+
+    def check_fopdt(self,b):
+        r = identify(b)[0]
+        self.assertEqual(r['model'],'fopdt')
+        self.assertEqual(r['samples'],len(b))
+        self.assertAlmostEqual(r['K'],200.0,delta=2.0)
+        self.assertAlmostEqual(r['tau1'],120.0,delta=3.0)
+        self.assertAlmostEqual(r['dead_time'],8.0,delta=0.5)
+        self.assertAlmostEqual(r['ambient'],22.0,delta=0.25)
+        self.assertTrue(r['rmse'] < 0.5)
+
+    def test_fopdt_recovered(self):
+        self.check_fopdt(fopdt_run(200.0,120.0,8.0,22.0))
+
+    def test_run_across_time_wrap(self):
+        self.check_fopdt(fopdt_run(200.0,120.0,8.0,22.0,TIME_WRAP-1000))
+
+    def test_contiguous_breaks_at_gap(self):
+        b = fopdt_run(200.0,120.0,8.0,22.0,TIME_WRAP-100,n=1000)
+        b['time'][300:] += 40                 # silence: only the 700 samples after it are one stretch
+        b['time'] %= TIME_WRAP
+        self.assertEqual(contiguous(b).tolist(),b[300:].tolist())
+
+
+class ResultsFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_is_results(self):
+        results = os.path.join(self.dir,'results.csv')
+        f = open(results,'w')
+        r = identify(fopdt_run(200.0,120.0,8.0,22.0))
+        for x in r:
+            x['log'] = 'run.csv'
+        write_results(r,f)
+        f.close()
+        self.assertTrue(is_results(results))
+        log = os.path.join(self.dir,'run.csv')
+        f = open(log,'w')
+        f.write('1514,600,600,0,0,0\n')
+        f.close()
+        self.assertFalse(is_results(log))
+
+
+if __name__ == '__main__':
+    unittest.main()
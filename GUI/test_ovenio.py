@@ -0,0 +1,54 @@
+'''
+Tests of the event loop (run with "python -m pytest" or "python -m unittest").
+'''
+
+# Qt-free
+# depends on python-numpy
+import time
+import unittest
+
+import ovenio
+from ovenio import OvenLoop
+
+
+class OvenLoopTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = OvenLoop()
+        self.wall = time.time
+
+    def tearDown(self):
+        time.time = self.wall
+        self.loop.close()
+
+    def run_until(self,done,limit=2.0):
+        end = self.wall() + limit
+        while(not done and self.wall() < end):
+            self.loop.run_once(0.01)
+
+    def test_call_later_order(self):
+        fired = []
+        self.loop.call_later(0.05,fired.append,2)
+        self.loop.call_later(0.01,fired.append,1)
+        self.run_until(fired,0.5)
+        self.run_until(fired[1:],0.5)
+        self.assertEqual(fired,[1,2])
+
+    @unittest.skipIf(ovenio.clock is time.time,"no monotonic clock")
+    def test_wall_clock_step(self):
+        # an NTP step (or a manual clock change) must neither stall timers nor fire them early
+        fired = []
+        self.loop.call_later(0.2,fired.append,'late')
+        wall = self.wall
+        time.time = lambda: wall() + 3600.0
+        self.loop.run_once(0.0)
+        self.assertEqual(fired,[])
+        time.time = lambda: wall() - 3600.0
+        start = wall()
+        self.run_until(fired)
+        self.assertEqual(fired,['late'])
+        self.assertTrue(wall() - start < 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+'''
+Tests of the plot history's min/max pyramid (run with "python -m pytest" or "python -m unittest").
+'''
+
+# Qt-free
+# depends on python-numpy
+import numpy
+import unittest
+
+from ovenhist import OvenHistory
+from ovenlod import OvenLod
+from ovenproto import TIME_WRAP, unwrap_time
+
+
+def feed(history,lod,times,temp,chunk=100):
+    """Adds samples to history in chunks, bringing the pyramid up to date after each, as the plot does."""
+    for i in range(0,len(times),chunk):
+        t = temp[i:i+chunk]
+        history.extend(times[i:i+chunk],t,t,numpy.zeros(len(t),numpy.uint8))
+        lod.update()
+
+
+class OvenLodTest(unittest.TestCase):
+
+    def test_envelope(self):
+        h = OvenHistory(4096)
+        lod = OvenLod(h,'temp')
+        temp = (numpy.arange(3000) % 97).astype(numpy.int16)
+        feed(h,lod,numpy.arange(3000)*0.25,temp)
+        (t,v,level) = lod.query(width=100)
+        self.assertTrue(level > 0)
+        self.assertTrue(len(t) <= 2*100+4)
+        self.assertEqual((v.min(),v.max()),(0,96))
+        self.assertTrue((numpy.diff(t) >= 0).all())
+
+    def test_evicted_samples_not_drawn(self):
+        h = OvenHistory(1000)
+        lod = OvenLod(h,'temp')
+        temp = numpy.full(1300,100,numpy.int16)
+        temp[:300] = 900                    # only in samples the history no longer holds
+        feed(h,lod,numpy.arange(1300)*0.25,temp)
+        (t,v,level) = lod.query(width=50)
+        self.assertTrue(level > 0)
+        self.assertEqual(v.max(),100)
+        self.assertEqual(t.min(),h.view('times')[0])
+
+    def test_window_across_time_wrap(self):
+        # controller times crossing the 16-bit wrap, unwrapped as the plot does before extending its history
+        raw = (numpy.arange(2000) + TIME_WRAP - 1000) % TIME_WRAP
+        times = unwrap_time(raw)*0.25
+        temp = numpy.arange(2000).astype(numpy.int16)
+        h = OvenHistory(4096)
+        lod = OvenLod(h,'temp')
+        feed(h,lod,times,temp)
+        t0 = times[900]
+        t1 = times[1100]
+        (t,v,level) = lod.query(t0,t1,width=1000)
+        self.assertEqual(level,0)
+        self.assertEqual((v.min(),v.max()),(899,1101))     # one sample beyond each edge
+
+
+if __name__ == '__main__':
+    unittest.main()
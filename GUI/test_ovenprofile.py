@@ -0,0 +1,87 @@
+'''
+Tests of the profile compiler and trajectories (run with "python -m pytest" or "python -m unittest").
+'''
+
+# Qt-free
+# depends on python-numpy
+import numpy
+import unittest
+
+from ovenprofile import (MAX_STEPS, LOCATE_SAMPLES, compile_profile, follows, format_table, locate,
+                         profile_trajectory, setpoints, trajectory)
+from ovenproto import MSG_DTYPE, PROFILE_TABLES, ST_RUN, TIME_WRAP, unwrap_time
+
+
+class CompileProfileTest(unittest.TestCase):
+
+    def test_firmware_tables_round_trip(self):
+        for table in PROFILE_TABLES:
+            self.assertEqual(compile_profile(setpoints(table)),table)
+
+    def test_exactly_firmware_steps(self):
+        points = setpoints(PROFILE_TABLES[0])
+        self.assertRaises(ValueError,compile_profile,points[:-1])
+        self.assertRaises(ValueError,compile_profile,points + [(points[-1][0]+60,25)])
+        self.assertRaises(ValueError,format_table,PROFILE_TABLES[0][:-1])
+        self.assertEqual(format_table(PROFILE_TABLES[0]).count('{'),MAX_STEPS+1)
+
+    def test_zero_length_step_rejected(self):
+        points = setpoints(PROFILE_TABLES[1])
+        points[3] = (points[2][0],points[3][1])
+        self.assertRaises(ValueError,compile_profile,points)
+        self.assertRaises(ValueError,trajectory,((0,0),) + PROFILE_TABLES[1][1:])
+
+    def test_trajectory_runs_every_step(self):
+        for table in PROFILE_TABLES:
+            traj = trajectory(table)
+            self.assertEqual(len(traj),sum([d for (d,r) in table]))
+            self.assertEqual(traj['step'][-2],MAX_STEPS)
+            self.assertEqual(traj['step'][-1],MAX_STEPS+1)     # profile_update() has moved past the last step
+            self.assertEqual(traj['TtoTarget'][-1],0)
+
+
+def profile_run(profile,anchor,entries):
+    """Run-state samples reporting the given trajectory entries, entry i at controller time anchor+i."""
+    traj = profile_trajectory(profile)
+    entries = numpy.asarray(entries)
+    b = numpy.zeros(len(entries),MSG_DTYPE)
+    b['state'] = ST_RUN
+    b['time'] = (anchor + entries) % TIME_WRAP
+    for f in ('step','TtoTarget','target'):
+        b[f] = traj[f][entries]
+    return b
+
+
+class LocateTest(unittest.TestCase):
+
+    def test_start_of_run_is_enough(self):
+        for p in range(len(PROFILE_TABLES)):
+            b = profile_run(p,1000,range(LOCATE_SAMPLES))
+            self.assertEqual(locate(b),(p,1000))
+            self.assertTrue(follows(profile_run(p,1000,range(len(profile_trajectory(p)))),p,1000))
+        self.assertEqual(locate(profile_run(0,1000,range(4))),None)        # lead and lead-free still alike
+
+    def test_run_across_time_wrap(self):
+        anchor = TIME_WRAP - 100
+        b = profile_run(1,anchor,range(LOCATE_SAMPLES))
+        self.assertEqual(locate(b),(1,anchor))
+        whole = profile_run(1,anchor,range(len(profile_trajectory(1))))
+        self.assertTrue(follows(whole,1,anchor))
+        whole['time'] = unwrap_time(whole['time'])      # as the plot and the store see it
+        self.assertTrue(follows(whole,1,anchor))
+
+    def test_resumed_run_does_not_follow(self):
+        # paused for 400 ticks: profile time stood still while controller time went on
+        b = numpy.concatenate((profile_run(2,1000,range(500)),profile_run(2,1400,range(500,600))))
+        self.assertFalse(follows(b,2,1000))
+        self.assertEqual(locate(b[500:]),(2,1400))
+
+    def test_no_profile(self):
+        b = profile_run(1,1000,range(LOCATE_SAMPLES))
+        b['target'] += 8
+        self.assertEqual(locate(b),None)
+        self.assertEqual(locate(b[:0]),None)
+
+
+if __name__ == '__main__':
+    unittest.main()
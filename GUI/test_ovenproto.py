@@ -0,0 +1,114 @@
+'''
+Tests of the status line decoder (run with "python -m pytest" or "python -m unittest").
+'''
+
+# Qt-free
+# depends on python-numpy
+import io
+import os
+import unittest
+
+import numpy
+
+from ovenproto import OvenDecoder, decode_line, split_runs, unwrap_time, MSG_DTYPE, ST_IDLE, ST_MANUAL, ST_RUN, TIME_WRAP
+
+LOGS = os.path.join(os.path.dirname(os.path.abspath(__file__)),'..')
+
+
+class DecodeLineTest(unittest.TestCase):
+
+    def test_run_line(self):
+        self.assertEqual(decode_line(b'Run     ,1,4,100,20,410,128'),(ST_RUN,1,4,100,20,410,128,0,0,0))
+
+    def test_manual_line(self):
+        self.assertEqual(decode_line(b'1512,600,600,0,0,0'),(ST_MANUAL,0,1512,600,0,600,0,0,0,0))
+
+    def test_out_of_range_fields(self):
+        # garbled line of PID20_1_0.csv: temp does not fit int16
+        self.assertEqual(decode_line(b'1515,61515,600,600,0,0,0'),None)
+        # step does not fit uint8, negative time, cmd above 255
+        self.assertEqual(decode_line(b'Run     ,300,4,100,20,410,128'),None)
+        self.assertEqual(decode_line(b'-4,100,600,0,0,0'),None)
+        self.assertEqual(decode_line(b'Run     ,1,4,100,20,410,256'),None)
+
+
+class OvenDecoderTest(unittest.TestCase):
+
+    def garbled_log(self):
+        f = open(os.path.join(LOGS,'PID20_1_0.csv'),'rb')
+        data = f.read()
+        f.close()
+        self.assertTrue(b'\n1515,61515,600,600,0,0,0' in data)
+        return data
+
+    def test_iter_batches_skips_garbled_line(self):
+        data = self.garbled_log()
+        d = OvenDecoder()
+        n = sum([len(b) for b in d.iter_batches(io.BytesIO(data),size=64)])
+        lines = [l for l in data.replace(b'\r',b'').split(b'\n') if l]
+        self.assertEqual(n + d.errors,len(lines))
+        self.assertTrue(d.errors >= 2)      # the out-of-range line and the truncated one after it
+
+    def test_feed_keeps_rest_of_chunk(self):
+        d = OvenDecoder()
+        batch = d.feed(b'1514,600,600,0,0,0\n1515,61515,600,600,0,0,0\n1516,600,600,0,0,0\n')
+        self.assertEqual(batch['time'].tolist(),[1514,1516])
+        self.assertEqual(d.errors,1)
+
+
+def messages(state,times,step=0,TtoTarget=0):
+    b = numpy.zeros(len(times),MSG_DTYPE)
+    b['state'] = state
+    b['time'] = numpy.asarray(times) % TIME_WRAP
+    b['step'] = step
+    b['TtoTarget'] = TtoTarget
+    return b
+
+
+class SplitRunsTest(unittest.TestCase):
+
+    def starts(self,batch,prev=None):
+        """Index of the first message of each segment, and whether it begins a run."""
+        out = []
+        n = 0
+        for (seg,new_run) in split_runs(batch,prev):
+            out.append((n,new_run))
+            n += len(seg)
+        self.assertEqual(n,len(batch))
+        return out
+
+    def test_reporting_states_only(self):
+        # as sent by the firmware: manual session, silence, profile run, silence, another profile run
+        b = numpy.concatenate((messages(ST_MANUAL,range(100,200)),
+                               messages(ST_RUN,range(400,500),0,numpy.arange(300,200,-1)),
+                               messages(ST_RUN,range(900,950),0,numpy.arange(300,250,-1))))
+        self.assertEqual(self.starts(b),[(0,False),(100,True),(200,True)])
+
+    def test_state_change_without_silence(self):
+        b = numpy.concatenate((messages(ST_MANUAL,range(0,10)),messages(ST_RUN,range(10,20),0,300)))
+        self.assertEqual(self.starts(b),[(0,False),(10,True)])
+
+    def test_pause_carries_on(self):
+        # paused (silent) and resumed where the profile stood
+        b = numpy.concatenate((messages(ST_RUN,range(0,10),2,40),messages(ST_RUN,range(500,510),2,40)))
+        self.assertEqual(self.starts(b),[(0,False)])
+
+    def test_gap_across_batches(self):
+        a = messages(ST_RUN,range(0,10),3,5)
+        b = messages(ST_RUN,range(100,110),0,300)
+        self.assertEqual(self.starts(b,a[-1]),[(0,True)])
+        self.assertEqual(self.starts(a[5:],a[4]),[(0,False)])
+
+    def test_time_wrap_is_not_a_gap(self):
+        b = messages(ST_MANUAL,range(TIME_WRAP-50,TIME_WRAP+50))
+        self.assertEqual(self.starts(b),[(0,False)])
+        self.assertEqual(unwrap_time(b['time']).tolist(),list(range(TIME_WRAP-50,TIME_WRAP+50)))
+
+    def test_recorded_idle_begins_run(self):
+        b = numpy.concatenate((messages(ST_RUN,range(0,10),0,300),messages(ST_IDLE,range(10,20)),
+                               messages(ST_RUN,range(20,30),0,300)))
+        self.assertEqual(self.starts(b),[(0,False),(10,True)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+'''
+Tests of the telemetry publisher's framing and slow-subscriber policies (run with "python -m pytest" or "python -m unittest").
+'''
+
+# Qt-free
+# depends on python-numpy
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+from ovenio import OvenLoop
+from ovenproto import MSG_DTYPE, ST_MANUAL, ST_RUN, TIME_WRAP
+from ovenpub import F_BLOCK, F_RECORDS, FRAME, OvenFeed, OvenPublisher, OvenSubscriber, encode_batch
+
+
+def session(n,t0):
+    """n manual-mode messages from controller time t0, then after silence a profile run of n more."""
+    b = numpy.zeros(2*n,MSG_DTYPE)
+    b['state'][:n] = ST_MANUAL
+    b['state'][n:] = ST_RUN
+    b['time'][:n] = (numpy.arange(n) + t0) % TIME_WRAP
+    b['time'][n:] = (numpy.arange(n) + t0 + n + 400) % TIME_WRAP
+    b['temp'] = 100 + numpy.arange(2*n) % 700
+    b['target'] = 600
+    b['cmd'] = numpy.arange(2*n) % 256
+    return b
+
+
+class FakeTransport():
+    """Transport that keeps what is written (the subscriber's socket)."""
+
+    def __init__(self):
+        self.data = []
+
+    def get_extra_info(self,name):
+        return None
+
+    def set_write_buffer_limits(self,high,low):
+        pass
+
+    def write(self,data):
+        self.data.append(data)
+
+    def close(self):
+        pass
+
+
+class FramingTest(unittest.TestCase):
+
+    def test_round_trip_across_time_wrap(self):
+        b = session(600,TIME_WRAP-700)
+        stream = b''.join([encode_batch(b[i:i+n],1) for (i,n) in ((0,3),(3,200),(203,997))])
+        kinds = [FRAME.unpack_from(encode_batch(b[i:i+n],1))[0] for (i,n) in ((0,3),(3,200))]
+        self.assertEqual(kinds,[F_RECORDS,F_BLOCK])
+        f = OvenFeed()
+        out = []
+        for i in range(0,len(stream),333):       # arbitrary TCP segments
+            out += f.feed(stream[i:i+333])
+        self.assertEqual([c for (c,batch) in out],[1,1,1])
+        self.assertEqual(numpy.concatenate([batch for (c,batch) in out]).tolist(),b.tolist())
+
+
+class PolicyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.loop = OvenLoop()
+
+    def tearDown(self):
+        self.pub.server.close()
+        self.loop.close()
+        shutil.rmtree(self.dir)
+
+    def slow_subscriber(self,policy):
+        """Publishes a session to one subscriber that stops reading halfway; returns (batches received, feed)."""
+        self.pub = OvenPublisher(self.loop,'unix:'+os.path.join(self.dir,'pub'),('a','b'),policy,max_queue=4096)
+        sub = OvenSubscriber(self.pub)
+        transport = FakeTransport()
+        sub.connection_made(transport)
+        b = session(2000,TIME_WRAP-1500)
+        for i in range(0,len(b),16):
+            if(i == 480):
+                sub.pause_writing()
+            if(i == 3200):
+                sub.resume_writing()
+            self.pub.publish(b[i:i+16],1)
+        sub.flush()
+        f = OvenFeed()
+        batches = [batch for (c,batch) in f.feed(b''.join(transport.data))]
+        self.assertEqual(f.hello['channels'],['a','b'])
+        return (b,numpy.concatenate(batches),f)
+
+    def check_accounting(self,b,got,f):
+        self.assertEqual(self.pub.published,len(b))
+        self.assertEqual(len(got) + f.dropped.get(1,0),len(b))
+        # what was delivered is in order, and exactly what was published
+        pos = dict([(r,i) for (i,r) in enumerate(b.tolist())])
+        order = [pos[r] for r in got.tolist()]
+        self.assertEqual(order,sorted(order))
+        return numpy.array(order)
+
+    def test_drop_oldest(self):
+        (b,got,f) = self.slow_subscriber('drop')
+        order = self.check_accounting(b,got,f)
+        self.assertTrue(f.dropped[1] > 0)
+        self.assertEqual(order[:480].tolist(),list(range(480)))
+        self.assertEqual(order[-800:].tolist(),list(range(3200,4000)))   # caught up: nothing lost
+
+    def test_decimate(self):
+        (b,got,f) = self.slow_subscriber('decimate')
+        order = self.check_accounting(b,got,f)
+        self.assertTrue(f.dropped[1] > 0)
+        gaps = numpy.diff(order)
+        self.assertTrue(gaps.max() > 1 and (gaps == 1).sum() > 480)
+        self.assertEqual(order[-1],len(b)-1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+'''
+Tests of the run rollups (run with "python -m pytest" or "python -m unittest").
+'''
+
+# Qt-free
+# depends on python-numpy
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+from ovenproto import MSG_DTYPE, ST_MANUAL, ST_RUN, TIME_WRAP
+from ovenrollup import OvenRollup, SUMMARY_COLUMNS
+
+
+def run_samples(n,t0,step_len=300):
+    """n run-state samples from controller time t0, wrapping like the controller's."""
+    b = numpy.zeros(n,MSG_DTYPE)
+    b['state'] = ST_RUN
+    b['time'] = (numpy.arange(n) + t0) % TIME_WRAP
+    b['step'] = 1 + numpy.arange(n)//step_len
+    b['temp'] = 100 + (numpy.arange(n)*7) % 900
+    b['target'] = 100 + numpy.arange(n) % 800
+    b['cmd'] = numpy.arange(n) % 256
+    return b
+
+
+class OvenRollupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.rollup = OvenRollup(os.path.join(self.dir,'rollup.db'))
+
+    def tearDown(self):
+        self.rollup.close()
+        shutil.rmtree(self.dir)
+
+    def feed(self,batch,chunk,started=0.0):
+        run_id = self.rollup._new_run(started)
+        for i in range(0,len(batch),chunk):
+            self.rollup.add(run_id,batch[i:i+chunk])
+        return run_id
+
+    def test_run_across_time_wrap(self):
+        b = run_samples(1552,65000)
+        run_id = self.feed(b,100)
+        run = self.rollup.runs()[0]
+        self.assertEqual(run['samples'],1552)
+        self.assertEqual(run['first_time'],65000)
+        self.assertEqual(run['last_time'],65000+1551)
+        self.assertEqual(run['duration'],1551*0.25)
+        agg = self.rollup.aggregates('run',run_id=run_id)[0]
+        self.assertEqual((agg['samples'],agg['start'],agg['duration']),(1552,0.0,1551*0.25))
+        s = self.rollup.series(run_id,1)
+        self.assertEqual(s['time'].tolist(),[float(i) for i in range(388)])
+
+    def test_chunked_equals_whole(self):
+        b = run_samples(1552,65000)
+        whole = self.feed(b,len(b))
+        chunked = self.feed(b,37,1.0)
+        for (scope,rows) in (('run',1),('step',6)):
+            a = self.rollup.aggregates(scope,run_id=whole)
+            c = self.rollup.aggregates(scope,run_id=chunked)
+            self.assertEqual((len(a),len(c)),(rows,rows))
+            for (x,y) in zip(a,c):
+                for k in SUMMARY_COLUMNS + ('step',):
+                    self.assertAlmostEqual(x[k],y[k],places=9)
+        for res in (1,10,60):
+            a = self.rollup.series(whole,res)
+            c = self.rollup.series(chunked,res)
+            for k in a:
+                self.assertTrue(numpy.allclose(a[k],c[k]),k)
+
+    def test_replayed_samples_ignored(self):
+        b = run_samples(1000,TIME_WRAP-300)
+        run_id = self.feed(b[:600],200)
+        self.assertEqual(self.rollup.add(run_id,b[:600]),0)
+        self.assertEqual(self.rollup.add(run_id,b[400:800]),200)
+        self.assertEqual(self.rollup.add(run_id,b[800:]),200)
+        self.assertEqual(self.rollup.runs()[0]['samples'],1000)
+        self.assertEqual(self.rollup.aggregates('run',run_id=run_id)[0]['samples'],1000)
+
+    def test_runs_kept_apart(self):
+        a = run_samples(800,100)
+        b = run_samples(500,1300)
+        b['state'] = ST_MANUAL
+        first = self.feed(a,64)
+        second = self.feed(b,64,1.0)
+        self.assertEqual(self.rollup.aggregates('run',run_id=first)[0]['samples'],800)
+        self.assertEqual(self.rollup.aggregates('run',run_id=second)[0]['samples'],500)
+        self.assertEqual(self.rollup.aggregates('run',run_id=second)[0]['duration'],499*0.25)
+        self.assertEqual(self.rollup.aggregates('day')[0]['samples'],1300)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+'''
+Tests of the closed-loop PID simulator (run with "python -m pytest" or "python -m unittest").
+'''
+
+# Qt-free
+# depends on python-numpy
+import numpy
+import unittest
+
+from ovensim import OvenPid, OvenPlant, gain_grid, simulate_gains, sweep, PID_PREV0, K_DELAY, K_DIV
+
+
+def wrap(x,bits):
+    half = 1 << (bits-1)
+    return ((x + half) % (half << 1)) - half
+
+
+class ReferencePid():
+    """pid_update() of oven_pid.c for one gain set, one tick at a time, in C integer types."""
+
+    def __init__(self,k_p,k_i,k_d):
+        self.k = (k_p,k_i,k_d)
+        self.prev = [PID_PREV0]*K_DELAY
+        self.index = 0
+        self.pid_int = 0
+
+    def update(self,temp,target):
+        (k_p,k_i,k_d) = self.k
+        error = wrap(target - temp,16)
+        derivative = wrap(self.prev[self.index] - temp,16)
+        self.prev[self.index] = temp
+        self.index = (self.index + 1) % K_DELAY
+        command = wrap(error << k_p,32)
+        command = wrap(command + wrap(self.pid_int << k_i,32),32)
+        command = wrap(command + wrap(derivative << k_d,32),32)
+        command >>= K_DIV
+        if((0 <= command <= 255) or (command > 0 and error < 0) or (command < 0 and error > 0)):
+            self.pid_int = wrap(self.pid_int + error,32)
+        return min(max(command,0),255)
+
+
+class OvenPidTest(unittest.TestCase):
+
+    def test_matches_firmware_arithmetic(self):
+        # large errors and shifts, so that int16 errors and int32 sums wrap around
+        rng = numpy.random.RandomState(1)
+        temps = rng.randint(-2000,6000,400)
+        targets = rng.randint(-32768,32767,400)
+        gains = [(20,0,0),(22,3,10),(13,18,0),(30,24,24),(4,12,31)]
+        pid = OvenPid(*zip(*gains))
+        refs = [ReferencePid(*g) for g in gains]
+        for (temp,target) in zip(temps.tolist(),targets.tolist()):
+            cmd = pid.update(temp,target)
+            self.assertEqual(cmd.tolist(),[r.update(temp,target) for r in refs])
+        self.assertEqual(pid.pid_int.tolist(),[r.pid_int for r in refs])
+
+
+class SimulateTest(unittest.TestCase):
+
+    def test_plant_steady_state(self):
+        plant = OvenPlant(200.0,60.0,10.0,5.0,20.0)
+        pid = OvenPid(0,0,0)
+        pid.update = lambda temp,target: numpy.full(len(temp),255,numpy.int64)
+        (temps,cmds) = plant.simulate(pid,numpy.zeros(4000,numpy.int16))
+        self.assertEqual(temps[0,0],20*4)
+        self.assertAlmostEqual(temps[-1,0]*0.25,220.0,delta=0.5)
+
+    def test_candidates_independent(self):
+        # every run starts from pid_reset() and ambient, whatever else is simulated alongside
+        gains = gain_grid([18,20],[0,2],[0,8])
+        together = simulate_gains(gains,1)
+        alone = numpy.concatenate([simulate_gains(g,1) for g in gains])
+        self.assertEqual(together.tolist(),alone.tolist())
+        self.assertEqual(simulate_gains(gains,1).tolist(),together.tolist())
+
+    def test_gains_change_score(self):
+        r = simulate_gains([(0,0,0),(20,0,0)],1)
+        self.assertTrue(r['rms_error'][1] < r['rms_error'][0] - 10)
+        self.assertTrue(r['score'][1] < r['score'][0])
+
+    def test_sweep_chunks(self):
+        gains = gain_grid([16,18,20,22],[0,1],[0,4])
+        results = sweep(gains,1,processes=1,chunk=5)
+        self.assertTrue((numpy.diff(results['score']) >= 0).all())
+        self.assertEqual(sorted(results.tolist()),sorted(simulate_gains(gains,1).tolist()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+'''
+Tests of the session store (run with "python -m pytest" or "python -m unittest").
+'''
+
+# Qt-free
+# depends on python-numpy
+import numpy
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from ovenlogs import OvenRunLogger
+from ovenprofile import profile_trajectory
+from ovenproto import MSG_DTYPE, ST_IDLE, ST_RUN, ST_DONE, TIME_WRAP
+from ovenstore import OvenStore
+
+
+def profile_run(profile,t0=1000,idle=20):
+    """Status messages of a complete run of a firmware profile, with idle samples around it."""
+    traj = profile_trajectory(profile)
+    b = numpy.zeros(idle+len(traj)+idle,MSG_DTYPE)
+    b['time'] = numpy.arange(len(b)) + t0
+    b['state'] = ST_IDLE
+    run = b[idle:idle+len(traj)]
+    run['state'] = ST_RUN
+    for k in ('step','TtoTarget','target'):
+        run[k] = traj[k]
+    run['temp'] = traj['target']
+    b['state'][idle+len(traj)] = ST_DONE
+    return b
+
+
+def reported_run(profile,t0):
+    """The messages the firmware sends for a run of a profile (run state only), from controller time t0."""
+    traj = profile_trajectory(profile)
+    b = numpy.zeros(len(traj),MSG_DTYPE)
+    b['time'] = (numpy.arange(len(b)) + t0) % TIME_WRAP
+    b['state'] = ST_RUN
+    for k in ('step','TtoTarget','target'):
+        b[k] = traj[k]
+    b['temp'] = traj['target']
+    return b
+
+
+class OvenStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir,'ovenlog.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_logged_run_found_by_profile(self):
+        logger = OvenRunLogger('store',store=self.path,source='test')
+        b = profile_run('kester')
+        for i in range(0,len(b),37):     # as the serial port delivers it
+            logger.log_batch(b[i:i+37])
+        logger.close()
+
+        store = OvenStore(self.path)
+        runs = store.find_runs(profile='kester')
+        self.assertEqual(len(runs),1)
+        self.assertEqual(runs[0]['source'],'test')
+        self.assertEqual(store.find_runs(profile='lead'),[])
+        store.close()
+
+    def test_reported_runs_split(self):
+        # two runs as the firmware (or ovenreplay) sends them: no idle messages, silence in between
+        logger = OvenRunLogger('store',store=self.path)
+        kester = reported_run('kester',1000)
+        lead = reported_run('lead',1000+len(kester)+400)
+        b = numpy.concatenate((kester,lead))
+        for i in range(0,len(b),50):
+            logger.log_batch(b[i:i+50])
+        logger.close()
+
+        store = OvenStore(self.path)
+        runs = store.find_runs()
+        self.assertEqual([r['profile'] for r in runs],['kester','lead'])
+        self.assertEqual([r['duration'] for r in runs],[(len(kester)-1)*0.25,(len(lead)-1)*0.25])
+        self.assertEqual(runs[0]['peak_temp'],kester['temp'].max()*0.25)
+        store.close()
+
+    def test_run_across_time_wrap(self):
+        store = OvenStore(self.path)
+        run = store.begin_run()
+        b = reported_run('kester',TIME_WRAP-600)
+        for i in range(0,len(b),50):
+            run.write(b[i:i+50])
+        run.close()
+        runs = store.find_runs(profile='kester',min_duration=60.0)
+        self.assertEqual(len(runs),1)
+        self.assertEqual(runs[0]['duration'],(len(b)-1)*0.25)
+        i = int(numpy.argmax(b['temp']))
+        self.assertEqual(runs[0]['peak_time'],i*0.25)
+        store.close()
+
+    def test_given_profile_kept(self):
+        store = OvenStore(self.path)
+        run = store.begin_run(profile='lead')
+        run.write(profile_run('lead-free'))
+        run.close()
+        self.assertEqual([r['profile'] for r in store.find_runs()],['lead'])
+        store.close()
+
+    def test_find_runs_by_date(self):
+        store = OvenStore(self.path)
+        for day in ('2011-05-01','2011-05-02','2011-05-03'):
+            store.begin_run(time.mktime(time.strptime(day+' 23:30','%Y-%m-%d %H:%M'))).close()
+        self.assertEqual([r['date'] for r in store.find_runs(since='2011-05-02',until='2011-05-03')],['2011-05-02'])
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -21,6 +21,7 @@
 
 
 import sys, random
+import numpy
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
 
@@ -30,36 +31,69 @@ TEMP_SPACER = 19
 HEATER_AREA_OFFSET = 0.05
 XOFFSET = 0.055
 BARWIDTH = 1
+TIME_SPACING = 30
+
+HEATER_HUE = 35
+HEATER_SAT = 255
 
 
 #
 # Info: plotter graph
+# Info: the data layer is a transparent 32-bit QImage, so that heater bars can be
+# Info: written straight into its pixel buffer with numpy; the static grid is
+# Info: rendered once into a separate pixmap (self.grid)
 #
-class plotGraph(QPixmap):
+class plotGraph(QImage):
 	def __init__(self, w, h, *args):
-		apply(QPixmap.__init__, (self, w, h) + args)
+		QImage.__init__(self, w, h, QImage.Format_ARGB32_Premultiplied)
 		
-		self.count = 0
 		self.heaterscale = float(h) / float(800)
 		
 		self.tempoffset   		= int(self.height() - self.height()*TEMP_AREA_OFFSET)
 		self.heateroffsetBase 	= self.height() - (self.height()*HEATER_AREA_OFFSET)
 		self.xoffset 			= int(self.width() * XOFFSET)
+
+		# heater colours (by HSV value) are looked up once; bar columns are cached by power
+		self.heaterlut = numpy.array([QColor.fromHsv(HEATER_HUE, HEATER_SAT, v).rgb() for v in range(256)], numpy.uint32)
+		self.heatercols = {}
 		
-		self.col = self.xoffset+1
+		# samples scroll left by this many columns when they reach the right edge
+		self.scrollstep = max((self.width() - self.xoffset) // 4, BARWIDTH)
 		
+		self.grid = QPixmap(w, h)
+		self.grid.fill(QColor("white"))
+		p = QPainter(self.grid)
+		self.drawGrid(p)
+		p.end()
+
+		self.reset()
+
+	#
+	# Info: clears all samples
+	#
+	def reset(self):
+		self.count = 0
+		self.col = self.xoffset+1
 		self.oventempold = 0
 		self.tempsetold = 0
 		self.cjtempold = 0
-		
-		self.fill(QColor("white"))
-		self.drawGrid()
+
+		self.fill(0)
+		self.drawTimeAxis()
+
+	#
+	# Info: returns the image's pixels as a (height, width) numpy array of 0xAARRGGBB values
+	# Info: (fetched anew each time - bits() detaches the image if it is shared)
+	#
+	def pixels(self):
+		ptr = self.bits()
+		ptr.setsize(self.byteCount())
+		return numpy.ndarray((self.height(), self.bytesPerLine()//4), numpy.uint32, ptr)[:, :self.width()]
 
 	#
 	# Info: a not so hot implementation of a grid
 	#
-	def drawGrid(self):
-		p = QPainter(self)
+	def drawGrid(self, p):
 		p.setBackground(QColor("white"))
 		h = self.height()
 		w = self.width()
@@ -108,36 +142,79 @@ class plotGraph(QPixmap):
 		p.drawLine(self.xoffset, -1, self.xoffset, h- h*0.05)
 		p.drawLine(self.xoffset, h- h*0.05, w+1, h-h*0.05)
 		
-		#draw x values
+		#x unit
 		p.drawText(10, h-3, "s")
-		s = 0
-		for i in range(int(self.xoffset), w, 30):
-			p.drawLine(i, self.heateroffsetBase, i, self.heateroffsetBase+5)
+
+
+	#
+	# Info: (re)draws the x values, which scroll along with the samples;
+	# Info: sample number count sits in column col
+	#
+	def drawTimeAxis(self):
+		h = self.height()
+		w = self.width()
+		top = int(self.heateroffsetBase)+1
+
+		self.pixels()[top:, self.xoffset:] = 0
+
+		p = QPainter(self)
+		p.setClipRect(self.xoffset, top, w - self.xoffset, h - top)
+		p.setPen(QColor("black"))
+		s = self.count + 1 - (self.col - self.xoffset)
+		s += (-s) % TIME_SPACING
+		for i in range(self.col - (self.count + 1 - s), w, TIME_SPACING):
+			p.drawLine(i, top, i, self.heateroffsetBase+5)
 			p.drawText(i-3, h-3, str(s))
-			s = s + 30
-		
+			s = s + TIME_SPACING
+		p.end()
+
+
+	#
+	# Info: moves all samples left by scrollstep columns
+	#
+	def scroll(self):
+		px = self.pixels()
+		x0 = self.xoffset
+		n = self.scrollstep
+		px[:, x0:-n] = px[:, x0+n:].copy()
+		px[:, -n:] = 0
+		self.col -= n
+		self.drawTimeAxis()
+
 		
 	#
-	# Info: calls update funtions for temp and heater display
+	# Info: draws one sample: heater bar, then oven temp, target temp and CJ temp lines
+	# Info: with a single painter; returns the changed area (QRect)
 	#
 	def update(self, power, oventemp, tempset, cjtemp):
 
+		scrolled = self.col + BARWIDTH >= self.width()
+		if scrolled:
+			self.scroll()
+
 		self.col += BARWIDTH
-	
-		self.updateOvenTemp(oventemp)
+		self.count += 1
+
 		self.updateHeater(power)
-		self.updateTempSet(tempset)
-		self.updateCJTemp(cjtemp)
+
+		p = QPainter(self)
+		p.setRenderHint(QPainter.Antialiasing)
+		self.updateOvenTemp(p, oventemp)
+		self.updateTempSet(p, tempset)
+		self.updateCJTemp(p, cjtemp)
+		p.end()
+
+		if scrolled:
+			return self.rect()
+		# antialiased lines reach one column beyond their end points
+		return QRect(self.col - BARWIDTH - 1, 0, BARWIDTH + 3, self.height())
 		
 		
 	#
 	# Info: updates CJ temp on graph
 	#
-	def updateCJTemp(self, cjtem):
+	def updateCJTemp(self, p, cjtem):
 		h = self.height()
-		p = QPainter(self)
-		p.setBackground(QColor("white"))
-		p.setRenderHint(QPainter.Antialiasing)
 		
 		if self.cjtempold  == 0:
 			self.cjtempold = int(h- self.tempoffset) - int(cjtem)
@@ -152,11 +229,8 @@ class plotGraph(QPixmap):
 	#
 	# Info: updates target temp on graph
 	#
-	def updateTempSet(self, tempset=0):
+	def updateTempSet(self, p, tempset=0):
 		h = self.height()
-		p = QPainter(self)
-		p.setBackground(QColor("white"))
-		p.setRenderHint(QPainter.Antialiasing)
 		
 		if self.tempsetold  == 0:
 			self.tempsetold = int(h- self.tempoffset) - int(tempset)
@@ -170,12 +244,9 @@ class plotGraph(QPixmap):
 	#
 	# Info: updates oven temp on graph
 	#
-	def updateOvenTemp(self, temp):
+	def updateOvenTemp(self, p, temp):
 		
 		h = self.height()
-		p = QPainter(self)
-		p.setBackground(QColor("white"))
-		p.setRenderHint(QPainter.Antialiasing)
 		
 		if self.oventempold == 0:
 			self.oventempold = (h- self.tempoffset) - temp
@@ -187,36 +258,42 @@ class plotGraph(QPixmap):
 
 
 	#
-	# Info: updates heater usages on graph
+	# Info: returns heater bar column for power, bottom pixel first
+	# Info: (gradient spans HSV value 100-228 over the bar's height, whatever the height)
 	#
-	def updateHeater(self, power):
-		
-		p = QPainter(self)
-		p.setBackground(QColor("white"))
+	def heaterColumn(self, power):
+		column = self.heatercols.get(power)
+		if column is None:
+			y = float(self.heaterscale) * float(power)
+			# zero division error
+			if y == 0: y = 1
+
+			step = float(float(128)/float(y))
+			column = self.heaterlut[100 + (step * numpy.arange(int(y))).astype(int)]
+			self.heatercols[power] = column
+		return column
 
-		p.setBrush(QColor("black"))
-		
-		y = float(self.heaterscale) * float(power)
-		# zero division error
-		if y == 0: y = 1
 
-		minV = 255
-		H = 35
-		S = 255
+	#
+	# Info: updates heater usages on graph
+	#
+	def updateHeater(self, power):
+		column = self.heaterColumn(power)
 
-		step = float(float(128)/float(y))
-		for i in range(int(y)):
-			color = QColor()
-			color.setHsv(H, S, 100 + int(step * i))
-			p.setPen(QPen(color))
+		x0 = max(self.col - BARWIDTH, 0)
+		x1 = min(self.col + 1, self.width())
+		base = int(self.heateroffsetBase)
+		n = min(len(column), base + 1)
+		if x0 >= x1 or base >= self.height() or n == 0:
+			return
 
-			p.drawLine(self.col - BARWIDTH, 
-						self.heateroffsetBase -i, 
-						self.col, 
-						self.heateroffsetBase -i)
+		# rows base, base-1, ... hold the bar from the bottom up
+		self.pixels()[base-n+1:base+1, x0:x1] = column[:n][::-1, None]
 
 #
 # Info: Plotter Widget
+# Info: grid and data layers are composed into a canvas pixmap only where they
+# Info: changed, and paint events copy just their region of the canvas
 #
 class Plotter(QWidget):
 
@@ -224,30 +301,34 @@ class Plotter(QWidget):
 		QWidget.__init__(self, parent)
 		
 		self.setGeometry(2, 2, parent.width()-4, parent.height()-4)
+		self.setAttribute(Qt.WA_OpaquePaintEvent)
 		self.pixmap = plotGraph(self.width(), self.height())
-		self.setAutoFillBackground(True)
+		self.canvas = QPixmap(self.width(), self.height())
+		self.compose(self.canvas.rect())
 		
 
+	#
+	# Info: redraws rect of the canvas from grid and data layers, and schedules its repaint
+	#
+	def compose(self, rect):
+		p = QPainter(self.canvas)
+		p.drawPixmap(rect, self.pixmap.grid, rect)
+		p.drawImage(rect, self.pixmap, rect)
+		p.end()
+		QWidget.update(self, rect)
+
+
 	def paintEvent(self, ev):
-		p =  QPalette()
-		p.setBrush(p.Background, QBrush(self.pixmap));
-		self.setPalette(p)
+		p = QPainter(self)
+		p.drawPixmap(ev.rect(), self.canvas, ev.rect())
 
 
 	def update(self, heater, oventemp, tempset, cjtemp):
-		self.pixmap.update(heater, oventemp, tempset, cjtemp)
-		p =  QPalette()
-		p.setBrush(p.Background, QBrush(self.pixmap));
-		self.setPalette(p)
+		self.compose(self.pixmap.update(heater, oventemp, tempset, cjtemp))
 
 	
 	def resetGraph(self):
-		del self.pixmap
-		self.pixmap = plotGraph(self.width(), self.height())
+		# the grid stays cached - only samples are cleared
+		self.pixmap.reset()
+		self.compose(self.canvas.rect())
 		
-		#update graph
-		p =  QPalette()
-		p.setBrush(p.Background, QBrush(self.pixmap));
-		self.setPalette(p)
-		
-